@@ -1,23 +1,39 @@
+"""
+Charts of the delivery rollups.
+
+Run from ProjectFiles/ with: python -m analytics.charts
+"""
 import requests
 import matplotlib.pyplot as plt
-from collections import defaultdict
+from datetime import date, timedelta
+
+# The desktop client's decoder for the API's compact list formats
+from ui.wire import ACCEPT, decode
 
 # The URL of your live FastAPI server
 API_URL = "http://127.0.0.1:8000"
 
+# How many days of completed deliveries to chart
+DAYS = 30
+
 def fetch_all_data():
-    """Fetches all donors, recipients, and match results from the API."""
+    """
+    Fetches the delivery rollups (food delivered per day, per donor
+    and per recipient) for the last DAYS days from the API.
+    """
+    params = {"since": (date.today() - timedelta(days=DAYS - 1)).isoformat()}
+    headers = {"Accept": ACCEPT}
     try:
-        donors_res = requests.get(f"{API_URL}/donors")
-        recipients_res = requests.get(f"{API_URL}/recipients")
-        matches_res = requests.post(f"{API_URL}/matches/run")
+        daily_res = requests.get(f"{API_URL}/analytics/daily", params=params, headers=headers)
+        donors_res = requests.get(f"{API_URL}/analytics/donors", params=params, headers=headers)
+        recipients_res = requests.get(f"{API_URL}/analytics/recipients", params=params, headers=headers)
         
+        daily_res.raise_for_status()
         donors_res.raise_for_status()
         recipients_res.raise_for_status()
-        matches_res.raise_for_status()
         
         print("Successfully fetched all data from API.")
-        return donors_res.json(), recipients_res.json(), matches_res.json()
+        return decode(daily_res), decode(donors_res), decode(recipients_res)
         
     except requests.exceptions.RequestException as e:
         print(f"ERROR: Could not connect to API at {API_URL}.")
@@ -25,73 +41,60 @@ def fetch_all_data():
         print(f"Details: {e}")
         return None, None, None
 
-def plot_donor_participation(donors, ax):
-    """Creates a bar chart of food items donated by each donor."""
-    if not donors:
-        ax.set_title("Donor Participation")
-        ax.text(0.5, 0.5, "No donor data", ha='center')
+def plot_food_saved(daily, ax):
+    """Creates a bar chart of food delivered per day, with quantity per stop (delivery efficiency)."""
+    if not daily:
+        ax.set_title("Food Saved")
+        ax.text(0.5, 0.5, "No completed pickups yet", ha='center')
         return
 
-    names = [donor['name'] for donor in donors]
-    # Count the number of *distinct* food items each donor has
-    food_counts = [len(donor['current_donations']) for donor in donors]
-    
-    colors = plt.cm.viridis([0.2, 0.5, 0.8])
-    
-    ax.bar(names, food_counts, color=colors)
-    ax.set_title("Donor Participation")
-    ax.set_ylabel("Number of Active Food Donations")
-    ax.set_xlabel("Donor")
+    days = [row['day'][5:] for row in daily] # MM-DD
+    quantities = [row['quantity'] for row in daily]
+    per_stop = [row['quantity_per_stop'] for row in daily]
 
-def plot_recipient_needs(recipients, ax):
-    """Creates a pie chart of the daily needs of all recipients."""
-    if not recipients:
-        ax.set_title("Recipient Needs")
-        ax.text(0.5, 0.5, "No recipient data", ha='center')
-        return
+    ax.bar(days, quantities, color=plt.cm.viridis(0.6))
+    ax.set_title("Food Saved per Day")
+    ax.set_ylabel("Quantity Delivered (e.g., kg)")
+    ax.set_xlabel("Day")
+    ax.tick_params(axis='x', labelrotation=45)
 
-    names = [r['name'] for r in recipients]
-    needs = [r['daily_need'] for r in recipients]
-    
-    ax.pie(needs, labels=names, autopct='%1.1f%%', startangle=90)
-    ax.set_title("Share of Total Daily Need")
-    ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
+    # Delivery efficiency on a second axis
+    ax_eff = ax.twinx()
+    ax_eff.plot(days, per_stop, color=plt.cm.plasma(0.3), marker='o')
+    ax_eff.set_ylabel("Quantity per Stop")
 
-def plot_match_summary(matches, ax):
-    """Creates a bar chart of the total quantity matched to each recipient."""
-    if not matches:
-        ax.set_title("Match Summary")
-        ax.text(0.5, 0.5, "No match data", ha='center')
+def plot_partner_totals(partners, ax, title, xlabel, top=10):
+    """Creates a bar chart of the quantity delivered per donor or recipient (largest first)."""
+    if not partners:
+        ax.set_title(title)
+        ax.text(0.5, 0.5, "No completed pickups yet", ha='center')
         return
 
-    # Aggregate total quantity matched per recipient
-    recipient_totals = defaultdict(float)
-    for match in matches:
-        recipient_totals[match['recipient_name']] += match['quantity_matched']
-
-    names = list(recipient_totals.keys())
-    quantities = list(recipient_totals.values())
+    partners = partners[:top]
+    names = [p['name'] for p in partners]
+    quantities = [p['quantity'] for p in partners]
     
-    colors = plt.cm.plasma([0.3, 0.6, 0.9])
+    colors = plt.cm.viridis([i / max(1, len(names)) for i in range(len(names))])
     
     ax.bar(names, quantities, color=colors)
-    ax.set_title("Total Food Matched (by Recipient)")
-    ax.set_ylabel("Total Quantity Matched (e.g., kg)")
-    ax.set_xlabel("Recipient")
+    ax.set_title(title)
+    ax.set_ylabel("Quantity Delivered (e.g., kg)")
+    ax.set_xlabel(xlabel)
+    ax.tick_params(axis='x', labelrotation=45)
 
 def main():
     """Main function to fetch data and plot all charts."""
-    donors, recipients, matches = fetch_all_data()
+    daily, donors, recipients = fetch_all_data()
     
-    if donors is None:
+    if daily is None:
         return # API connection failed
 
     # Create a figure with 3 subplots (1 row, 3 columns)
     fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(20, 6))
     
-    plot_donor_participation(donors, ax1)
-    plot_recipient_needs(recipients, ax2)
-    plot_match_summary(matches, ax3)
+    plot_food_saved(daily, ax1)
+    plot_partner_totals(donors, ax2, "Donor Participation", "Donor")
+    plot_partner_totals(recipients, ax3, "Food Received (by Recipient)", "Recipient")
     
     fig.suptitle("Food Rescue Analytics Dashboard", fontsize=20)
     plt.tight_layout(rect=[0, 0.03, 1, 0.95])
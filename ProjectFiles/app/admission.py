@@ -0,0 +1,128 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Tuple
+from app.singleflight import SingleFlight
+
+# Admission control for the expensive endpoints (matching and routing).
+#
+#   - Per-client token buckets: each client (by address) may start a
+#     few calls at once (the burst) and then one every 60/rate seconds.
+#   - Concurrency caps: at most N matching (or routing) computations
+#     run at once in a worker, however many clients there are.
+#   - Coalescing: concurrent identical matching requests share one
+#     computation instead of each running the matcher (app/singleflight.py).
+# Anything over capacity is refused with OverCapacity, which the API
+# turns into 429 Too Many Requests with a Retry-After header.
+#
+# The state is per worker process: with W workers a client can get W
+# times the rate. That is deliberate (no database round trip before
+# every request); size the limits for one worker.
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+class OverCapacity(Exception):
+    """A request was refused; the client should retry after `retry_after` seconds."""
+
+    def __init__(self, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+class TokenBucket:
+    """`burst` tokens, refilled at `rate` tokens per second."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Takes a token. Returns 0 if one was taken, else seconds until one is free."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class RateLimit:
+    """One token bucket per client, for one kind of request."""
+
+    MAX_CLIENTS = 10000 # Least recently seen clients are forgotten beyond this
+
+    def __init__(self, name: str, per_minute: float, burst: float):
+        self.name = name
+        self.rate = per_minute / 60
+        self.burst = burst
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, client: str):
+        """Spends one of `client`'s tokens, or raises OverCapacity."""
+        with self._lock:
+            bucket = self._buckets.pop(client, None) or TokenBucket(self.rate, self.burst)
+            self._buckets[client] = bucket
+            if len(self._buckets) > self.MAX_CLIENTS:
+                self._buckets.popitem(last=False)
+            wait = bucket.take()
+        if wait:
+            raise OverCapacity(f"Too many {self.name} requests; retry in {math.ceil(wait)}s", wait)
+
+class ConcurrencyLimit:
+    """At most `limit` holders at once; never queues, refuses instead."""
+
+    def __init__(self, name: str, limit: int, retry_after: float):
+        self.name = name
+        self.limit = limit
+        self.retry_after = retry_after # What refused clients are told to wait
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            if self.active >= self.limit:
+                raise OverCapacity(f"The server is busy with {self.name}; retry shortly", self.retry_after)
+            self.active += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.active -= 1
+
+# --- Limits ---
+
+# Per client: `burst` calls at once, then `per minute`
+match_rate = RateLimit(
+    "matching",
+    per_minute=_env_float("FOOD_RESCUE_MATCH_RATE_PER_MINUTE", 6),
+    burst=_env_float("FOOD_RESCUE_MATCH_BURST", 3),
+)
+route_rate = RateLimit(
+    "routing",
+    per_minute=_env_float("FOOD_RESCUE_ROUTE_RATE_PER_MINUTE", 30),
+    burst=_env_float("FOOD_RESCUE_ROUTE_BURST", 10),
+)
+
+# Per worker: computations running at once
+matching = ConcurrencyLimit("matching", int(_env_float("FOOD_RESCUE_MATCH_CONCURRENCY", 2)), retry_after=2)
+routing = ConcurrencyLimit("routing", int(_env_float("FOOD_RESCUE_ROUTE_CONCURRENCY", 4)), retry_after=1)
+
+match_runs = SingleFlight("matches.run")
+
+# Rate-limited requests: (method, path) -> limit
+RATE_LIMITS: Dict[Tuple[str, str], RateLimit] = {
+    ("POST", "/matches/run"): match_rate,
+    ("POST", "/matches/jobs"): match_rate,
+    ("POST", "/pickups"): route_rate,
+}
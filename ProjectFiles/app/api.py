@@ -1,16 +1,213 @@
-from fastapi import FastAPI, HTTPException
-from typing import List 
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, Header
+from fastapi.responses import JSONResponse, Response, StreamingResponse, PlainTextResponse
+from typing import List, Optional
+from datetime import date, datetime
 from app.models import (
     Donor, Recipient, FoodItem, 
     PyObjectId, AvailableFood,
-    MatchResult, Pickup, PickupStop
+    MatchResult, Pickup,
+    MatchJob, MatchTrace, DailyRollup, PartnerRollup, ForecastDay
 )
 import app.data as db
 import app.match as match # Import your new match file
+from app.events import bus
+from app.logs import logger
+from app import metrics
+from app import diagnostics
+from app import cluster
+from app import dispatch
+from app import export
+from app import rollups
+from app import forecast
+from app import idempotency
+from app import admission
+from app import explain
+from app import wire
+from app import scheduler
+from app.inventory import inventory, available_food
+from app.singleflight import generations
+from app.store import store
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connects to MongoDB when the server starts (not when app.api is imported)."""
+    await asyncio.to_thread(db.connect)
+    await asyncio.to_thread(inventory.start)
+    cluster.scheduler_election.start()
+    scheduler.auto_matcher.start()
+    scheduler.expiry_sweeper.start()
+    yield
+    await asyncio.to_thread(scheduler.expiry_sweeper.stop)
+    await asyncio.to_thread(scheduler.auto_matcher.stop)
+    await asyncio.to_thread(cluster.scheduler_election.stop)
+    await asyncio.to_thread(inventory.stop)
+    db.close()
 
-app = FastAPI(title="Food Rescue API")
+app = FastAPI(title="Food Rescue API", lifespan=lifespan)
+
+# Seconds between keep-alive comments on an idle change feed
+EVENTS_HEARTBEAT_SECONDS = 15
+
+# --- Admission Control ---
+# Defined before the idempotency middleware so it runs inside it:
+# replaying a saved response spends no tokens.
+
+@app.middleware("http")
+async def limit_expensive_requests(request: Request, call_next):
+    """Spends one of the client's tokens on matching/routing calls (see app/admission.py)."""
+    limit = admission.RATE_LIMITS.get((request.method, request.url.path))
+    if limit is not None:
+        try:
+            limit.check(request.client.host if request.client else "unknown")
+        except admission.OverCapacity as e:
+            return _too_many_requests(e)
+    return await call_next(request)
+
+def _too_many_requests(e: admission.OverCapacity) -> JSONResponse:
+    logger.info("admission.refused", extra={"detail": e.detail})
+    return JSONResponse({"detail": e.detail}, status_code=429, headers={"Retry-After": e.retry_after_header()})
+
+@app.exception_handler(admission.OverCapacity)
+async def over_capacity(request: Request, e: admission.OverCapacity):
+    """Raised from inside an endpoint (a concurrency cap was full)."""
+    return _too_many_requests(e)
+
+def _with_body(response, content: bytes) -> Response:
+    """
+    A copy of `response` with `content` as its body. Keeps the raw
+    headers, so repeated ones (e.g. several set-cookie) survive.
+    """
+    copy = Response(content=content, status_code=response.status_code)
+    copy.raw_headers = [(k, v) for k, v in response.raw_headers if k != b"content-length"]
+    copy.raw_headers.append((b"content-length", str(len(content)).encode()))
+    return copy
+
+# --- Idempotency ---
+
+@app.middleware("http")
+async def replay_repeated_posts(request: Request, call_next):
+    """
+    POSTs with an Idempotency-Key header run once; repeats get the first
+    successful response back (see app/idempotency.py). 422 if the key was used for
+    a different request, 409 if the first one is still running.
+    """
+    key = request.headers.get(idempotency.HEADER)
+    if request.method != "POST" or not key:
+        return await call_next(request)
+
+    body = await request.body()
+    request_fingerprint = idempotency.fingerprint(
+        request.method, request.url.path, request.url.query, request.headers.get("accept", ""), body
+    )
+    entry = await idempotency.claim(key, request_fingerprint)
+    if entry is not None:
+        if entry["fingerprint"] != request_fingerprint:
+            return JSONResponse({"detail": "Idempotency-Key was already used for a different request"}, status_code=422)
+        if entry["state"] != "done":
+            return JSONResponse(
+                {"detail": "A request with this Idempotency-Key is still running"},
+                status_code=409, headers={"Retry-After": "1"}
+            )
+        logger.info("idempotency.replayed", extra={"path": request.url.path})
+        replay = Response(content=entry["body"], status_code=entry["status"])
+        # Entries saved before headers were kept only have the content type
+        headers = entry.get("headers")
+        if headers is None:
+            headers = [("content-length", str(len(entry["body"])))]
+            if entry.get("media_type"):
+                headers.append(("content-type", entry["media_type"]))
+        replay.raw_headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+        replay.headers["Idempotent-Replayed"] = "true"
+        return replay
+
+    try:
+        response = await call_next(request)
+        content = b"".join([chunk async for chunk in response.body_iterator])
+    except BaseException:
+        await idempotency.abandon(key, request_fingerprint)
+        raise
+    response = _with_body(response, content)
+    # Only successes are saved: after an error (a 409 conflict, a 404,
+    # a refusal, a server error) a retry with the same key runs again
+    if 200 <= response.status_code < 300:
+        headers = [(k.decode("latin-1"), v.decode("latin-1")) for k, v in response.raw_headers]
+        await idempotency.finish(key, request_fingerprint, response.status_code, headers, content)
+    else:
+        await idempotency.abandon(key, request_fingerprint)
+    return response
+
+# --- Compression ---
+# Between the idempotency middleware (which saves uncompressed bodies)
+# and the latency middleware (which times the compression too).
+
+@app.middleware("http")
+async def compress_responses(request: Request, call_next):
+    """Compresses JSON/MessagePack responses with the best coding the client accepts (see app/wire.py)."""
+    response = await call_next(request)
+    encoding = wire.choose_encoding(request.headers.get("accept-encoding"))
+    if (encoding is None or "content-encoding" in response.headers
+            or not wire.compressible(response.headers.get("content-type"))):
+        return response
+
+    content = b"".join([chunk async for chunk in response.body_iterator])
+    compressed = len(content) >= wire.MIN_COMPRESS_BYTES
+    if compressed:
+        content = await asyncio.to_thread(wire.compress, content, encoding)
+    response = _with_body(response, content)
+    response.headers.add_vary_header("Accept-Encoding") # Keeps "Vary: Accept" from list endpoints
+    if compressed:
+        response.headers["content-encoding"] = encoding
+    return response
+
+# --- Instrumentation ---
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Records every request's latency, labelled by its route template."""
+    start = time.perf_counter()
+    status = 500
+    capture = diagnostics.capture_for(request.url.path) # None unless a route profile is armed
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        if capture:
+            capture.exit()
+        # Use the template ("/donors/{donor_id}"), not the raw path,
+        # so there is one series per endpoint rather than per id.
+        route = request.scope.get("route")
+        path = route.path if route else "unmatched"
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, request.method, path, status)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Latency histograms in the Prometheus text format."""
+    return metrics.render_metrics()
+
+@app.get("/cluster")
+def get_cluster_status():
+    """Which worker answered, and whether it currently runs the scheduled jobs."""
+    return {
+        "node": cluster.NODE_ID,
+        "store": store.kind,
+        "scheduler_leader": cluster.scheduler_election.is_leader,
+    }
+
+def _list_response(request: Request, items: list):
+    """
+    A list endpoint's result: returned as is (JSON) unless the client's
+    Accept header asks for a compact format (see app/wire.py).
+    """
+    media_type = wire.choose_format(request.headers.get("accept"))
+    if media_type == wire.JSON:
+        return items
+    return Response(wire.render(items, media_type), media_type=media_type, headers={"Vary": "Accept"})
 
 @app.get("/")
 def read_root():
@@ -21,7 +218,10 @@ def read_root():
 
 @app.post("/donors", response_model=Donor)
 def register_donor(donor: Donor):
-    """Registers a new donor in the system."""
+    """
+    Registers a new donor in the system. A donor with the same name
+    and address is only registered once: repeats return the first.
+    """
     donor_id = db.create_donor(donor)
     new_donor = db.get_donor_by_id(donor_id)
     if not new_donor:
@@ -29,9 +229,17 @@ def register_donor(donor: Donor):
     return new_donor
 
 @app.get("/donors", response_model=List[Donor])
-def get_all_donors():
-    """Gets a list of all donors."""
-    return db.get_all_donors()
+def get_all_donors(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(0, ge=0),
+    updated_since: Optional[datetime] = None
+):
+    """
+    Gets a list of all donors (or one page of them, with skip/limit).
+    Pass ?updated_since= to only get donors changed since then.
+    """
+    return _list_response(request, db.get_all_donors(skip=skip, limit=limit, updated_since=updated_since))
 
 @app.get("/donors/{donor_id}", response_model=Donor)
 def get_donor(donor_id: str):
@@ -43,7 +251,11 @@ def get_donor(donor_id: str):
 
 @app.post("/donors/{donor_id}/food", response_model=Donor)
 def add_food_to_donor_api(donor_id: str, food_item: FoodItem):
-    """Adds a food item to a specific donor's list."""
+    """
+    Adds a food item to a specific donor's list. A lot identical to one
+    the donor already lists (same name, expiry date, quantity and unit)
+    is not added again (a repeated request).
+    """
     
     success = db.add_food_to_donor(donor_id, food_item)
     
@@ -60,7 +272,10 @@ def add_food_to_donor_api(donor_id: str, food_item: FoodItem):
 
 @app.post("/recipients", response_model=Recipient)
 def register_recipient(recipient: Recipient):
-    """Registers a new recipient in the system."""
+    """
+    Registers a new recipient in the system. A recipient with the same
+    name and address is only registered once: repeats return the first.
+    """
     recipient_id = db.create_recipient(recipient)
     new_recipient = db.get_recipient_by_id(recipient_id)
     if not new_recipient:
@@ -68,9 +283,17 @@ def register_recipient(recipient: Recipient):
     return new_recipient
 
 @app.get("/recipients", response_model=List[Recipient])
-def get_all_recipients():
-    """Gets a list of all recipients."""
-    return db.get_all_recipients()
+def get_all_recipients(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(0, ge=0),
+    updated_since: Optional[datetime] = None
+):
+    """
+    Gets a list of all recipients (or one page of them, with skip/limit).
+    Pass ?updated_since= to only get recipients changed since then.
+    """
+    return _list_response(request, db.get_all_recipients(skip=skip, limit=limit, updated_since=updated_since))
 
 @app.get("/recipients/{recipient_id}", response_model=Recipient)
 def get_recipient(recipient_id: str):
@@ -83,36 +306,161 @@ def get_recipient(recipient_id: str):
 # --- Food & Matching Endpoints ---
 
 @app.get("/food/available", response_model=List[AvailableFood])
-def list_available_food():
+def list_available_food(request: Request, min_version: Optional[datetime] = None):
     """Returns a list of all currently available food items
-    with their donor info."""
-    return db.get_all_available_food()
+    with their donor info.
+
+    Served from the resident inventory. After writing to a donor,
+    pass its 'updated_at' as ?min_version= to be sure to see the
+    write, whichever worker answers.
+    """
+    return _list_response(request, available_food(min_version))
 
 @app.post("/matches/run", response_model=List[MatchResult])
-def run_matchmaker():
+def run_matchmaker(
+    request: Request,
+    reserve: bool = True,
+    min_version: Optional[datetime] = None,
+    horizon_days: int = Query(0, ge=0, le=14),
+    trace: bool = False
+):
     """
     Runs the matching algorithm.
     Fetches all recipients and all available food,
     and returns a list of proposed matches.
+
+    Each match holds its food (see data.reserve_lot) so another
+    dispatcher running matching meanwhile cannot be given the same
+    food. Matches whose food was taken first are shrunk or dropped.
+    Pass ?reserve=false for a preview that holds nothing, and
+    ?min_version= as for /food/available.
+
+    With ?horizon_days=N the matcher plans N days ahead: soonest-expiring
+    food goes first, and long-lasting food is kept back for days the
+    forecast says will be short (see app/forecast.py).
+
+    Rate limited per client, and concurrent identical requests share one
+    matcher run (each still holds its own food). 429 when over capacity.
+
+    With ?trace=true the run is recorded as a match job with a trace of
+    why each recipient got what it got (not shared with other requests);
+    the job's ID comes back in the X-Match-Job-Id header, and the trace
+    from GET /matches/jobs/{job_id}/trace.
     """
+    if trace:
+        return _run_traced_match(request, reserve, min_version, horizon_days)
+
+    def compute():
+        with admission.matching:
+            all_recipients = db.get_all_recipients()
+            all_food = available_food(min_version)
+            if horizon_days:
+                all_food = forecast.plan_todays_food(all_food, all_recipients, horizon_days)
+            return match.run_matching_algorithm(all_recipients, all_food)
+
     try:
-        all_recipients = db.get_all_recipients()
-        all_food = db.get_all_available_food()
-        
-        matches = match.run_matching_algorithm(all_recipients, all_food)
+        # Not shared across a write to the food or the recipients
+        key = (min_version, horizon_days, generations(("donors", "recipients")))
+        matches = admission.match_runs.do(key, compute)
+        if reserve:
+            matches = dispatch.reserve_matches(matches)
         
-        return matches
+        return _list_response(request, matches)
         
+    except admission.OverCapacity:
+        raise
     except Exception as e:
-        print(f"Error running matchmaker: {e}")
+        logger.exception("match.run_failed", extra={"error": e})
         raise HTTPException(status_code=500, detail="Error running matching algorithm")
 
+def _run_traced_match(request: Request, reserve: bool, min_version: Optional[datetime], horizon_days: int):
+    """/matches/run?trace=true: one uncoalesced run, saved as a "run" job with its trace."""
+    job_id = db.create_match_job(MatchJob(trigger="run", node=cluster.NODE_ID, traced=True))
+    try:
+        with admission.matching:
+            all_recipients = db.get_all_recipients()
+            food = planned = available_food(min_version)
+            if horizon_days:
+                planned = forecast.plan_todays_food(food, all_recipients, horizon_days)
+            matches, match_trace = explain.run_traced(all_recipients, food, planned)
+        db.save_match_trace(job_id, match_trace)
+        if reserve:
+            matches = dispatch.reserve_matches(matches)
+        db.finish_match_job(job_id, status="complete", matches=len(matches))
+    except admission.OverCapacity as e:
+        db.finish_match_job(job_id, status="failed", error=e.detail)
+        raise
+    except Exception as e:
+        logger.exception("match.run_failed", extra={"job_id": job_id, "error": e})
+        db.finish_match_job(job_id, status="failed", error=str(e))
+        raise HTTPException(status_code=500, detail="Error running matching algorithm")
+
+    response = _list_response(request, matches)
+    if not isinstance(response, Response):
+        response = JSONResponse([m.model_dump(mode="json") for m in response])
+    response.headers["X-Match-Job-Id"] = job_id
+    return response
+
+@app.post("/matches/release")
+def release_matches(matches: List[MatchResult]):
+    """Gives the food held for these matches back (e.g. before matching again)."""
+    released = sum(
+        1 for m in matches
+        if m.lot_id and m.hold_id and db.release_hold(m.donor_id, m.lot_id, m.hold_id)
+    )
+    return {"released": released}
+
+@app.get("/matches/jobs", response_model=List[MatchJob])
+def list_match_jobs(limit: int = Query(20, ge=1, le=200)):
+    """The most recent automatic (and "run now") matching jobs, newest first."""
+    return db.get_match_jobs(limit)
+
+@app.post("/matches/jobs", response_model=MatchJob)
+def run_match_job_now(trace: Optional[bool] = None):
+    """
+    Runs a matching job now: match, hold the food, batch the matches
+    into routes and create the pickups. 409 if a job is already running.
+    Rate limited together with /matches/run.
+
+    ?trace=true (or false) overrides FOOD_RESCUE_MATCH_TRACE for this job.
+    """
+    job_id = scheduler.auto_matcher.run("manual", trace)
+    if job_id is None:
+        raise HTTPException(status_code=409, detail="A matching job is already running")
+    return db.get_match_job_by_id(job_id)
+
+@app.get("/matches/jobs/{job_id}/trace", response_model=MatchTrace)
+def get_match_job_trace(job_id: str, recipient_id: Optional[PyObjectId] = None):
+    """
+    Why a traced job's run matched what it did (see app/explain.py):
+    the food it could and could not use, and per recipient the lots
+    considered, skipped and allocated. Pass ?recipient_id= for just one
+    recipient. 404 if the job was not traced.
+    """
+    trace = db.get_match_trace(job_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="No trace for this match job")
+    if recipient_id is not None:
+        trace.recipients = [r for r in trace.recipients if str(r.recipient_id) == str(recipient_id)]
+    return trace
+
 # --- Logistics / Pickup Endpoints ---
 
 @app.get("/pickups", response_model=List[Pickup])
-def get_pending_pickups():
-    """Gets a list of all pickup routes (e.g., all_pickups)."""
-    return db.get_all_pickups()
+def get_pending_pickups(
+    request: Request,
+    status: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(0, ge=0),
+    updated_since: Optional[datetime] = None
+):
+    """
+    Gets a list of all pickup routes (e.g., all_pickups).
+    Pass ?status=pending to only get routes in that state,
+    skip/limit to get one page, and ?updated_since= to only
+    get routes changed since then.
+    """
+    return _list_response(request, db.get_all_pickups(status=status, skip=skip, limit=limit, updated_since=updated_since))
 
 @app.post("/pickups", response_model=Pickup)
 def create_pickup_route(matches: List[MatchResult]):
@@ -120,43 +468,20 @@ def create_pickup_route(matches: List[MatchResult]):
     Creates a new pickup route from a list of matches.
     This is a simplified version; a real version would
     run a route optimization algorithm here.
+
+    Sending the same held matches again returns the route already
+    created for them.
     """
     if not matches:
         raise HTTPException(status_code=400, detail="No matches provided to create a pickup")
 
-    # --- Simple "Route" Generation ---
-    stops: List[PickupStop] = []
-    addresses_seen = set() # To help de-duplicate
-
-    for match in matches:
-        # Stop 1: Go to the donor
-        donor = db.get_donor_by_id(str(match.donor_id)) # Use str()
-        if donor and donor.address not in addresses_seen:
-            stops.append(PickupStop(
-                stop_type="pickup",
-                name=match.donor_name,
-                address=donor.address
-            ))
-            addresses_seen.add(donor.address)
-
-        # Stop 2: Go to the recipient
-        recipient = db.get_recipient_by_id(str(match.recipient_id)) # Use str()
-        if recipient and recipient.address not in addresses_seen:
-            stops.append(PickupStop(
-                stop_type="dropoff",
-                name=match.recipient_name,
-                address=recipient.address
-            ))
-            addresses_seen.add(recipient.address)
-    
-    # Create the new Pickup object
-    new_pickup = Pickup(
-        matches=matches,
-        stops=stops
-    )
-    
-    # Save to database
-    pickup_id = db.create_pickup(new_pickup)
+    # The food stays held (without expiring) until the route is completed.
+    # If a hold lapsed and someone else has taken the food, nothing is created.
+    try:
+        with admission.routing:
+            pickup_id = dispatch.create_route(matches)
+    except dispatch.ReservationConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     created_pickup = db.get_pickup_by_id(pickup_id)
     
     if not created_pickup:
@@ -180,31 +505,216 @@ def complete_pickup_route(pickup_id: str):
         raise HTTPException(status_code=400, detail="This pickup is already complete")
 
     # 2. "Close the loop" - Update the inventory
-    print(f"--- Completing Pickup {pickup.id} ---")
-    
     errors = []
+    delivered = []
     for match in pickup.matches:
-        print(f"  > Updating: {match.quantity_matched} {match.unit} of {match.food_name} from {match.donor_name}")
+        # Per-item lines are DEBUG, so they are sampled (see app/logs.py)
+        logger.debug("pickup.item_update", extra={
+            "pickup_id": pickup_id, "food": match.food_name, "donor": match.donor_name,
+            "quantity": match.quantity_matched, "unit": match.unit
+        })
         
         # Call our new database function
         success = db.update_food_item_quantity(match)
         
         if not success:
-            error_msg = f"  > FAILED to update quantity for {match.food_name} from {match.donor_name}"
-            print(error_msg)
+            error_msg = f"FAILED to update quantity for {match.food_name} from {match.donor_name}"
+            logger.warning("pickup.item_update_failed", extra={
+                "pickup_id": pickup_id, "food": match.food_name, "donor": match.donor_name
+            })
             errors.append(error_msg)
+        else:
+            delivered.append(match)
 
-    if errors:
-        # In a real app, you might handle this differently
-        # (e.g., not mark as complete, or save the errors)
-        print("WARNING: Some items failed to update.")
-
-    print("--------------------------------------")
+    # In a real app, you might handle failures differently
+    # (e.g., not mark as complete, or save the errors)
+    logger.info("pickup.completed", extra={
+        "pickup_id": pickup_id, "items": len(pickup.matches), "failed": len(errors)
+    })
 
     # 3. Update the pickup status
     success = db.update_pickup_status(pickup_id, "complete")
     if not success:
         raise HTTPException(status_code=500, detail="Failed to update pickup status")
+
+    # 4. Add it to the analytics rollups (a failure here must not undo the delivery)
+    try:
+        rollups.record_completed_pickup(pickup, delivered, datetime.now())
+    except Exception as e:
+        logger.exception("rollups.record_failed", extra={"pickup_id": pickup_id, "error": e})
         
     pickup.status = "complete"
-    return pickup
\ No newline at end of file
+    return pickup
+
+# --- Analytics ---
+
+@app.get("/analytics/daily", response_model=List[DailyRollup])
+def get_daily_analytics(request: Request, since: Optional[date] = None, until: Optional[date] = None):
+    """Food delivered per day in [since, until), with stops per route and quantity per stop."""
+    return _list_response(request, rollups.get_daily(since, until))
+
+@app.get("/analytics/donors", response_model=List[PartnerRollup])
+def get_donor_analytics(request: Request, since: Optional[date] = None, until: Optional[date] = None):
+    """Food delivered from each donor in [since, until), largest first."""
+    return _list_response(request, rollups.get_partners("donors", since, until))
+
+@app.get("/analytics/recipients", response_model=List[PartnerRollup])
+def get_recipient_analytics(request: Request, since: Optional[date] = None, until: Optional[date] = None):
+    """Food delivered to each recipient in [since, until), largest first."""
+    return _list_response(request, rollups.get_partners("recipients", since, until))
+
+@app.get("/forecast", response_model=List[ForecastDay])
+def get_forecast(days: int = Query(7, ge=1, le=28)):
+    """Predicted daily supply and demand, starting tomorrow."""
+    return forecast.forecast_days(db.get_all_recipients(), days)
+
+# --- Exports ---
+
+EXPORT_SOURCES = {
+    "pickups": lambda since, until, status: db.iter_pickup_rows(since, until, status),
+    "matches": lambda since, until, status: db.iter_match_rows(since, until, status),
+    "inventory": lambda since, until, status: db.iter_inventory_rows(since, until),
+}
+
+@app.get("/export/{dataset}")
+def export_dataset(
+    dataset: str,
+    format: str = Query("csv", pattern="^(csv|parquet)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    status: Optional[str] = None,
+    gzip: bool = False
+):
+    """
+    Streams a dataset as CSV (or Parquet) straight from MongoDB:
+      pickups    one row per pickup, created in [since, until)
+      matches    one row per match on those pickups
+      inventory  one row per lot, expiring in [since, until)
+    ?status= filters pickups/matches by pickup status; ?gzip=true
+    compresses the download.
+    """
+    if dataset not in EXPORT_SOURCES:
+        raise HTTPException(status_code=404, detail=f"Unknown export '{dataset}'")
+    if format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export needs pyarrow installed on the server")
+
+    rows = EXPORT_SOURCES[dataset](since, until, status)
+    columns = export.COLUMNS[dataset]
+    if format == "parquet":
+        chunks, media_type = export.stream_parquet(rows, columns), "application/vnd.apache.parquet"
+    else:
+        chunks, media_type = export.stream_csv(rows, columns), "text/csv"
+    filename = f"{dataset}.{format}"
+    if gzip:
+        chunks, media_type, filename = export.gzipped(chunks), "application/gzip", filename + ".gz"
+
+    logger.info("export.started", extra={"dataset": dataset, "format": format, "gzip": gzip})
+    # A plain generator: Starlette iterates it on a worker thread,
+    # so a long export never blocks the event loop
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# --- Change Feed ---
+
+@app.get("/events")
+async def stream_events(request: Request, collections: Optional[str] = None):
+    """
+    Server-Sent Events stream of changed documents.
+    Each 'change' event carries {"collection": ..., "document": ...}
+    with the document's new version. Pass ?collections=donors,pickups
+    to only receive some collections.
+
+    If a client falls too far behind, the stream is closed; it should
+    reconnect and catch up with ?updated_since= on the list endpoints.
+    """
+    wanted = set(collections.split(",")) if collections else None
+    subscription = bus.subscribe(wanted)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), timeout=EVENTS_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    break # Fell behind, the client will resync
+                yield f"event: change\ndata: {json.dumps(event)}\n\n"
+        finally:
+            bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+# --- Diagnostics (opt-in) ---
+
+def _require_diagnostics(authorization: Optional[str]):
+    """Diagnostics look like they don't exist unless a token is configured."""
+    if not diagnostics.enabled():
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not diagnostics.authorized(authorization):
+        raise HTTPException(status_code=401, detail="Invalid diagnostics token")
+
+@app.post("/diagnostics/profile", response_class=PlainTextResponse)
+def profile_server(
+    seconds: float = Query(10, gt=0, le=diagnostics.MAX_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    authorization: Optional[str] = Header(None)
+):
+    """
+    Samples every thread's stack for `seconds` and returns collapsed
+    stacks (feed them to flamegraph.pl or speedscope).
+    Needs FOOD_RESCUE_DIAGNOSTICS_TOKEN set on the server.
+    """
+    _require_diagnostics(authorization)
+    if not diagnostics.busy.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        profiler = diagnostics.profile_for(seconds, interval_ms / 1000)
+    finally:
+        diagnostics.busy.release()
+    logger.info("diagnostics.profiled", extra={"seconds": seconds, "samples": profiler.samples})
+    return profiler.collapsed()
+
+@app.post("/diagnostics/profile/route", response_class=PlainTextResponse)
+def profile_route(
+    path: str,
+    count: int = Query(5, ge=1, le=100),
+    timeout: float = Query(60, gt=0, le=600),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    authorization: Optional[str] = Header(None)
+):
+    """
+    Samples while the next `count` requests to `path` (e.g. /matches/run)
+    are being handled, or until `timeout` seconds pass, and returns
+    collapsed stacks. The X-Profiled-Requests header says how many
+    requests were caught.
+    """
+    _require_diagnostics(authorization)
+    if not diagnostics.busy.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    capture = diagnostics.RouteCapture(path, count, interval_ms / 1000)
+    diagnostics.armed = capture
+    try:
+        capture.done.wait(timeout)
+    finally:
+        diagnostics.armed = None
+        capture.cancel()
+        capture.done.wait(diagnostics.MAX_SECONDS) # Let in-flight requests finish
+        capture.profiler.stop() # Waits for the sampler's last pass (we are on a worker thread)
+        diagnostics.busy.release()
+    logger.info("diagnostics.route_profiled", extra={"path": path, "requests": capture.profiled})
+    return PlainTextResponse(
+        capture.profiler.collapsed(),
+        headers={"X-Profiled-Requests": str(capture.profiled)}
+    )
@@ -0,0 +1,65 @@
+import os
+import socket
+import threading
+import uuid
+from app.logs import logger
+from app.store import store
+
+# Identifies this worker process across the whole deployment
+NODE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+# A leader that stops renewing (crash, network split) loses the lease
+# after this many seconds and another node takes over.
+LEASE_SECONDS = float(os.environ.get("FOOD_RESCUE_LEASE_SECONDS", "15"))
+
+class LeaderElection:
+    """
+    Lease-based leader election over the shared store. Every worker
+    runs one; at most one holds the lease at a time. The holder renews
+    it every third of the lease, the others retry to take it.
+
+    Jobs that must run once per deployment (scheduled matching) check
+    `is_leader` before running.
+    """
+
+    def __init__(self, name: str, lease_seconds: float = LEASE_SECONDS):
+        self.key = f"leader:{name}"
+        self.lease_seconds = lease_seconds
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"{self.key}-election", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self.is_leader:
+            # Hand over now instead of making the others wait out the lease
+            store.delete(self.key, NODE_ID)
+            self.is_leader = False
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._campaign()
+            self._stop.wait(self.lease_seconds / 3)
+
+    def _campaign(self):
+        was_leader = self.is_leader
+        try:
+            if was_leader:
+                self.is_leader = store.extend(self.key, NODE_ID, self.lease_seconds)
+            else:
+                self.is_leader = store.add(self.key, NODE_ID, self.lease_seconds)
+        except Exception as e:
+            # Cannot reach the store: we may have lost the lease without knowing
+            logger.warning("cluster.election_failed", extra={"key": self.key, "error": e})
+            self.is_leader = False
+        if self.is_leader != was_leader:
+            logger.info("cluster.leader_changed", extra={"key": self.key, "node": NODE_ID, "leader": self.is_leader})
+
+# Elects the node that runs scheduled jobs (see api.lifespan)
+scheduler_election = LeaderElection("scheduler")
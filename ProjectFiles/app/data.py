@@ -1,151 +1,730 @@
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+import os
+import threading
+import time
 from app.models import (
     Donor, Recipient, FoodItem, 
     PyObjectId, AvailableFood,
-    MatchResult, Pickup, PickupStop  # <-- Make sure these are imported
+    MatchResult, Pickup, PickupStop,  # <-- Make sure these are imported
+    MatchJob, MatchTrace
 )
-from typing import List, Optional
+from typing import List, Optional, Dict
+from datetime import datetime, timedelta
 from bson import ObjectId
+from app.events import bus
+from app.logs import logger
+from app.metrics import traced
+from app.singleflight import single_flight, wrote
 
 # --- Database Connection ---
-try:
-    client = MongoClient("mongodb://localhost:27017/")
-    client.admin.command('ping')
-    print("MongoDB connection successful.")
-except ConnectionFailure:
-    print("MongoDB connection failed. Is the server running?")
-    client = None
-
-if client:
-    db = client.food_rescue_db
-    donors_collection = db.donors
-    recipients_collection = db.recipients
-    pickups_collection = db.pickups # <-- NEW COLLECTION
-else:
-    db = None
-    donors_collection = None
-    recipients_collection = None
-    pickups_collection = None # <-- NEW COLLECTION
+
+# Override these to point the API at another server or database
+# (e.g. the benchmark database seeded by benchmarks/loadtest.py).
+MONGO_URL = os.environ.get("FOOD_RESCUE_MONGO_URL", "mongodb://localhost:27017/")
+DB_NAME = os.environ.get("FOOD_RESCUE_DB", "food_rescue_db")
+
+# How long a match holds its share of a lot before the hold lapses
+# (a dispatcher who never turns the matches into a route)
+HOLD_SECONDS = int(os.environ.get("FOOD_RESCUE_HOLD_SECONDS", "900"))
+
+# Attempts at a compare-and-set before giving up (another planner kept winning)
+MAX_CAS_RETRIES = 5
+
+# How long to wait for MongoDB before a call fails (pymongo's default is 30s)
+SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("FOOD_RESCUE_MONGO_TIMEOUT_MS", "5000"))
+
+# Nothing connects at import time: importing this module (every API
+# worker, every test, every benchmark) stays fast, and a down database
+# cannot make the import hang. The API connects in its lifespan
+# handler; anything else connects on first use.
+client = None
+db = None
+_connect_lock = threading.Lock()
+
+# Indexes and the backfill are only done once the server answered. If
+# it was down, a later connect() (at most every SETUP_RETRY_SECONDS)
+# tries again, so they are never skipped for the life of the process.
+SETUP_RETRY_SECONDS = 30
+_prepared = False
+_last_setup_attempt = 0.0
+
+def connect():
+    """Creates the MongoDB client, checks the server and prepares indexes."""
+    global client, db, _prepared, _last_setup_attempt
+    with _connect_lock:
+        if _prepared or (db is not None and time.monotonic() - _last_setup_attempt < SETUP_RETRY_SECONDS):
+            return db
+        # pymongo is only imported once a connection is actually needed
+        from pymongo import MongoClient
+        from pymongo.errors import PyMongoError
+
+        if client is None:
+            # The client reconnects by itself once the server is up
+            client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS)
+            db = client[DB_NAME]
+        _last_setup_attempt = time.monotonic()
+        try:
+            client.admin.command('ping')
+            # Every write stamps 'updated_at' so clients can ask for
+            # "only what changed since X" instead of whole collections.
+            for collection in (db.donors, db.recipients, db.pickups):
+                collection.create_index("updated_at")
+            # Expired keys of the shared store (app/store.py) are removed by MongoDB
+            db.shared_state.create_index("expires_at", expireAfterSeconds=0)
+            # Date-range exports of the pickup history
+            db.pickups.create_index("created_at")
+            # Lets the expiry sweeper and the available-food query skip donors quickly
+            db.donors.create_index("current_donations.expiry_date")
+            # Natural keys: registering the same donor or recipient twice,
+            # or routing the same holds twice, finds the first document
+            _create_unique_index(db.donors, [("name", 1), ("address", 1)])
+            _create_unique_index(db.recipients, [("name", 1), ("address", 1)])
+            _create_unique_index(db.pickups, [("route_key", 1)], sparse=True)
+            _backfill_lot_ids(db.donors)
+            _prepared = True
+            logger.info("mongo.connected", extra={"url": MONGO_URL, "db": DB_NAME})
+        except PyMongoError as e:
+            logger.error("mongo.connection_failed", extra={
+                "url": MONGO_URL, "error": e, "retry_seconds": SETUP_RETRY_SECONDS
+            })
+        return db
+
+def _create_unique_index(collection, keys, **options):
+    """A unique index; if duplicates already exist, logs them and goes on without it."""
+    from pymongo.errors import OperationFailure
+    try:
+        collection.create_index(keys, unique=True, **options)
+    except OperationFailure as e:
+        logger.warning("mongo.unique_index_failed", extra={
+            "collection": collection.name, "keys": [k for k, _ in keys], "error": e
+        })
+
+def _backfill_lot_ids(donors):
+    """Gives lots added before reservations existed a lot_id and version."""
+    for doc in donors.find({"current_donations": {"$elemMatch": {"lot_id": {"$exists": False}}}}):
+        lots = doc["current_donations"]
+        for lot in lots:
+            lot.setdefault("lot_id", str(ObjectId()))
+            lot.setdefault("version", 0)
+        # Only if nobody changed the list meanwhile; otherwise the next start retries
+        donors.update_one(
+            {"_id": doc["_id"], "updated_at": doc.get("updated_at")},
+            {"$set": {"current_donations": lots}}
+        )
+
+def close():
+    """Closes the MongoDB client (API shutdown)."""
+    global client, db, _prepared
+    with _connect_lock:
+        if client is not None:
+            client.close()
+        client, db, _prepared = None, None, False
+
+def get_db():
+    """The database, connecting on first use (and finishing setup if that failed)."""
+    return db if _prepared else connect()
+
+def _donors():
+    return get_db().donors
+
+def _recipients():
+    return get_db().recipients
+
+def _pickups():
+    return get_db().pickups # <-- NEW COLLECTION
+
+def _match_jobs():
+    return get_db().match_jobs
+
+def _match_traces():
+    return get_db().match_traces
+
+def _changed_since(updated_since: Optional[datetime]) -> dict:
+    """Query filter for documents written at or after `updated_since`."""
+    if updated_since is None:
+        return {}
+    # $gte (not $gt) so a write in the same millisecond is never missed;
+    # clients upsert, so seeing a document twice is harmless.
+    return {"updated_at": {"$gte": updated_since}}
+
+def _publish(collection_name: str, model_cls, data: Optional[dict]):
+    """Pushes the new version of a changed document to the change feed."""
+    if data and bus.has_subscribers():
+        document = model_cls(**data).model_dump(mode="json", by_alias=True)
+        bus.publish(collection_name, document)
+
+# Called with a donor's document after every write to it (see app/inventory.py)
+donor_listeners = []
+
+def _donor_changed(donor_id, data: Optional[dict] = None):
+    """Re-reads a changed donor (unless given) for the change feed and the listeners."""
+    wrote("donors")
+    if not donor_listeners and not bus.has_subscribers():
+        return
+    if data is None:
+        data = _donors().find_one({"_id": ObjectId(donor_id)})
+    if data is None:
+        return
+    for listener in donor_listeners:
+        listener(data)
+    _publish("donors", Donor, data)
+
+def _publish_by_id(collection, model_cls, doc_id):
+    """Re-reads a changed document and publishes it, but only if anyone is listening."""
+    if bus.has_subscribers():
+        _publish(collection.name, model_cls, collection.find_one({"_id": ObjectId(doc_id)}))
+
+def _existing_id(collection, natural_key: dict) -> str:
+    """The ID of the document an insert collided with on a unique index."""
+    logger.info("mongo.duplicate_ignored", extra={"collection": collection.name})
+    return str(collection.find_one(natural_key, {"_id": 1})["_id"])
 
 # --- Donor Functions ---
 
+@traced("mongo.create_donor")
 def create_donor(donor: Donor) -> str:
-    """Adds a new donor to the DB and returns their new ID."""
+    """
+    Adds a new donor to the DB and returns their new ID. If a donor
+    with the same name and address exists, returns theirs instead.
+    """
+    from pymongo.errors import DuplicateKeyError
     donor_dict = donor.model_dump(by_alias=True, exclude=["id"])
-    result = donors_collection.insert_one(donor_dict)
+    donor_dict["updated_at"] = datetime.now()
+    for lot in donor_dict.get("current_donations", []):
+        lot.update(lot_id=str(ObjectId()), version=0, holds=[]) # Never the client's
+    try:
+        result = _donors().insert_one(donor_dict)
+    except DuplicateKeyError:
+        return _existing_id(_donors(), {"name": donor_dict["name"], "address": donor_dict["address"]})
+    _donor_changed(result.inserted_id, donor_dict) # insert_one filled in '_id'
     return str(result.inserted_id)
 
+@traced("mongo.get_donor_by_id")
 def get_donor_by_id(donor_id: str) -> Optional[Donor]:
     """Fetches a single donor from the DB by their string ID."""
     try:
-        data = donors_collection.find_one({"_id": ObjectId(donor_id)})
+        data = _donors().find_one({"_id": ObjectId(donor_id)})
         if data:
             return Donor(**data)
     except Exception as e:
-        print(f"Error finding donor: {e}")
+        logger.warning("mongo.find_donor_failed", extra={"donor_id": donor_id, "error": e})
         return None
     return None
 
-def get_all_donors() -> List[Donor]:
-    """Fetches all donors from the DB."""
+@single_flight("mongo.get_all_donors", collections=("donors",))
+@traced("mongo.get_all_donors")
+def get_all_donors(skip: int = 0, limit: int = 0, updated_since: Optional[datetime] = None) -> List[Donor]:
+    """
+    Fetches donors from the DB, oldest first.
+    `skip`/`limit` select one page; limit=0 means no limit.
+    `updated_since` only returns donors changed since then.
+    """
     donors = []
-    for data in donors_collection.find():
+    query = _changed_since(updated_since)
+    for data in _donors().find(query).sort("_id", 1).skip(skip).limit(limit):
         donors.append(Donor(**data))
     return donors
 
+@traced("mongo.get_donor_documents")
+def get_donor_documents(updated_since: Optional[datetime] = None) -> List[dict]:
+    """Raw donor documents (for the resident inventory), oldest first."""
+    return list(_donors().find(_changed_since(updated_since)).sort("_id", 1))
+
+@traced("mongo.get_donors_by_ids")
+def get_donors_by_ids(donor_ids) -> Dict[str, Donor]:
+    """Fetches several donors in one query, keyed by their string ID."""
+    ids = [ObjectId(i) for i in donor_ids if ObjectId.is_valid(i)]
+    return {str(data["_id"]): Donor(**data) for data in _donors().find({"_id": {"$in": ids}})}
+
 # --- Recipient Functions ---
 
+@traced("mongo.create_recipient")
 def create_recipient(recipient: Recipient) -> str:
-    """Adds a new recipient to the DB and returns their new ID."""
+    """
+    Adds a new recipient to the DB and returns their new ID. If a
+    recipient with the same name and address exists, returns theirs.
+    """
+    from pymongo.errors import DuplicateKeyError
     recipient_dict = recipient.model_dump(by_alias=True, exclude=["id"])
-    result = recipients_collection.insert_one(recipient_dict)
+    recipient_dict["updated_at"] = datetime.now()
+    try:
+        result = _recipients().insert_one(recipient_dict)
+    except DuplicateKeyError:
+        return _existing_id(_recipients(), {"name": recipient_dict["name"], "address": recipient_dict["address"]})
+    wrote("recipients")
+    _publish("recipients", Recipient, recipient_dict)
     return str(result.inserted_id)
 
+@traced("mongo.get_recipient_by_id")
 def get_recipient_by_id(recipient_id: str) -> Optional[Recipient]:
     """Fetches a single recipient from the DB."""
     try:
-        data = recipients_collection.find_one({"_id": ObjectId(recipient_id)})
+        data = _recipients().find_one({"_id": ObjectId(recipient_id)})
         if data:
             return Recipient(**data)
     except Exception as e:
-        print(f"Error finding recipient: {e}")
+        logger.warning("mongo.find_recipient_failed", extra={"recipient_id": recipient_id, "error": e})
         return None
     return None
 
-def get_all_recipients() -> List[Recipient]:
-    """Fetches all recipients from the DB."""
+@single_flight("mongo.get_all_recipients", collections=("recipients",))
+@traced("mongo.get_all_recipients")
+def get_all_recipients(skip: int = 0, limit: int = 0, updated_since: Optional[datetime] = None) -> List[Recipient]:
+    """
+    Fetches recipients from the DB, oldest first.
+    `skip`/`limit` select one page; limit=0 means no limit.
+    `updated_since` only returns recipients changed since then.
+    """
     recipients = []
-    for data in recipients_collection.find():
+    query = _changed_since(updated_since)
+    for data in _recipients().find(query).sort("_id", 1).skip(skip).limit(limit):
         recipients.append(Recipient(**data))
     return recipients
 
+@traced("mongo.get_recipients_by_ids")
+def get_recipients_by_ids(recipient_ids) -> Dict[str, Recipient]:
+    """Fetches several recipients in one query, keyed by their string ID."""
+    ids = [ObjectId(i) for i in recipient_ids if ObjectId.is_valid(i)]
+    return {str(data["_id"]): Recipient(**data) for data in _recipients().find({"_id": {"$in": ids}})}
+
 # --- Food/Donation Functions ---
 
+@traced("mongo.add_food_to_donor")
 def add_food_to_donor(donor_id: str, food_item: FoodItem) -> bool:
-    """Adds a new food item to a specific donor's 'current_donations' list."""
+    """
+    Adds a new food item to a specific donor's 'current_donations' list.
+    A lot's natural key is the whole lot (name, expiry date, quantity
+    and unit): if the donor already lists exactly that lot (a repeated
+    request), nothing is written and True is still returned. A lot that
+    differs in any of them is added. False if the donor does not exist.
+    """
     food_dict = food_item.model_dump()
-    result = donors_collection.update_one(
-        {"_id": ObjectId(donor_id)},
-        {"$push": {"current_donations": food_dict}}
+    food_dict.update(lot_id=str(ObjectId()), version=0, holds=[])
+    same_lot = {"$elemMatch": {
+        "name": food_dict["name"], "expiry_date": food_dict["expiry_date"],
+        "quantity": food_dict["quantity"], "unit": food_dict["unit"]
+    }}
+    # Unique indexes cannot see inside one document's array, so the check is part of the update
+    result = _donors().update_one(
+        {"_id": ObjectId(donor_id), "current_donations": {"$not": same_lot}},
+        {
+            "$push": {"current_donations": food_dict},
+            "$set": {"updated_at": datetime.now()}
+        }
     )
-    return result.modified_count > 0
+    if result.modified_count > 0:
+        _donor_changed(donor_id)
+        return True
+    return _donors().count_documents({"_id": ObjectId(donor_id), "current_donations": same_lot}, limit=1) > 0
 
+@traced("mongo.get_all_available_food")
 def get_all_available_food() -> List[AvailableFood]:
-    """Finds all food items and includes their donor's ID and name."""
+    """
+    Finds all food items and includes their donor's ID and name.
+    Quantities held for other matches are not available, so each
+    item's quantity is what is left after its live holds.
+    Expired food is never returned (the sweeper removes it later).
+    """
+    now = datetime.now()
     pipeline = [
+        {"$match": {"current_donations.expiry_date": {"$gte": now}}}, # Donors with any fresh food
         {"$unwind": "$current_donations"}, # De-nest the food items
+        {"$match": {"current_donations.expiry_date": {"$gte": now}}},
         {
             "$project": { # Reshape the document to include donor info
                 "_id": 0, # Exclude the default _id
                 "donor_id": "$_id",
                 "donor_name": "$name",
                 "name": "$current_donations.name",
-                "quantity": "$current_donations.quantity",
+                "quantity": {"$subtract": ["$current_donations.quantity", _held_quantity(now)]},
                 "unit": "$current_donations.unit",
-                "expiry_date": "$current_donations.expiry_date"
+                "expiry_date": "$current_donations.expiry_date",
+                "lot_id": "$current_donations.lot_id"
             }
-        }
+        },
+        {"$match": {"quantity": {"$gt": 0}}} # Fully held lots are not available
     ]
     available_food_list = []
-    for food_data in donors_collection.aggregate(pipeline):
+    for food_data in _donors().aggregate(pipeline):
         available_food_list.append(AvailableFood(**food_data))
     return available_food_list
 
+@traced("mongo.get_unavailable_food")
+def get_unavailable_food() -> Dict[str, dict]:
+    """
+    Food the matcher is never given, by reason (for match traces):
+      expired  lots past their expiry date (until the sweeper removes them)
+      held     the quantity of fresh lots held for other matches or routes
+    Each reason is {"lots": ..., "quantity": ...}.
+    """
+    now = datetime.now()
+    expired = {"$lt": ["$current_donations.expiry_date", now]}
+    fresh_and_held = {"$and": [{"$not": [expired]}, {"$gt": ["$held", 0]}]}
+    pipeline = [
+        {"$unwind": "$current_donations"},
+        {"$set": {"held": {"$min": [_held_quantity(now), "$current_donations.quantity"]}}},
+        {"$group": {
+            "_id": None,
+            "expired_lots": {"$sum": {"$cond": [expired, 1, 0]}},
+            "expired_quantity": {"$sum": {"$cond": [expired, "$current_donations.quantity", 0]}},
+            "held_lots": {"$sum": {"$cond": [fresh_and_held, 1, 0]}},
+            "held_quantity": {"$sum": {"$cond": [fresh_and_held, "$held", 0]}},
+        }}
+    ]
+    row = next(_donors().aggregate(pipeline), {})
+    return {
+        reason: {"lots": row.get(f"{reason}_lots", 0), "quantity": row.get(f"{reason}_quantity", 0.0)}
+        for reason in ("expired", "held")
+    }
+
+@traced("mongo.get_available_quantity")
+def get_available_quantity() -> float:
+    """Total quantity of fresh food not held by any match (all units added up)."""
+    now = datetime.now()
+    pipeline = [
+        {"$match": {"current_donations.expiry_date": {"$gte": now}}},
+        {"$unwind": "$current_donations"},
+        {"$match": {"current_donations.expiry_date": {"$gte": now}}},
+        {"$group": {"_id": None, "total": {"$sum": {
+            "$subtract": ["$current_donations.quantity", _held_quantity(now)]
+        }}}}
+    ]
+    for row in _donors().aggregate(pipeline):
+        return row["total"]
+    return 0.0
+
+def _expired_unheld(now: datetime) -> dict:
+    """Condition on a lot: expired and not held (food on a pending route stays)."""
+    return {
+        "expiry_date": {"$lt": now},
+        "holds": {"$not": {"$elemMatch": {
+            "$or": [{"expires_at": None}, {"expires_at": {"$gt": now}}]
+        }}}
+    }
+
+@traced("mongo.sweep_expired_lots")
+def sweep_expired_lots(archive: bool = True) -> int:
+    """
+    Removes expired lots from every donor in one update_many, first
+    copying them to the 'expired_lots' collection if `archive`.
+    Returns how many lots were removed.
+    """
+    from pymongo.errors import BulkWriteError
+
+    now = datetime.now()
+    expired = _expired_unheld(now)
+    pipeline = [
+        {"$match": {"current_donations.expiry_date": {"$lt": now}}},
+        {"$unwind": "$current_donations"},
+        {"$match": {f"current_donations.{key}": value for key, value in expired.items()}},
+        {"$project": {
+            "_id": {"$ifNull": ["$current_donations.lot_id", {"$toString": "$$ROOT._id"}]},
+            "donor_id": "$_id",
+            "donor_name": "$name",
+            "name": "$current_donations.name",
+            "quantity": "$current_donations.quantity",
+            "unit": "$current_donations.unit",
+            "expiry_date": "$current_donations.expiry_date"
+        }}
+    ]
+    lots = list(_donors().aggregate(pipeline))
+    if not lots:
+        return 0
+    if archive:
+        for lot in lots:
+            lot["archived_at"] = now
+        try:
+            # Keyed by lot_id, so a lot archived by an earlier, interrupted sweep is skipped
+            get_db().expired_lots.insert_many(lots, ordered=False)
+        except BulkWriteError:
+            pass
+
+    result = _donors().update_many(
+        {"current_donations.expiry_date": {"$lt": now}},
+        {"$pull": {"current_donations": expired}, "$set": {"updated_at": now}}
+    )
+    for donor_id in {lot["donor_id"] for lot in lots}:
+        _donor_changed(donor_id)
+    logger.info("mongo.expired_lots_swept", extra={"lots": len(lots), "donors": result.modified_count})
+    return len(lots)
+
+def _held_quantity(now: datetime) -> dict:
+    """Aggregation expression: the total of a lot's holds that have not lapsed."""
+    return {"$sum": {"$map": {
+        "input": {"$filter": {
+            "input": {"$ifNull": ["$current_donations.holds", []]},
+            "as": "hold",
+            "cond": {"$or": [
+                {"$eq": [{"$ifNull": ["$$hold.expires_at", None]}, None]},
+                {"$gt": ["$$hold.expires_at", now]}
+            ]}
+        }},
+        "as": "hold",
+        "in": "$$hold.quantity"
+    }}}
+
+# --- Reservations ---
+# Matching holds part of a lot for each match, so two dispatchers
+# planning at once get disjoint inventory. Each change to a lot is a
+# compare-and-set on its 'version': read the lot, work out its new
+# holds, and write them only if nobody changed the lot meanwhile
+# (otherwise re-read and retry). No lock is held between planners.
+# Lapsed holds are simply dropped the next time the lot is written.
+
+@traced("mongo.reserve_lot")
+def reserve_lot(
+    donor_id,
+    lot_id: str,
+    quantity: float,
+    hold_id: str,
+    ttl: Optional[float] = HOLD_SECONDS,
+    partial: bool = True,
+    renew: bool = False
+) -> float:
+    """
+    Holds up to `quantity` of a lot under `hold_id` (replacing any hold
+    with that ID) for `ttl` seconds, or until released if ttl is None.
+    Returns the quantity held: less than asked if `partial` and the lot
+    is short, 0 if nothing could be held.
+
+    With `renew`, only a live, temporary hold with that ID is replaced:
+    0 if it is missing, lapsed or already permanent (on a route), so a
+    hold can never be committed to two routes.
+    """
+    for _ in range(MAX_CAS_RETRIES):
+        doc = _donors().find_one(
+            {"_id": ObjectId(donor_id), "current_donations.lot_id": lot_id},
+            {"current_donations.$": 1}
+        )
+        if not doc:
+            return 0.0
+        lot = doc["current_donations"][0]
+        now = datetime.now()
+        if renew and not any(
+            h["hold_id"] == hold_id and h.get("expires_at") is not None and h["expires_at"] > now
+            for h in lot.get("holds", [])
+        ):
+            return 0.0
+        holds = [
+            h for h in lot.get("holds", [])
+            if h["hold_id"] != hold_id and (h.get("expires_at") is None or h["expires_at"] > now)
+        ]
+        free = lot["quantity"] - sum(h["quantity"] for h in holds)
+        held = min(quantity, free)
+        if held <= 0 or (held < quantity and not partial):
+            return 0.0
+        holds.append({
+            "hold_id": hold_id,
+            "quantity": held,
+            "expires_at": now + timedelta(seconds=ttl) if ttl else None
+        })
+        result = _donors().update_one(
+            {"_id": doc["_id"], "current_donations": {
+                "$elemMatch": {"lot_id": lot_id, "version": lot.get("version", 0)}
+            }},
+            {
+                "$set": {"current_donations.$.holds": holds, "updated_at": now},
+                "$inc": {"current_donations.$.version": 1}
+            }
+        )
+        if result.modified_count > 0:
+            _donor_changed(donor_id)
+            return held
+    logger.warning("mongo.reserve_contended", extra={"lot_id": lot_id, "hold_id": hold_id})
+    return 0.0
+
+@traced("mongo.release_hold")
+def release_hold(donor_id, lot_id: str, hold_id: str) -> bool:
+    """
+    Gives a held quantity back to its lot. False if the lot has no such
+    hold (already released, lapsed and dropped, or never made).
+    """
+    result = _donors().update_one(
+        {"_id": ObjectId(donor_id), "current_donations": {
+            "$elemMatch": {"lot_id": lot_id, "holds.hold_id": hold_id}
+        }},
+        {
+            "$pull": {"current_donations.$.holds": {"hold_id": hold_id}},
+            "$inc": {"current_donations.$.version": 1},
+            "$set": {"updated_at": datetime.now()}
+        }
+    )
+    if result.modified_count == 1:
+        _donor_changed(donor_id)
+    return result.modified_count == 1
+
 # --- Pickup/Logistics Functions (NEW) ---
 
-def create_pickup(pickup: Pickup) -> str:
-    """Adds a new pickup route to the DB and returns its new ID."""
+@traced("mongo.create_pickup")
+def create_pickup(pickup: Pickup, route_key: Optional[str] = None) -> str:
+    """
+    Adds a new pickup route to the DB and returns its new ID.
+    `route_key` identifies its holds (see dispatch.route_key): if a
+    route with that key exists, its ID is returned instead.
+    """
+    from pymongo.errors import DuplicateKeyError
     pickup_dict = pickup.model_dump(by_alias=True, exclude=["id"])
-    result = pickups_collection.insert_one(pickup_dict)
+    pickup_dict["updated_at"] = datetime.now()
+    if route_key:
+        pickup_dict["route_key"] = route_key
+    try:
+        result = _pickups().insert_one(pickup_dict)
+    except DuplicateKeyError:
+        return _existing_id(_pickups(), {"route_key": route_key})
+    wrote("pickups")
+    _publish("pickups", Pickup, pickup_dict)
     return str(result.inserted_id)
 
-def get_all_pickups() -> List[Pickup]:
-    """Fetches all pickup routes from the DB."""
+@single_flight("mongo.get_all_pickups", collections=("pickups",))
+@traced("mongo.get_all_pickups")
+def get_all_pickups(
+    status: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 0,
+    updated_since: Optional[datetime] = None
+) -> List[Pickup]:
+    """
+    Fetches pickup routes from the DB, oldest first.
+    Optionally only those with the given `status` (e.g. "pending").
+    `skip`/`limit` select one page; limit=0 means no limit.
+    `updated_since` only returns pickups changed since then.
+    """
+    query = _changed_since(updated_since)
+    if status:
+        query["status"] = status
     pickups = []
-    for data in pickups_collection.find():
+    for data in _pickups().find(query).sort("_id", 1).skip(skip).limit(limit):
         pickups.append(Pickup(**data))
     return pickups
 
+@traced("mongo.get_routed_quantities")
+def get_routed_quantities(since: datetime) -> Dict[str, float]:
+    """Quantity on routes created since `since`, per recipient ID."""
+    pipeline = [
+        {"$match": {"created_at": {"$gte": since}}},
+        {"$unwind": "$matches"},
+        {"$group": {"_id": "$matches.recipient_id", "quantity": {"$sum": "$matches.quantity_matched"}}}
+    ]
+    return {str(row["_id"]): row["quantity"] for row in _pickups().aggregate(pipeline)}
+
+# --- Export Cursors ---
+# These return cursors, not lists: the export endpoints stream them
+# batch by batch, so memory stays flat however many rows there are.
+
+EXPORT_BATCH_SIZE = 1000
+
+def _date_range(since: Optional[datetime], until: Optional[datetime]) -> dict:
+    """Filter for since <= value < until (either end optional)."""
+    condition = {}
+    if since:
+        condition["$gte"] = since
+    if until:
+        condition["$lt"] = until
+    return condition
+
+def iter_pickup_rows(since=None, until=None, status=None):
+    """One flat dict per pickup created in [since, until), oldest first."""
+    query = {}
+    if since or until:
+        query["created_at"] = _date_range(since, until)
+    if status:
+        query["status"] = status
+    return _pickups().aggregate([
+        {"$match": query},
+        {"$sort": {"_id": 1}},
+        {"$project": {
+            "_id": 0,
+            "pickup_id": {"$toString": "$_id"},
+            "created_at": 1,
+            "status": 1,
+            "updated_at": 1,
+            "matches": {"$size": "$matches"},
+            "stops": {"$size": "$stops"},
+            "quantity": {"$sum": "$matches.quantity_matched"}
+        }}
+    ], batchSize=EXPORT_BATCH_SIZE)
+
+def iter_match_rows(since=None, until=None, status=None):
+    """One flat dict per match on a pickup created in [since, until)."""
+    query = {}
+    if since or until:
+        query["created_at"] = _date_range(since, until)
+    if status:
+        query["status"] = status
+    return _pickups().aggregate([
+        {"$match": query},
+        {"$sort": {"_id": 1}},
+        {"$unwind": "$matches"},
+        {"$project": {
+            "_id": 0,
+            "pickup_id": {"$toString": "$_id"},
+            "pickup_created_at": "$created_at",
+            "pickup_status": "$status",
+            "donor_id": {"$toString": "$matches.donor_id"},
+            "donor_name": "$matches.donor_name",
+            "recipient_id": {"$toString": "$matches.recipient_id"},
+            "recipient_name": "$matches.recipient_name",
+            "food_name": "$matches.food_name",
+            "quantity": "$matches.quantity_matched",
+            "unit": "$matches.unit",
+            "expiry_date": "$matches.expiry_date",
+            "lot_id": "$matches.lot_id"
+        }}
+    ], batchSize=EXPORT_BATCH_SIZE)
+
+def iter_inventory_rows(since=None, until=None):
+    """One flat dict per lot, for lots expiring in [since, until)."""
+    lot_filter = {}
+    if since or until:
+        lot_filter["current_donations.expiry_date"] = _date_range(since, until)
+    return _donors().aggregate([
+        {"$match": lot_filter},
+        {"$sort": {"_id": 1}},
+        {"$unwind": "$current_donations"},
+        {"$match": lot_filter},
+        {"$project": {
+            "_id": 0,
+            "donor_id": {"$toString": "$_id"},
+            "donor_name": "$name",
+            "lot_id": "$current_donations.lot_id",
+            "food_name": "$current_donations.name",
+            "quantity": "$current_donations.quantity",
+            "held": _held_quantity(datetime.now()),
+            "unit": "$current_donations.unit",
+            "expiry_date": "$current_donations.expiry_date"
+        }}
+    ], batchSize=EXPORT_BATCH_SIZE)
+
+@traced("mongo.get_pickup_id_by_route_key")
+def get_pickup_id_by_route_key(route_key: str) -> Optional[str]:
+    """The ID of the route already made of these holds, if any."""
+    data = _pickups().find_one({"route_key": route_key}, {"_id": 1})
+    return str(data["_id"]) if data else None
+
+@traced("mongo.get_pickup_by_id")
 def get_pickup_by_id(pickup_id: str) -> Optional[Pickup]:
     """Fetches a single pickup from the DB by its string ID."""
     try:
-        data = pickups_collection.find_one({"_id": ObjectId(pickup_id)})
+        data = _pickups().find_one({"_id": ObjectId(pickup_id)})
         if data:
             return Pickup(**data)
     except Exception as e:
-        print(f"Error finding pickup: {e}")
+        logger.warning("mongo.find_pickup_failed", extra={"pickup_id": pickup_id, "error": e})
         return None
     return None
 
+@traced("mongo.update_pickup_status")
 def update_pickup_status(pickup_id: str, status: str) -> bool:
     """Updates the status of a pickup route (e.loc., "complete")."""
-    result = pickups_collection.update_one(
+    result = _pickups().update_one(
         {"_id": ObjectId(pickup_id)},
-        {"$set": {"status": status}}
+        {"$set": {"status": status, "updated_at": datetime.now()}}
     )
+    if result.modified_count > 0:
+        wrote("pickups")
+        _publish_by_id(_pickups(), Pickup, pickup_id)
     return result.modified_count > 0
 
+@traced("mongo.update_food_item_quantity")
 def update_food_item_quantity(match: MatchResult) -> bool:
     """
     Finds a specific food item in a donor's list and updates its quantity.
@@ -153,7 +732,11 @@ def update_food_item_quantity(match: MatchResult) -> bool:
     
     It first tries to find a food item that matches by name, expiry date,
     and has enough quantity.
+
+    Matches that carry a lot_id update that exact lot and drop their hold.
     """
+    if match.lot_id:
+        return _take_from_lot(match)
     
     # We must match the item exactly by name and expiry date
     # This prevents deducting from the wrong "Apples" batch
@@ -182,13 +765,15 @@ def update_food_item_quantity(match: MatchResult) -> bool:
                 "expiry_date": match.expiry_date,
                 "quantity": match.quantity_matched # Only pull if quantity is exact
             }
-        }
+        },
+        "$set": {"updated_at": datetime.now()}
     }
     
-    result = donors_collection.update_one(find_query, update_pull_query)
+    result = _donors().update_one(find_query, update_pull_query)
     
     if result.modified_count > 0:
         # We successfully removed the item (exact quantity match)
+        _donor_changed(match.donor_id)
         return True
         
     # If we didn't remove it, it means the quantity wasn't exact.
@@ -198,7 +783,8 @@ def update_food_item_quantity(match: MatchResult) -> bool:
     update_inc_query = {
         "$inc": {
             "current_donations.$[item].quantity": -match.quantity_matched
-        }
+        },
+        "$set": {"updated_at": datetime.now()}
     }
     
     array_filters = [
@@ -208,10 +794,88 @@ def update_food_item_quantity(match: MatchResult) -> bool:
         }
     ]
     
-    result = donors_collection.update_one(
+    result = _donors().update_one(
         find_query, 
         update_inc_query, 
         array_filters=array_filters
     )
 
-    return result.modified_count > 0
\ No newline at end of file
+    if result.modified_count > 0:
+        _donor_changed(match.donor_id)
+    return result.modified_count > 0
+
+def _take_from_lot(match: MatchResult) -> bool:
+    """
+    Deducts a match from its lot and releases the hold, in one atomic
+    update. Only while the lot still carries the match's hold, so no two
+    pickups can take the same held food.
+    """
+    if not match.hold_id:
+        return False
+    donor_id = ObjectId(match.donor_id)
+    result = _donors().update_one(
+        {"_id": donor_id, "current_donations": {"$elemMatch": {
+            "lot_id": match.lot_id,
+            "quantity": {"$gte": match.quantity_matched},
+            "holds.hold_id": match.hold_id
+        }}},
+        {
+            "$inc": {
+                "current_donations.$.quantity": -match.quantity_matched,
+                "current_donations.$.version": 1
+            },
+            "$pull": {"current_donations.$.holds": {"hold_id": match.hold_id}},
+            "$set": {"updated_at": datetime.now()}
+        }
+    )
+    if result.modified_count == 0:
+        return False
+    # Remove the lot once it is used up (and nothing else holds it)
+    _donors().update_one(
+        {"_id": donor_id},
+        {"$pull": {"current_donations": {
+            "lot_id": match.lot_id, "quantity": {"$lte": 0}, "holds": {"$size": 0}
+        }}}
+    )
+    _donor_changed(match.donor_id)
+    return True
+
+# --- Match Job Functions ---
+
+@traced("mongo.create_match_job")
+def create_match_job(job: MatchJob) -> str:
+    """Records the start of a matching job and returns its ID."""
+    result = _match_jobs().insert_one(job.model_dump(by_alias=True, exclude=["id"]))
+    return str(result.inserted_id)
+
+@traced("mongo.finish_match_job")
+def finish_match_job(job_id: str, **fields) -> bool:
+    """Stores a job's outcome (status, counts, error...)."""
+    fields.setdefault("finished_at", datetime.now())
+    result = _match_jobs().update_one({"_id": ObjectId(job_id)}, {"$set": fields})
+    return result.modified_count > 0
+
+@traced("mongo.get_match_job_by_id")
+def get_match_job_by_id(job_id: str) -> Optional[MatchJob]:
+    data = _match_jobs().find_one({"_id": ObjectId(job_id)})
+    return MatchJob(**data) if data else None
+
+@traced("mongo.save_match_trace")
+def save_match_trace(job_id: str, trace: MatchTrace):
+    """Stores a run's trace under its job's ID (one trace per job)."""
+    trace_dict = trace.model_dump(by_alias=True, exclude=["id"])
+    _match_traces().replace_one({"_id": ObjectId(job_id)}, trace_dict, upsert=True)
+
+@traced("mongo.get_match_trace")
+def get_match_trace(job_id: str) -> Optional[MatchTrace]:
+    try:
+        data = _match_traces().find_one({"_id": ObjectId(job_id)})
+    except Exception as e:
+        logger.warning("mongo.find_match_trace_failed", extra={"job_id": job_id, "error": e})
+        return None
+    return MatchTrace(**data) if data else None
+
+@traced("mongo.get_match_jobs")
+def get_match_jobs(limit: int = 20) -> List[MatchJob]:
+    """The most recent matching jobs, newest first."""
+    return [MatchJob(**data) for data in _match_jobs().find().sort("_id", -1).limit(limit)]
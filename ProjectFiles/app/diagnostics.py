@@ -0,0 +1,153 @@
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+# Diagnostics are off unless this token is set; requests must then
+# send "Authorization: Bearer <token>".
+TOKEN_ENV = "FOOD_RESCUE_DIAGNOSTICS_TOKEN"
+
+MAX_SECONDS = 60
+DEFAULT_INTERVAL = 0.005 # 200 samples per second
+MIN_INTERVAL = 0.001
+
+# Leaf frames in these files mean a thread is idle (waiting for work),
+# so its stack says nothing about where request time goes.
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py", "thread.py")
+
+def enabled() -> bool:
+    return bool(os.environ.get(TOKEN_ENV))
+
+def authorized(authorization: Optional[str]) -> bool:
+    """Checks an Authorization header against the configured token."""
+    token = os.environ.get(TOKEN_ENV)
+    if not token or not authorization or not authorization.startswith("Bearer "):
+        return False
+    return hmac.compare_digest(authorization[len("Bearer "):].encode(), token.encode())
+
+class SamplingProfiler:
+    """
+    Samples every thread's Python stack at a fixed interval from a
+    background thread. Nothing is hooked into the interpreter, so the
+    cost is one stack walk per thread per interval, and only while
+    running.
+
+    Results are collapsed stacks ("outer;inner;leaf count"), the input
+    format of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = max(interval, MIN_INTERVAL)
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        """Stops sampling; with wait=False, returns without waiting for the last sample."""
+        self._stop.set()
+        if wait and self._thread:
+            self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.is_set():
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = self._collapse(frame)
+                if stack:
+                    self.stacks[f"{names.get(ident, ident)};{stack}"] += 1
+            self.samples += 1
+            self._stop.wait(self.interval)
+
+    @staticmethod
+    def _collapse(frame) -> Optional[str]:
+        if frame.f_code.co_filename.endswith(_IDLE_FILES):
+            return None
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+# Only one profile runs at a time
+busy = threading.Lock()
+
+def profile_for(seconds: float, interval: float = DEFAULT_INTERVAL) -> SamplingProfiler:
+    """Samples all threads for `seconds` (blocking). Caller must hold `busy`."""
+    profiler = SamplingProfiler(interval)
+    profiler.start()
+    time.sleep(min(seconds, MAX_SECONDS))
+    profiler.stop()
+    return profiler
+
+# --- Profiling the next K requests to a route ---
+
+class RouteCapture:
+    """Samples while any of the next `count` requests to `path` are in flight."""
+
+    def __init__(self, path: str, count: int, interval: float):
+        self.path = path
+        self.remaining = count
+        self.in_flight = 0
+        self.profiler = SamplingProfiler(interval)
+        self.profiled = 0
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def enter(self) -> bool:
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            self.in_flight += 1
+            self.profiled += 1
+            if self.profiler._thread is None:
+                self.profiler.start()
+            return True
+
+    # exit() runs in the async request middleware, so neither it nor
+    # cancel() joins the sampler thread (that would block the event
+    # loop); whoever reads the results calls profiler.stop() first.
+
+    def exit(self):
+        with self._lock:
+            self.in_flight -= 1
+            finished = self.remaining <= 0 and self.in_flight == 0
+        if finished:
+            self.profiler.stop(wait=False)
+            self.done.set()
+
+    def cancel(self):
+        with self._lock:
+            self.remaining = 0
+            idle = self.in_flight == 0
+        if idle:
+            self.profiler.stop(wait=False)
+            self.done.set()
+
+# The armed capture, if any. The request middleware reads this on every
+# request, so when nothing is armed the cost is a single None check.
+armed: Optional[RouteCapture] = None
+
+def capture_for(path: str) -> Optional[RouteCapture]:
+    """Called by the middleware: the capture this request counts towards, if any."""
+    capture = armed
+    if capture is None or capture.path != path or not capture.enter():
+        return None
+    return capture
@@ -0,0 +1,87 @@
+import hashlib
+from typing import List, Optional
+from bson import ObjectId
+from app.models import MatchResult, Pickup
+from app.logs import logger
+import app.data as db
+import app.match as match
+
+# Shared by the API endpoints and the scheduler (app/scheduler.py):
+# hold the food for matches, and turn held matches into pickup routes.
+
+class ReservationConflict(Exception):
+    """The food for a match was taken by someone else."""
+
+    def __init__(self, m: MatchResult):
+        super().__init__(f"{m.food_name} from {m.donor_name} is no longer available; run matching again")
+        self.match = m
+
+def reserve_matches(matches: List[MatchResult]) -> List[MatchResult]:
+    """Holds the food for each match; keeps only what could be held."""
+    reserved = []
+    for m in matches:
+        if not m.lot_id:
+            reserved.append(m) # Lot without an ID (not reservable), kept as before
+            continue
+        hold_id = str(ObjectId())
+        held = db.reserve_lot(m.donor_id, m.lot_id, m.quantity_matched, hold_id)
+        if held > 0:
+            reserved.append(m.model_copy(update={"hold_id": hold_id, "quantity_matched": held}))
+    if len(reserved) < len(matches):
+        logger.info("match.reservations_lost", extra={"proposed": len(matches), "held": len(reserved)})
+    return reserved
+
+def commit_holds(matches: List[MatchResult]) -> List[MatchResult]:
+    """
+    Makes the matches' holds permanent (until the route is completed).
+    All or nothing: if any match's food is gone, or its hold lapsed or
+    is already on another route, the holds committed so far are
+    released and ReservationConflict is raised. Matches without a hold
+    (a ?reserve=false preview) are held here.
+    """
+    committed = []
+    for m in matches:
+        if not m.lot_id:
+            committed.append(m)
+            continue
+        hold_id = m.hold_id or str(ObjectId())
+        renew = m.hold_id is not None
+        if db.reserve_lot(m.donor_id, m.lot_id, m.quantity_matched, hold_id,
+                          ttl=None, partial=False, renew=renew) <= 0:
+            for held in committed:
+                if held.lot_id:
+                    db.release_hold(held.donor_id, held.lot_id, held.hold_id)
+            raise ReservationConflict(m)
+        committed.append(m.model_copy(update={"hold_id": hold_id}))
+    return committed
+
+def route_key(matches: List[MatchResult]) -> Optional[str]:
+    """
+    A route's natural key: its holds. A hold can only be routed once,
+    so the same held matches sent twice are the same route. None if
+    any match holds nothing (e.g. from a ?reserve=false preview).
+    """
+    hold_ids = [m.hold_id for m in matches]
+    if not all(hold_ids):
+        return None
+    return hashlib.sha1(",".join(sorted(hold_ids)).encode()).hexdigest()
+
+def create_route(matches: List[MatchResult]) -> str:
+    """
+    Confirms the holds, builds the stops and saves a pickup. Returns its
+    ID, or the ID of the route already created from the same holds.
+    """
+    key = route_key(matches)
+    if key:
+        existing = db.get_pickup_id_by_route_key(key)
+        if existing:
+            return existing
+    matches = commit_holds(matches)
+
+    # --- Simple "Route" Generation ---
+    # Look up every donor and recipient on the route in one query each
+    donors_by_id = db.get_donors_by_ids({str(m.donor_id) for m in matches})
+    recipients_by_id = db.get_recipients_by_ids({str(m.recipient_id) for m in matches})
+    stops = match.build_pickup_stops(matches, donors_by_id, recipients_by_id)
+
+    return db.create_pickup(Pickup(matches=matches, stops=stops), route_key=key)
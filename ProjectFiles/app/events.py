@@ -0,0 +1,74 @@
+import asyncio
+import threading
+from typing import Optional, Set
+
+# How many unsent events a slow client may fall behind before its
+# stream is closed. It reconnects and catches up with a delta sync.
+MAX_QUEUED_EVENTS = 1000
+
+class Subscription:
+    """One change-feed listener, owned by the event loop serving its stream."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, collections: Optional[Set[str]]):
+        self.loop = loop
+        self.collections = collections # None means "everything"
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_QUEUED_EVENTS)
+
+    def wants(self, collection: str) -> bool:
+        return self.collections is None or collection in self.collections
+
+    def offer(self, event: dict):
+        """Queues an event (runs on the subscriber's loop)."""
+        if self.queue.full():
+            # Too far behind: drop everything and tell the stream to
+            # close (None), so the client resyncs from scratch.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return
+        self.queue.put_nowait(event)
+
+class EventBus:
+    """
+    In-process publish/subscribe for data changes.
+
+    The write functions in app/data.py publish the new version of every
+    document they change; the /events endpoint streams them to clients.
+    Publishing is safe from any thread (sync endpoints run in a thread
+    pool), and costs nothing when nobody is subscribed.
+    """
+
+    def __init__(self):
+        self._subscribers: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(self, collections: Optional[Set[str]] = None) -> Subscription:
+        """Adds a listener. Must be called from inside the running event loop."""
+        subscription = Subscription(asyncio.get_running_loop(), collections)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, collection: str, document: dict):
+        """Sends a changed document to every listener interested in `collection`."""
+        event = {"collection": collection, "document": document}
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if not subscription.wants(collection):
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # Its loop is closed (server shutting down)
+                self.unsubscribe(subscription)
+
+# The process-wide bus used by app.data and app.api
+bus = EventBus()
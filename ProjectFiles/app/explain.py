@@ -0,0 +1,60 @@
+import time
+from typing import List, Tuple
+import app.data as db
+import app.match as match
+from app.metrics import traced
+from app.models import AvailableFood, MatchResult, MatchTrace, PoolExclusion, Recipient
+
+# Match traces: an opt-in record of why a matching run gave each
+# recipient what it got, so "why did this shelter get nothing?" can be
+# answered from the job history instead of re-running the matcher by
+# hand. A trace has two parts:
+#   - the pool: the food the matcher was given, and the food it never
+#     saw (expired, held by other matches or routes, kept back for
+#     forecast shortfall days);
+#   - per recipient, in the order they were served: the lots looked
+#     at, the lots skipped because earlier recipients had used them
+#     up, what was allocated, the outcome and the time taken.
+# The matcher does not compare units (recipients' needs have none), so
+# there is no unit-mismatch reason.
+#
+# Traced runs use match.trace_matching_algorithm; untraced runs call
+# match.run_matching_algorithm, which has no tracing code at all.
+
+def _held_back(food: List[AvailableFood], planned: List[AvailableFood]) -> PoolExclusion:
+    """Food the horizon planner kept for later days (planned has less of it, or none)."""
+    planned_quantity = {}
+    for f in planned:
+        key = (str(f.donor_id), f.lot_id, f.name, f.expiry_date)
+        planned_quantity[key] = planned_quantity.get(key, 0.0) + f.quantity
+    held_back = PoolExclusion()
+    for f in food:
+        kept = f.quantity - planned_quantity.get((str(f.donor_id), f.lot_id, f.name, f.expiry_date), 0.0)
+        if kept > 0:
+            held_back.lots += 1
+            held_back.quantity += kept
+    return held_back
+
+@traced("explain.run_traced")
+def run_traced(
+    recipients: List[Recipient],
+    food: List[AvailableFood],
+    planned: List[AvailableFood]
+) -> Tuple[List[MatchResult], MatchTrace]:
+    """
+    Matches `recipients` against `planned` (the available `food`, after
+    horizon planning if any) and returns the matches with their trace.
+    """
+    start = time.perf_counter()
+    matches, recipient_traces = match.trace_matching_algorithm(recipients, planned)
+    excluded = {reason: PoolExclusion(**totals) for reason, totals in db.get_unavailable_food().items()}
+    if planned is not food:
+        excluded["held_back"] = _held_back(food, planned)
+    trace = MatchTrace(
+        lots=len(planned),
+        quantity=sum(f.quantity for f in planned),
+        excluded=excluded,
+        recipients=recipient_traces,
+        elapsed_ms=round((time.perf_counter() - start) * 1000, 3),
+    )
+    return matches, trace
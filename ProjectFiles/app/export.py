@@ -0,0 +1,120 @@
+import csv
+import io
+import zlib
+from typing import Iterable, Iterator, List
+
+# Streaming exports: rows come from a MongoDB cursor and leave as
+# encoded chunks, so an export of millions of rows never holds more
+# than one chunk in memory.
+
+CHUNK_ROWS = 1000 # Rows per CSV chunk / Parquet row group
+
+# Columns of each export, in order
+COLUMNS = {
+    "pickups": ["pickup_id", "created_at", "status", "updated_at", "matches", "stops", "quantity"],
+    "matches": [
+        "pickup_id", "pickup_created_at", "pickup_status",
+        "donor_id", "donor_name", "recipient_id", "recipient_name",
+        "food_name", "quantity", "unit", "expiry_date", "lot_id"
+    ],
+    "inventory": ["donor_id", "donor_name", "lot_id", "food_name", "quantity", "held", "unit", "expiry_date"],
+}
+
+# Parquet column types (everything else is a string)
+_TIMESTAMP_COLUMNS = {"created_at", "updated_at", "pickup_created_at", "expiry_date"}
+_INTEGER_COLUMNS = {"matches", "stops"}
+_FLOAT_COLUMNS = {"quantity", "held"}
+
+def _chunks(rows: Iterable[dict]) -> Iterator[List[dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_ROWS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _cell(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+def stream_csv(rows: Iterable[dict], columns: List[str]) -> Iterator[bytes]:
+    """CSV with a header row, one chunk of bytes per CHUNK_ROWS rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for chunk in _chunks(rows):
+        for row in chunk:
+            writer.writerow([_cell(row.get(column)) for column in columns])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode() # Header only (no rows)
+
+class _ChunkSink(io.RawIOBase):
+    """A write-only file that hands out what was written so far (for pyarrow)."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def stream_parquet(rows: Iterable[dict], columns: List[str]) -> Iterator[bytes]:
+    """Parquet, one row group per CHUNK_ROWS rows. Needs pyarrow."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    def column_type(column):
+        if column in _TIMESTAMP_COLUMNS:
+            return pa.timestamp("ms")
+        if column in _INTEGER_COLUMNS:
+            return pa.int64()
+        if column in _FLOAT_COLUMNS:
+            return pa.float64()
+        return pa.string()
+
+    schema = pa.schema([(c, column_type(c)) for c in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for chunk in _chunks(rows):
+        writer.write_table(pa.Table.from_pylist([{c: row.get(c) for c in columns} for row in chunk], schema=schema))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+def gzipped(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Compresses a stream of chunks into one gzip stream."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31: gzip header
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,183 @@
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+import app.data as db
+from app.logs import logger
+from app.metrics import traced
+from app.models import AvailableFood, ForecastDay, Recipient
+
+# Forecasts of supply (per donor) and demand (per recipient), learned
+# from the delivery rollups (app/rollups.py), one value per day.
+#
+# Each series is exponential smoothing with an additive day-of-week
+# season: a level plus one offset per weekday. The state is those 8
+# numbers and the last day folded in, stored in 'forecast_state', so
+# each update only reads the days added since (incremental, O(new days)).
+# Pure Python on purpose: there are a handful of numbers per series, and
+# the API does not otherwise depend on numpy.
+#
+# Forecasting brings the models up to yesterday first (ensure_current),
+# at most once a day per process, so they never go stale whatever the
+# scheduler's settings.
+
+ALPHA = 0.3 # Weight of the newest day in the level
+GAMMA = 0.1 # Weight of the newest day in its weekday's offset
+
+# Recipient history is what was delivered, which supply limits; it only
+# shapes their declared daily_need by weekday, within these bounds.
+MIN_DEMAND_FACTOR = 0.5
+MAX_DEMAND_FACTOR = 1.5
+
+class SeriesModel:
+    """Level + day-of-week exponential smoothing for one daily series."""
+
+    __slots__ = ("level", "season", "last_day")
+
+    def __init__(self, level: Optional[float] = None, season: Optional[List[float]] = None,
+                 last_day: Optional[str] = None):
+        self.level = level
+        self.season = season or [0.0] * 7
+        self.last_day = last_day # YYYY-MM-DD of the last day folded in
+
+    def update(self, day: date, value: float):
+        weekday = day.weekday()
+        if self.level is None:
+            self.level = value
+        else:
+            self.level = ALPHA * (value - self.season[weekday]) + (1 - ALPHA) * self.level
+        self.season[weekday] = GAMMA * (value - self.level) + (1 - GAMMA) * self.season[weekday]
+        self.last_day = day.isoformat()
+
+    def predict(self, day: date) -> float:
+        if self.level is None:
+            return 0.0
+        return max(0.0, self.level + self.season[day.weekday()])
+
+    def to_doc(self) -> dict:
+        return {"level": self.level, "season": self.season, "last_day": self.last_day}
+
+def _load_models() -> Dict[str, SeriesModel]:
+    return {
+        doc["_id"]: SeriesModel(doc["level"], doc["season"], doc["last_day"])
+        for doc in db.get_db().forecast_state.find()
+    }
+
+@traced("forecast.update_models")
+def update_models(today: Optional[date] = None) -> int:
+    """
+    Folds every finished day (before `today`) that is not in the models
+    yet into them. Days without deliveries count as 0. Returns the
+    number of series updated.
+    """
+    from pymongo import ReplaceOne
+
+    today = today or date.today()
+    database = db.get_db()
+    models = _load_models()
+    start = min((m.last_day for m in models.values() if m.last_day), default=None)
+
+    # Delivered quantity per series per day, for the days not folded in yet
+    history: Dict[str, Dict[str, float]] = {}
+    for kind in ("donors", "recipients"):
+        query = {"day": {"$lt": today.isoformat()}}
+        if start:
+            query["day"]["$gt"] = start
+        for row in database[f"rollup_{kind}"].find(query, {"day": 1, "partner_id": 1, "quantity": 1}):
+            series = history.setdefault(f"{kind}:{row['partner_id']}", {})
+            series[row["day"]] = series.get(row["day"], 0.0) + row["quantity"]
+
+    changed = []
+    for key in set(models) | set(history):
+        model = models.setdefault(key, SeriesModel())
+        days = history.get(key, {})
+        if model.last_day is None and not days:
+            continue
+        day = date.fromisoformat(model.last_day) + timedelta(days=1) if model.last_day else date.fromisoformat(min(days))
+        if day >= today:
+            continue
+        while day < today:
+            model.update(day, days.get(day.isoformat(), 0.0))
+            day += timedelta(days=1)
+        changed.append(ReplaceOne({"_id": key}, model.to_doc(), upsert=True))
+
+    if changed:
+        database.forecast_state.bulk_write(changed, ordered=False)
+    logger.info("forecast.updated", extra={"series": len(changed)})
+    return len(changed)
+
+# The day this process last brought the models up to date on
+_current_on: Optional[date] = None
+_current_lock = threading.Lock()
+
+def ensure_current():
+    """Runs update_models() if this process has not done so today."""
+    global _current_on
+    today = date.today()
+    if _current_on == today:
+        return
+    with _current_lock:
+        if _current_on != today:
+            update_models(today) # Same result whichever worker gets there first
+            _current_on = today
+
+@traced("forecast.forecast_days")
+def forecast_days(recipients: List[Recipient], days: int, start: Optional[date] = None) -> List[ForecastDay]:
+    """Predicted supply and demand for `days` days from `start` (default tomorrow)."""
+    start = start or date.today() + timedelta(days=1)
+    ensure_current()
+    models = _load_models()
+    donor_models = [m for key, m in models.items() if key.startswith("donors:")]
+
+    result = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        supply = sum(m.predict(day) for m in donor_models)
+        demand = 0.0
+        for r in recipients:
+            model = models.get(f"recipients:{r.id}")
+            factor = 1.0
+            if model and model.level:
+                factor = min(MAX_DEMAND_FACTOR, max(MIN_DEMAND_FACTOR, model.predict(day) / model.level))
+            demand += r.daily_need * factor
+        result.append(ForecastDay(day=day.isoformat(), supply=round(supply, 3), demand=round(demand, 3)))
+    return result
+
+@traced("forecast.plan_todays_food")
+def plan_todays_food(
+    food: List[AvailableFood],
+    recipients: List[Recipient],
+    horizon_days: int
+) -> List[AvailableFood]:
+    """
+    The food to match today when planning `horizon_days` ahead:
+      - soonest-expiring first, so nothing that could be delivered spoils;
+      - minus a carry-over for forecast shortfall days (demand above
+        supply), taken from the longest-lasting lots that will still be
+        fresh on those days.
+    The matcher then works on this pool as usual.
+    """
+    pool = sorted(food, key=lambda f: f.expiry_date)
+    held_back = [0.0] * len(pool)
+
+    days = forecast_days(recipients, horizon_days)
+    if not any(day.supply for day in days):
+        days = [] # No delivery history yet: every day would look short, so keep nothing back
+
+    for day in days:
+        shortfall = day.demand - day.supply
+        if shortfall <= 0:
+            continue
+        # Still fresh at the end of that day
+        fresh_after = datetime.combine(date.fromisoformat(day.day), datetime.max.time())
+        for i in range(len(pool) - 1, -1, -1):
+            if shortfall <= 0 or pool[i].expiry_date <= fresh_after:
+                break
+            take = min(shortfall, pool[i].quantity - held_back[i])
+            held_back[i] += take
+            shortfall -= take
+
+    planned = []
+    for lot, kept in zip(pool, held_back):
+        if lot.quantity - kept > 0:
+            planned.append(lot if not kept else lot.model_copy(update={"quantity": lot.quantity - kept}))
+    return planned
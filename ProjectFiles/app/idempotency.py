@@ -0,0 +1,83 @@
+import asyncio
+import hashlib
+import os
+import time
+from typing import List, Optional, Tuple
+from app.store import store
+
+# Idempotency keys for POST requests.
+#
+# A client that sends the same write twice (a double click, a retry
+# after a timeout, an outbox replay) sends the same Idempotency-Key
+# header both times. The first request claims the key in the shared
+# store (app/store.py), so this works across workers; if it succeeds
+# (2xx) its response is saved under the key, and any repeat gets that
+# saved response back without running the endpoint again. A failed
+# request releases the key, so a retry runs again. Keys expire after
+# TTL_SECONDS.
+
+HEADER = "Idempotency-Key"
+
+# How long a finished request's response is kept for replays
+TTL_SECONDS = int(os.environ.get("FOOD_RESCUE_IDEMPOTENCY_SECONDS", "86400"))
+
+# A claim is dropped after this long if its worker died mid-request
+PENDING_SECONDS = 120
+
+# A repeat of a request still running elsewhere waits this long for it
+WAIT_SECONDS = 10
+POLL_SECONDS = 0.05
+
+def _key(key: str) -> str:
+    return f"idempotency:{key}"
+
+def fingerprint(method: str, path: str, query: str, accept: str, body: bytes) -> str:
+    """
+    Identifies a request, so one key cannot be reused for a different
+    write. Includes Accept: the saved response is in the format asked for.
+    """
+    digest = hashlib.sha256(f"{method} {path}?{query}\n{accept}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+def _pending(request_fingerprint: str) -> dict:
+    return {"state": "pending", "fingerprint": request_fingerprint}
+
+async def claim(key: str, request_fingerprint: str) -> Optional[dict]:
+    """
+    Claims `key` for this request. Returns None if it is ours: handle
+    the request, then call finish() (or abandon() if it failed).
+    Otherwise returns the key's entry: a finished one ("state": "done")
+    to replay, a different request's ("fingerprint" differs), or one
+    still pending after WAIT_SECONDS.
+    """
+    deadline = time.monotonic() + WAIT_SECONDS
+    while True:
+        if await asyncio.to_thread(store.add, _key(key), _pending(request_fingerprint), PENDING_SECONDS):
+            return None
+        entry = await asyncio.to_thread(store.get, _key(key))
+        if entry is None:
+            continue # Expired between the two calls, claim it again
+        if entry["state"] == "done" or entry["fingerprint"] != request_fingerprint:
+            return entry
+        if time.monotonic() >= deadline:
+            return entry
+        await asyncio.sleep(POLL_SECONDS)
+
+async def finish(key: str, request_fingerprint: str, status: int, headers: List[Tuple[str, str]], body: bytes):
+    """
+    Saves the response to replay for repeats of this request. `headers`
+    are its raw (name, value) pairs, repeated names included.
+    """
+    entry = {
+        "state": "done",
+        "fingerprint": request_fingerprint,
+        "status": status,
+        "headers": [list(h) for h in headers],
+        "body": body,
+    }
+    await asyncio.to_thread(store.set, _key(key), entry, TTL_SECONDS)
+
+async def abandon(key: str, request_fingerprint: str):
+    """Releases our claim (the request failed), so a retry runs again."""
+    await asyncio.to_thread(store.delete, _key(key), _pending(request_fingerprint))
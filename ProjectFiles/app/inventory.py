@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+import app.data as db
+from app.logs import logger
+from app.metrics import traced
+from app.models import AvailableFood
+
+# Seconds between polls for donors changed by other workers or nodes
+SYNC_SECONDS = float(os.environ.get("FOOD_RESCUE_INVENTORY_SYNC_SECONDS", "2"))
+
+# Seconds between full reloads, which also drop donors deleted from
+# MongoDB (a poll only sees donors that still exist)
+RESYNC_SECONDS = float(os.environ.get("FOOD_RESCUE_INVENTORY_RESYNC_SECONDS", "300"))
+
+# Polls look back this far past the last one, in case another node's
+# clock (which stamps 'updated_at') is a little behind ours
+CLOCK_SKEW = timedelta(seconds=5)
+
+class Inventory:
+    """
+    Every donor's lots, resident in the API process, so availability
+    and matching are answered from memory instead of an aggregation
+    over the whole donors collection.
+
+    Kept current two ways:
+      - writes made by this process arrive through data.donor_listeners
+        before the write returns, so a caller always sees its own writes;
+      - a poll every SYNC_SECONDS fetches donors whose 'updated_at'
+        moved (writes by other workers, the expiry sweeper);
+      - a full reload every RESYNC_SECONDS drops donors that were
+        deleted from the database.
+
+    `version` is the point in time up to which every change is known.
+    Readers can ask for a snapshot at least as new as a write they made
+    elsewhere (its 'updated_at'); the inventory then syncs first.
+    """
+
+    def __init__(self):
+        self.version: Optional[datetime] = None # None until loaded
+        self._donors = {} # donor ID -> (donor ObjectId, name, lots, updated_at)
+        self._snapshot = None # (AvailableFood list, valid until)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.version is not None
+
+    def start(self):
+        """
+        Loads every donor and starts following changes (blocking load).
+        If MongoDB is unreachable the API still starts: availability is
+        read from MongoDB meanwhile, and the sync thread retries the load.
+        """
+        from pymongo.errors import PyMongoError
+
+        db.donor_listeners.append(self.apply)
+        try:
+            self.sync(full=True)
+        except PyMongoError as e:
+            logger.error("inventory.load_failed", extra={"error": e, "retry_seconds": SYNC_SECONDS})
+        self._thread = threading.Thread(target=self._loop, name="inventory-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self.apply in db.donor_listeners:
+            db.donor_listeners.remove(self.apply)
+
+    def _loop(self):
+        last_full = time.monotonic()
+        while not self._stop.wait(SYNC_SECONDS):
+            # Until the first load succeeds, every pass retries it
+            full = not self.loaded or time.monotonic() - last_full >= RESYNC_SECONDS
+            try:
+                self.sync(full=full)
+                if full:
+                    last_full = time.monotonic()
+            except Exception as e:
+                logger.warning("inventory.sync_failed", extra={"error": e})
+
+    def sync(self, full: bool = False):
+        """Applies every donor changed since the last sync (all of them if `full`)."""
+        started = datetime.now()
+        since = None if full or self.version is None else self.version - CLOCK_SKEW
+        docs = db.get_donor_documents(updated_since=since)
+        with self._lock:
+            if full:
+                # Drop deleted donors; keep any a write hook added while we read
+                seen = {str(doc["_id"]) for doc in docs}
+                for key, (_, _, _, updated_at) in list(self._donors.items()):
+                    if key not in seen and (updated_at is None or updated_at < started):
+                        del self._donors[key]
+            for doc in docs:
+                self._put(doc)
+            self._snapshot = None
+            self.version = started
+        if full:
+            logger.info("inventory.loaded", extra={"donors": len(docs)})
+
+    def apply(self, doc: dict):
+        """A donor document as it is after a write (from the data layer)."""
+        with self._lock:
+            self._put(doc)
+            self._snapshot = None
+
+    def _put(self, doc: dict):
+        key = str(doc["_id"])
+        current = self._donors.get(key)
+        # A poll can return a version older than one a write hook already applied
+        if current and doc.get("updated_at") and current[3] and doc["updated_at"] < current[3]:
+            return
+        self._donors[key] = (doc["_id"], doc["name"], doc.get("current_donations", []), doc.get("updated_at"))
+
+    def available(self, min_version: Optional[datetime] = None) -> List[AvailableFood]:
+        """Same result as data.get_all_available_food, from memory."""
+        if min_version is not None and (self.version is None or min_version > self.version):
+            self.sync()
+        now = datetime.now()
+        with self._lock:
+            if self._snapshot is None or self._snapshot[1] <= now:
+                self._snapshot = self._build(now)
+            return self._snapshot[0]
+
+    def _build(self, now: datetime):
+        """
+        The available food at `now`, and until when that stays true
+        (the next lot expiry or hold lapse changes it).
+        """
+        food = []
+        valid_until = datetime.max
+        for donor_id, name, lots, _ in self._donors.values():
+            for lot in lots:
+                if lot["expiry_date"] < now:
+                    continue
+                valid_until = min(valid_until, lot["expiry_date"])
+                held = 0.0
+                for hold in lot.get("holds", []):
+                    lapses = hold.get("expires_at")
+                    if lapses is None or lapses > now:
+                        held += hold["quantity"]
+                        if lapses is not None:
+                            valid_until = min(valid_until, lapses)
+                if lot["quantity"] - held > 0:
+                    # Straight from our own documents: no need to validate
+                    food.append(AvailableFood.model_construct(
+                        donor_id=donor_id, donor_name=name,
+                        name=lot["name"], quantity=lot["quantity"] - held,
+                        unit=lot["unit"], expiry_date=lot["expiry_date"],
+                        lot_id=lot.get("lot_id")
+                    ))
+        return food, valid_until
+
+inventory = Inventory()
+
+@traced("inventory.available_food")
+def available_food(min_version: Optional[datetime] = None) -> List[AvailableFood]:
+    """Available food from the resident inventory, or from MongoDB if it is not loaded."""
+    if inventory.loaded:
+        return inventory.available(min_version)
+    return db.get_all_available_food()
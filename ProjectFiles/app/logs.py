@@ -0,0 +1,65 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+# Attributes every LogRecord has; anything else came from `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class KeyValueFormatter(logging.Formatter):
+    """
+    Formats records as one structured line:
+        2025-01-01 10:00:00 INFO pickup.completed pickup_id=... failed=0
+    The message is the event name; the fields come from `extra=`.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(
+            f"{key}={value}" for key, value in record.__dict__.items()
+            if key not in _STANDARD_ATTRS
+        )
+        line = f"{self.formatTime(record)} {record.levelname} {record.getMessage()}"
+        if fields:
+            line += f" {fields}"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of DEBUG records (the per-item, hot-path ones)."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        return random.random() < self.rate
+
+def _setup_logger() -> logging.Logger:
+    """
+    The API's logger. Records are put on a queue and written to stderr
+    by a background thread, so request handlers never wait on stdout.
+
+    FOOD_RESCUE_LOG_LEVEL   (default INFO)
+    FOOD_RESCUE_LOG_SAMPLE  fraction of DEBUG records kept (default 0.1)
+    """
+    log = logging.getLogger("food_rescue")
+    log.setLevel(os.environ.get("FOOD_RESCUE_LOG_LEVEL", "INFO").upper())
+    log.propagate = False
+    log.addFilter(SamplingFilter(float(os.environ.get("FOOD_RESCUE_LOG_SAMPLE", "0.1"))))
+
+    stream = logging.StreamHandler()
+    stream.setFormatter(KeyValueFormatter())
+
+    records = queue.SimpleQueue()
+    log.addHandler(logging.handlers.QueueHandler(records))
+    listener = logging.handlers.QueueListener(records, stream)
+    listener.start()
+    atexit.register(listener.stop) # Flush what is left on shutdown
+    return log
+
+logger = _setup_logger()
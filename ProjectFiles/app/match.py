@@ -1,6 +1,13 @@
-from app.models import Recipient, AvailableFood, MatchResult
-from typing import List
+import time
+from app.models import Recipient, AvailableFood, MatchResult, PickupStop, Donor, RecipientTrace, TraceAllocation
+from app.metrics import traced
+from app.planning import Plan
+from typing import List, Dict, Tuple
 
+# Lot IDs listed per recipient in a trace (the skipped count is always complete)
+TRACE_MAX_SKIPPED_IDS = 20
+
+@traced("match.run_matching_algorithm")
 def run_matching_algorithm(
     all_recipients: List[Recipient], 
     all_food: List[AvailableFood]
@@ -11,30 +18,35 @@ def run_matching_algorithm(
     with the available food items.
     """
     
+    # Work on compact copies (see app/planning.py), so the inputs
+    # are never modified and nothing has to be deep-copied
+    plan = Plan.from_models(all_recipients, all_food)
+
     # 1. Sort recipients by need (neediest first)
-    # We make a copy so we can modify their 'daily_need'
-    recipients_sorted = sorted(
-        [r.model_copy(deep=True) for r in all_recipients], 
-        key=lambda r: r.daily_need, 
-        reverse=True
-    )
+    recipients_sorted = sorted(plan.recipients, key=lambda r: r.need, reverse=True)
     
-    # 2. Create a mutable list of available food
-    # We'll "use up" food items by reducing their quantity
-    food_available = [f.model_copy(deep=True) for f in all_food]
+    # 2. The lots, in order; we "use up" food by reducing their quantity
+    food_available = plan.lots
     
     proposed_matches: List[MatchResult] = []
 
+    # Lots before this index are all used up, so no recipient
+    # needs to look at them again
+    first_left = 0
+
     # 3. Iterate through each recipient and try to match
     for recipient in recipients_sorted:
-        need_remaining = recipient.daily_need
+        need_remaining = recipient.need
         
         # Keep matching food until this recipient's need is met
         # or we run out of food items
-        for food in food_available:
+        for i in range(first_left, len(food_available)):
+            food = food_available[i]
             
             # Skip food that's already used up
             if food.quantity <= 0:
+                if i == first_left:
+                    first_left += 1
                 continue
                 
             # For simplicity, we assume all units are compatible (e.g., "kg")
@@ -42,45 +54,17 @@ def run_matching_algorithm(
             
             if food.quantity >= need_remaining:
                 # This food item can fulfill the rest of the need
-                quantity_to_match = need_remaining
-                
-                # Create the match record
-                match = MatchResult(
-                    recipient_id=recipient.id,
-                    recipient_name=recipient.name,
-                    donor_id=food.donor_id,
-                    donor_name=food.donor_name,
-                    food_name=food.name,
-                    quantity_matched=quantity_to_match,
-                    unit=food.unit,
-                    expiry_date=food.expiry_date
-                )
-                
-                proposed_matches.append(match)
+                proposed_matches.append(plan.match_result(recipient, food, need_remaining))
                 
-                # Update the food quantity and the recipient's remaining need
-                food.quantity -= quantity_to_match
-                need_remaining = 0
-                
-                # This recipient is done, break to the next recipient
+                # Update the food quantity; this recipient is done,
+                # break to the next recipient
+                food.quantity -= need_remaining
                 break
                 
             else:
                 # This food item can be partially used
                 quantity_to_match = food.quantity
-                
-                match = MatchResult(
-                    recipient_id=recipient.id,
-                    recipient_name=recipient.name,
-                    donor_id=food.donor_id,
-                    donor_name=food.donor_name,
-                    food_name=food.name,
-                    quantity_matched=quantity_to_match,
-                    unit=food.unit,
-                    expiry_date=food.expiry_date
-                )
-                
-                proposed_matches.append(match)
+                proposed_matches.append(plan.match_result(recipient, food, quantity_to_match))
                 
                 # Update the food quantity and the recipient's remaining need
                 food.quantity = 0 # Food item is used up
@@ -88,4 +72,108 @@ def run_matching_algorithm(
                 
                 # Continue to the next food item for this recipient
     
-    return proposed_matches
\ No newline at end of file
+    return proposed_matches
+
+@traced("match.trace_matching_algorithm")
+def trace_matching_algorithm(
+    all_recipients: List[Recipient],
+    all_food: List[AvailableFood]
+) -> Tuple[List[MatchResult], List[RecipientTrace]]:
+    """
+    run_matching_algorithm, also recording what happened on each
+    recipient's turn (see app/explain.py). Gives the same matches.
+
+    This is a separate copy of the loop so the normal path pays nothing
+    for tracing; change both together (benchmarks/bench_match.py checks
+    that they agree).
+    """
+    plan = Plan.from_models(all_recipients, all_food)
+    recipients_sorted = sorted(plan.recipients, key=lambda r: r.need, reverse=True)
+    food_available = plan.lots
+    proposed_matches: List[MatchResult] = []
+    traces: List[RecipientTrace] = []
+    first_left = 0
+
+    for rank, recipient in enumerate(recipients_sorted, 1):
+        start = time.perf_counter()
+        trace = RecipientTrace(
+            recipient_id=recipient.id, recipient_name=recipient.name, rank=rank, need=recipient.need,
+            skipped_exhausted=first_left # Used up before this turn, not even looked at
+        )
+        traces.append(trace)
+        need_remaining = recipient.need
+
+        for i in range(first_left, len(food_available)):
+            food = food_available[i]
+            trace.considered += 1
+
+            if food.quantity <= 0:
+                if i == first_left:
+                    first_left += 1
+                trace.skipped_exhausted += 1
+                if len(trace.skipped_lot_ids) < TRACE_MAX_SKIPPED_IDS and food.lot_id:
+                    trace.skipped_lot_ids.append(food.lot_id)
+                continue
+
+            quantity = min(food.quantity, need_remaining)
+            proposed_matches.append(plan.match_result(recipient, food, quantity))
+            trace.allocated.append(TraceAllocation(
+                lot_id=food.lot_id, donor_name=plan.donors[food.donor].name,
+                food_name=food.name, quantity=quantity, unit=food.unit
+            ))
+            food.quantity -= quantity
+            need_remaining -= quantity
+            if need_remaining <= 0:
+                break
+
+        trace.outcome = "met" if need_remaining <= 0 else ("partial" if trace.allocated else "none")
+        trace.elapsed_us = round((time.perf_counter() - start) * 1e6, 1)
+
+    return proposed_matches, traces
+
+@traced("match.build_pickup_stops")
+def build_pickup_stops(
+    matches: List[MatchResult],
+    donors_by_id: Dict[str, Donor],
+    recipients_by_id: Dict[str, Recipient]
+) -> List[PickupStop]:
+    """
+    Builds the ordered stops for a pickup route: for each match,
+    go to the donor, then to the recipient, skipping any address
+    we already visit on this route.
+    """
+    stops: List[PickupStop] = []
+    addresses_seen = set() # To help de-duplicate
+
+    for match in matches:
+        # Stop 1: Go to the donor
+        donor = donors_by_id.get(str(match.donor_id))
+        if donor and donor.address not in addresses_seen:
+            stops.append(PickupStop(
+                stop_type="pickup",
+                name=match.donor_name,
+                address=donor.address
+            ))
+            addresses_seen.add(donor.address)
+
+        # Stop 2: Go to the recipient
+        recipient = recipients_by_id.get(str(match.recipient_id))
+        if recipient and recipient.address not in addresses_seen:
+            stops.append(PickupStop(
+                stop_type="dropoff",
+                name=match.recipient_name,
+                address=recipient.address
+            ))
+            addresses_seen.add(recipient.address)
+
+    return stops
+
+@traced("match.batch_into_routes")
+def batch_into_routes(matches: List[MatchResult], max_matches: int) -> List[List[MatchResult]]:
+    """
+    Splits matches into routes of at most `max_matches` matches each.
+    Matches from the same donor (then to the same recipient) are kept
+    next to each other, so a route visits as few addresses as possible.
+    """
+    ordered = sorted(matches, key=lambda m: (str(m.donor_id), str(m.recipient_id)))
+    return [ordered[i:i + max_matches] for i in range(0, len(ordered), max_matches)]
@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from app.logs import logger
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """A Prometheus-style histogram with one series per label set."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {} # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        """Lines in the Prometheus text exposition format."""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for label_values, series in sorted(items):
+            labels = ",".join(f'{k}="{v}"' for k, v in zip(self.label_names, label_values))
+            sep = "," if labels else ""
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+class Counter:
+    """A Prometheus-style counter with one series per label set."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series = {} # label values -> count
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for label_values, count in items:
+            labels = ",".join(f'{k}="{v}"' for k, v in zip(self.label_names, label_values))
+            lines.append(f"{self.name}{{{labels}}} {count}")
+        return lines
+
+REQUEST_SECONDS = Histogram(
+    "food_rescue_request_seconds",
+    "Time spent handling HTTP requests, by route template.",
+    ("method", "route", "status")
+)
+SPAN_SECONDS = Histogram(
+    "food_rescue_span_seconds",
+    "Time spent in instrumented operations (MongoDB calls, matching).",
+    ("span",)
+)
+SINGLEFLIGHT_CALLS = Counter(
+    "food_rescue_singleflight_calls_total",
+    "Calls to single-flight reads: 'ran' the query, or 'shared' one already in flight.",
+    ("name", "result")
+)
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text format (for GET /metrics)."""
+    lines = REQUEST_SECONDS.render() + SPAN_SECONDS.render() + SINGLEFLIGHT_CALLS.render()
+    return "\n".join(lines) + "\n"
+
+# --- Optional OpenTelemetry export ---
+
+def _make_tracer():
+    """
+    Returns an OpenTelemetry tracer that exports to the OTLP/HTTP
+    collector at FOOD_RESCUE_OTEL_ENDPOINT, or None if that is unset
+    or the opentelemetry packages are not installed.
+    """
+    endpoint = os.environ.get("FOOD_RESCUE_OTEL_ENDPOINT")
+    if not endpoint:
+        return None
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        logger.warning("otel.disabled", extra={"reason": "opentelemetry packages not installed"})
+        return None
+
+    provider = TracerProvider(resource=Resource.create({"service.name": "food-rescue-api"}))
+    # Spans are exported in batches on a background thread
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint)))
+    trace.set_tracer_provider(provider)
+    return trace.get_tracer("food_rescue")
+
+tracer = _make_tracer()
+
+# --- Spans ---
+
+@contextmanager
+def span(name: str):
+    """Times a block into SPAN_SECONDS (and an OpenTelemetry span if enabled)."""
+    start = time.perf_counter()
+    if tracer is None:
+        try:
+            yield
+        finally:
+            SPAN_SECONDS.observe(time.perf_counter() - start, name)
+        return
+    with tracer.start_as_current_span(name):
+        try:
+            yield
+        finally:
+            SPAN_SECONDS.observe(time.perf_counter() - start, name)
+
+def traced(name: str):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,11 +1,26 @@
 from pydantic import BaseModel, Field
 from pydantic_core import core_schema
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 from bson import ObjectId
+from functools import lru_cache
+
+# A 24-character hex string, checked by pydantic-core itself (no Python call)
+OBJECT_ID_PATTERN = r"^[0-9a-fA-F]{24}$"
+
+@lru_cache(maxsize=65536)
+def _object_id_from_hex(v: str) -> ObjectId:
+    """
+    Builds the ObjectId for an already-checked hex string. ObjectIds are
+    immutable, so the same donor/recipient ID, which repeats on every
+    match and pickup, is built once and then shared.
+    """
+    return ObjectId(v)
 
 # This class allows us to handle MongoDB's _id
 class PyObjectId(ObjectId):
+    _core_schema = None # Built once, shared by every field that uses it
+
     @classmethod
     def __get_pydantic_core_schema__(
         cls, source_type: any, handler: any
@@ -13,15 +28,22 @@ class PyObjectId(ObjectId):
         """
         Defines the Pydantic v2 CoreSchema for handling ObjectId.
         """
+        if cls._core_schema is not None:
+            return cls._core_schema
         
-        # Validation chain for strings: first ensure it's a string,
-        # then run our ObjectId validator. We DO NOT put this chain
-        # into the JSON schema generation path below (we expose a
-        # plain string schema for OpenAPI/JSON Schema generation).
+        # Validation chain for strings: the format check runs inside
+        # pydantic-core (a regex on the str schema), and only a valid
+        # string reaches Python, to be turned into an ObjectId. We DO
+        # NOT put this chain into the JSON schema generation path below
+        # (we expose a plain string schema for OpenAPI/JSON Schema).
         str_validator = core_schema.chain_schema(
             [
-                core_schema.str_schema(),
-                core_schema.no_info_plain_validator_function(cls._validate_str),
+                core_schema.custom_error_schema(
+                    core_schema.str_schema(pattern=OBJECT_ID_PATTERN),
+                    custom_error_type="objectid",
+                    custom_error_message="Invalid objectid",
+                ),
+                core_schema.no_info_plain_validator_function(_object_id_from_hex),
             ]
         )
 
@@ -30,13 +52,13 @@ class PyObjectId(ObjectId):
         # doesn't try to interpret our validator function), but
         # accepts either ObjectId instances or strings when parsing
         # Python input.
-        schema = core_schema.json_or_python_schema(
+        cls._core_schema = core_schema.json_or_python_schema(
             # When producing JSON / OpenAPI, represent as a string
             json_schema=core_schema.str_schema(),
 
             # When parsing Python input, accept either an ObjectId
-            # instance or a string that will be validated by
-            # `str_validator` defined above.
+            # instance (documents read from MongoDB: no Python call at
+            # all) or a string validated by `str_validator` above.
             python_schema=core_schema.union_schema(
                 [
                     core_schema.is_instance_schema(ObjectId),
@@ -44,28 +66,28 @@ class PyObjectId(ObjectId):
                 ]
             ),
 
-            # How to serialize (ObjectId -> str)
-            serialization=core_schema.plain_serializer_function_ser_schema(
-                lambda v: str(v)
-            ),
+            # How to serialize (ObjectId -> str), natively in pydantic-core
+            serialization=core_schema.to_string_ser_schema(when_used="always"),
         )
 
-        return schema
-
-    @classmethod
-    def _validate_str(cls, v: str) -> ObjectId:
-        """Helper to validate a string as an ObjectId."""
-        if not ObjectId.is_valid(v):
-            raise ValueError("Invalid objectid")
-        return ObjectId(v)
+        return cls._core_schema
 
 # --- Your Data Models ---
 
+class LotHold(BaseModel):
+    """A reservation on part of a food lot, made when matching."""
+    hold_id: str
+    quantity: float
+    expires_at: Optional[datetime] = None # None once the match is on a pickup route
+
 class FoodItem(BaseModel):
     name: str
     quantity: float  # e.g., 10 (units), 2.5 (kg)
     unit: str        # e.g., "units", "kg", "liters"
     expiry_date: datetime
+    lot_id: Optional[str] = None # Set by the DB layer when the lot is added
+    version: int = 0             # Bumped on every change to the lot (compare-and-set)
+    holds: List[LotHold] = []
     
 class Donor(BaseModel):
     # This setup allows MongoDB's '_id' to work with Pydantic's 'id'
@@ -74,6 +96,7 @@ class Donor(BaseModel):
     address: str
     phone: str
     current_donations: List[FoodItem] = []
+    updated_at: Optional[datetime] = None # Set by the DB layer on every write
 
     model_config = {
         "arbitrary_types_allowed": True
@@ -85,14 +108,21 @@ class Recipient(BaseModel):
     address: str
     phone: str
     daily_need: float # e.g., "needs 50 kg of food per day"
+    updated_at: Optional[datetime] = None # Set by the DB layer on every write
 
     model_config = {
         "arbitrary_types_allowed": True
     }
 
 # Represents a food item available in the system,
-# including *which* donor it came from.
-class AvailableFood(FoodItem):
+# including *which* donor it came from. Only the public lot fields:
+# a lot's version and holds stay internal to the DB layer.
+class AvailableFood(BaseModel):
+    name: str
+    quantity: float  # What is left after holds
+    unit: str
+    expiry_date: datetime
+    lot_id: Optional[str] = None
     donor_id: PyObjectId
     donor_name: str
 
@@ -106,6 +136,8 @@ class MatchResult(BaseModel):
     quantity_matched: float
     unit: str
     expiry_date: datetime  # <-- ADD THIS LINE
+    lot_id: Optional[str] = None  # The lot this food comes from
+    hold_id: Optional[str] = None # The reservation keeping it for this match
 
     model_config = {
         "arbitrary_types_allowed": True
@@ -122,6 +154,7 @@ class Pickup(BaseModel):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     created_at: datetime = Field(default_factory=datetime.now)
     status: str = "pending" # "pending", "in_progress", "complete"
+    updated_at: Optional[datetime] = None # Set by the DB layer on every write
     
     # Stores the actual matches this pickup is fulfilling
     matches: List[MatchResult]
@@ -131,4 +164,96 @@ class Pickup(BaseModel):
 
     model_config = {
         "arbitrary_types_allowed": True
-    }
\ No newline at end of file
+    }
+
+class MatchJob(BaseModel):
+    """One run of the matcher by the scheduler (or "run now"), for the job history."""
+    id: Optional[PyObjectId] = Field(alias="_id", default=None)
+    trigger: str             # "interval", "threshold", "manual" or "run" (a traced /matches/run)
+    node: str                # Which API worker ran it
+    status: str = "running"  # "running", "complete", "failed"
+    started_at: datetime = Field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+    matches: int = 0         # Matches held
+    pickup_ids: List[str] = []
+    conflicts: int = 0       # Routes not created because food was taken meanwhile
+    error: Optional[str] = None
+    traced: bool = False     # A MatchTrace was stored for it
+
+    model_config = {
+        "arbitrary_types_allowed": True
+    }
+
+# --- Match Traces (see app/explain.py) ---
+
+class TraceAllocation(BaseModel):
+    """Food a recipient was given from one lot."""
+    lot_id: Optional[str] = None
+    donor_name: str
+    food_name: str
+    quantity: float
+    unit: str
+
+class RecipientTrace(BaseModel):
+    """What the matcher did for one recipient."""
+    recipient_id: PyObjectId
+    recipient_name: str
+    rank: int                # Turn in the run: 1 = served first (neediest)
+    need: float
+    considered: int = 0      # Lots looked at on its turn
+    skipped_exhausted: int = 0 # Lots already used up by recipients served earlier
+    skipped_lot_ids: List[str] = [] # The first few of those (that were looked at)
+    allocated: List[TraceAllocation] = []
+    outcome: str = "none"    # "met", "partial" or "none"
+    elapsed_us: float = 0.0
+
+    model_config = {
+        "arbitrary_types_allowed": True
+    }
+
+class PoolExclusion(BaseModel):
+    """Food kept out of a run for one reason."""
+    lots: int = 0
+    quantity: float = 0.0
+
+class MatchTrace(BaseModel):
+    """Why a matching run gave each recipient what it got; stored with its MatchJob."""
+    id: Optional[PyObjectId] = Field(alias="_id", default=None) # The job's ID
+    created_at: datetime = Field(default_factory=datetime.now)
+    lots: int                # Lots the matcher was given
+    quantity: float          # ...and their total quantity
+    # Food the matcher never saw: "expired", "held" (by other matches
+    # or routes) and "held_back" (kept for forecast shortfall days)
+    excluded: Dict[str, PoolExclusion] = {}
+    recipients: List[RecipientTrace] = []
+    elapsed_ms: float = 0.0
+
+    model_config = {
+        "arbitrary_types_allowed": True
+    }
+
+# --- Analytics (see app/rollups.py) ---
+
+class DailyRollup(BaseModel):
+    """Deliveries completed on one day."""
+    day: str                 # YYYY-MM-DD
+    quantity: float          # Food delivered ("food saved")
+    pickups: int             # Routes completed
+    stops: int
+    matches: int
+    stops_per_route: float
+    quantity_per_stop: float # Delivery efficiency
+
+class PartnerRollup(BaseModel):
+    """Food delivered from one donor, or to one recipient, over a date range."""
+    id: str
+    name: str
+    quantity: float
+    pickups: int             # Completed routes it was on
+    days_active: int
+
+class ForecastDay(BaseModel):
+    """Predicted food supply and demand for one day (see app/forecast.py)."""
+    day: str      # YYYY-MM-DD
+    supply: float # From the donors' delivery history
+    demand: float # Recipients' daily needs, shaped by their weekday pattern
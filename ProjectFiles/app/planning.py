@@ -0,0 +1,90 @@
+from datetime import datetime
+from typing import List, Optional
+from app.models import AvailableFood, MatchResult, Recipient
+
+# Compact records for the matcher's working set.
+#
+# The API models carry Pydantic's validation machinery and a __dict__
+# per instance; the matcher holds tens of thousands of lots and used to
+# deep-copy all of them on every run. These classes use __slots__, and
+# a lot points at its donor by index into a shared table, so each
+# donor's ID and name are stored once however many lots it has.
+# Convert at the boundary only: Plan.from_models() on the way in,
+# Plan.match_result() on the way out.
+
+class PlanDonor:
+    __slots__ = ("id", "name")
+
+    def __init__(self, id, name: str):
+        self.id = id
+        self.name = name
+
+class PlanLot:
+    __slots__ = ("donor", "name", "quantity", "unit", "expiry_date", "lot_id")
+
+    def __init__(self, donor: int, name: str, quantity: float, unit: str,
+                 expiry_date: datetime, lot_id: Optional[str]):
+        self.donor = donor # Index into Plan.donors
+        self.name = name
+        self.quantity = quantity # Mutable: what is left to match
+        self.unit = unit
+        self.expiry_date = expiry_date
+        self.lot_id = lot_id
+
+class PlanRecipient:
+    __slots__ = ("id", "name", "need")
+
+    def __init__(self, id, name: str, need: float):
+        self.id = id
+        self.name = name
+        self.need = need
+
+class Plan:
+    """The matcher's inputs: a donor table, the lots and the recipients."""
+
+    __slots__ = ("donors", "lots", "recipients")
+
+    def __init__(self):
+        self.donors: List[PlanDonor] = []
+        self.lots: List[PlanLot] = []
+        self.recipients: List[PlanRecipient] = []
+
+    @classmethod
+    def from_models(cls, recipients: List[Recipient], food: List[AvailableFood]) -> "Plan":
+        plan = cls()
+        donor_index = {}
+        strings = {} # Interns repeated food names and units
+        for f in food:
+            key = str(f.donor_id)
+            index = donor_index.get(key)
+            if index is None:
+                index = donor_index[key] = len(plan.donors)
+                plan.donors.append(PlanDonor(f.donor_id, f.donor_name))
+            plan.lots.append(PlanLot(
+                index,
+                strings.setdefault(f.name, f.name),
+                f.quantity,
+                strings.setdefault(f.unit, f.unit),
+                f.expiry_date,
+                f.lot_id
+            ))
+        plan.recipients = [PlanRecipient(r.id, r.name, r.daily_need) for r in recipients]
+        return plan
+
+    def match_result(self, recipient: PlanRecipient, lot: PlanLot, quantity: float) -> MatchResult:
+        """
+        Builds the API model for one match. Every value came from
+        models that were already validated, so validation is skipped.
+        """
+        donor = self.donors[lot.donor]
+        return MatchResult.model_construct(
+            recipient_id=recipient.id,
+            recipient_name=recipient.name,
+            donor_id=donor.id,
+            donor_name=donor.name,
+            food_name=lot.name,
+            quantity_matched=quantity,
+            unit=lot.unit,
+            expiry_date=lot.expiry_date,
+            lot_id=lot.lot_id
+        )
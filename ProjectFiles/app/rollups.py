@@ -0,0 +1,137 @@
+from datetime import date, datetime
+from typing import List, Optional
+import app.data as db
+from app.logs import logger
+from app.metrics import traced
+from app.singleflight import single_flight, wrote
+from app.models import DailyRollup, PartnerRollup, Pickup
+
+# Analytics rollups, written when a pickup is completed:
+#   rollup_daily       one document per day: quantity delivered, pickups, stops, matches
+#   rollup_donors      one per (day, donor): quantity delivered from that donor
+#   rollup_recipients  one per (day, recipient): quantity delivered to that recipient
+# Dashboards read O(days) documents instead of scanning every pickup.
+# Days are local dates (YYYY-MM-DD strings, so they sort and compare).
+
+def _day(when: datetime) -> str:
+    return when.date().isoformat()
+
+@traced("rollups.record_completed_pickup")
+def record_completed_pickup(pickup: Pickup, delivered, completed_at: datetime):
+    """
+    Adds a completed pickup to the rollups. `delivered` are the matches
+    whose food was actually taken from inventory.
+    """
+    from pymongo import UpdateOne
+
+    day = _day(completed_at)
+    database = db.get_db()
+    quantity = sum(m.quantity_matched for m in delivered)
+    database.rollup_daily.update_one(
+        {"_id": day},
+        {"$inc": {
+            "quantity": quantity,
+            "pickups": 1,
+            "stops": len(pickup.stops),
+            "matches": len(delivered)
+        }},
+        upsert=True
+    )
+
+    # One upsert per partner, sent as one batch per collection
+    for collection, id_field, name_field in (
+        (database.rollup_donors, "donor_id", "donor_name"),
+        (database.rollup_recipients, "recipient_id", "recipient_name"),
+    ):
+        totals = {}
+        for m in delivered:
+            key = str(getattr(m, id_field))
+            name, total = totals.get(key, (getattr(m, name_field), 0.0))
+            totals[key] = (name, total + m.quantity_matched)
+        if totals:
+            collection.bulk_write([
+                UpdateOne(
+                    {"_id": f"{day}:{partner_id}"},
+                    {
+                        "$set": {"day": day, "partner_id": partner_id, "name": name},
+                        "$inc": {"quantity": total, "pickups": 1}
+                    },
+                    upsert=True
+                )
+                for partner_id, (name, total) in totals.items()
+            ], ordered=False)
+    wrote("rollups")
+
+def _day_range(since: Optional[date], until: Optional[date], field: str) -> dict:
+    condition = {}
+    if since:
+        condition["$gte"] = since.isoformat()
+    if until:
+        condition["$lt"] = until.isoformat()
+    return {field: condition} if condition else {}
+
+@single_flight("rollups.get_daily", collections=("rollups",))
+@traced("rollups.get_daily")
+def get_daily(since: Optional[date] = None, until: Optional[date] = None) -> List[DailyRollup]:
+    """Per-day totals in [since, until), oldest first."""
+    rows = db.get_db().rollup_daily.find(_day_range(since, until, "_id")).sort("_id", 1)
+    return [
+        DailyRollup(
+            day=row["_id"],
+            quantity=row["quantity"],
+            pickups=row["pickups"],
+            stops=row["stops"],
+            matches=row["matches"],
+            stops_per_route=row["stops"] / row["pickups"] if row["pickups"] else 0.0,
+            quantity_per_stop=row["quantity"] / row["stops"] if row["stops"] else 0.0,
+        )
+        for row in rows
+    ]
+
+@single_flight("rollups.get_partners", collections=("rollups",))
+@traced("rollups.get_partners")
+def get_partners(kind: str, since: Optional[date] = None, until: Optional[date] = None) -> List[PartnerRollup]:
+    """Quantity delivered per donor or recipient ('donors'/'recipients') in [since, until), largest first."""
+    collection = db.get_db()[f"rollup_{kind}"]
+    rows = collection.aggregate([
+        {"$match": _day_range(since, until, "day")},
+        {"$group": {
+            "_id": "$partner_id",
+            "name": {"$last": "$name"},
+            "quantity": {"$sum": "$quantity"},
+            "pickups": {"$sum": "$pickups"},
+            "days_active": {"$sum": 1}
+        }},
+        {"$sort": {"quantity": -1}}
+    ])
+    return [
+        PartnerRollup(
+            id=row["_id"], name=row["name"], quantity=row["quantity"],
+            pickups=row["pickups"], days_active=row["days_active"]
+        )
+        for row in rows
+    ]
+
+@traced("rollups.rebuild")
+def rebuild() -> int:
+    """
+    Recomputes every rollup from the completed pickups (e.g. for pickups
+    completed before rollups existed). Uses each pickup's last update
+    as its completion time. Returns the number of pickups counted.
+
+    Run from ProjectFiles/ with: python -m app.rollups
+    """
+    database = db.get_db()
+    for name in ("rollup_daily", "rollup_donors", "rollup_recipients"):
+        database[name].delete_many({})
+    wrote("rollups")
+    count = 0
+    for data in database.pickups.find({"status": "complete"}).sort("_id", 1):
+        pickup = Pickup(**data)
+        record_completed_pickup(pickup, pickup.matches, pickup.updated_at or pickup.created_at)
+        count += 1
+    logger.info("rollups.rebuilt", extra={"pickups": count})
+    return count
+
+if __name__ == "__main__":
+    print(f"Rebuilt rollups from {rebuild()} completed pickups.")
@@ -0,0 +1,236 @@
+import os
+import threading
+import time
+from datetime import datetime, time as clock
+from typing import List, Optional, Tuple
+import app.data as db
+import app.match as match
+from app import dispatch
+from app import explain
+from app import forecast
+from app.cluster import NODE_ID, scheduler_election
+from app.inventory import available_food
+from app.logs import logger
+from app.models import MatchJob
+from app.store import store
+
+# --- Settings ---
+# FOOD_RESCUE_AUTOMATCH_SECONDS    seconds between runs; 0 turns auto-matching off (default)
+# FOOD_RESCUE_AUTOMATCH_WINDOWS    local times runs may start in, e.g. "07:00-11:00,15:00-19:00"
+#                                  (default: any time)
+# FOOD_RESCUE_AUTOMATCH_THRESHOLD  run early once this much food is not held by any match (0 = off)
+# FOOD_RESCUE_AUTOMATCH_MIN_GAP    never start runs closer together than this (seconds, default 60)
+# FOOD_RESCUE_ROUTE_MAX_MATCHES    matches per generated route (default 10)
+# FOOD_RESCUE_PLAN_HORIZON_DAYS    plan auto-matching this many days ahead with the forecast (default 0)
+# FOOD_RESCUE_MATCH_TRACE          store a trace (app/explain.py) with every scheduled job (default 0)
+# FOOD_RESCUE_SWEEP_SECONDS        seconds between expiry sweeps; 0 turns them off (default 300)
+# FOOD_RESCUE_ARCHIVE_EXPIRED      copy swept lots to 'expired_lots' first (default 1)
+
+CHECK_SECONDS = 30 # How often the leader looks at the clock and the threshold
+
+# A run holds this lease in the shared store, so runs never overlap even
+# across nodes (or while leadership moves). Longer than any sane run.
+RUN_LEASE_SECONDS = 600
+RUNNING_KEY = "automatch:running"
+LAST_RUN_KEY = "automatch:last_run"
+
+def parse_windows(text: str) -> List[Tuple[clock, clock]]:
+    """Parses "HH:MM-HH:MM,..." into (start, end) times. A window may cross midnight."""
+    windows = []
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        start, end = part.split("-")
+        windows.append((clock.fromisoformat(start.strip()), clock.fromisoformat(end.strip())))
+    return windows
+
+def in_windows(now: datetime, windows: List[Tuple[clock, clock]]) -> bool:
+    if not windows:
+        return True
+    t = now.time()
+    return any(
+        start <= t < end if start <= end else (t >= start or t < end)
+        for start, end in windows
+    )
+
+class AutoMatcher:
+    """
+    Runs matching in the background and turns the matches into pickup
+    routes, recording each run as a MatchJob.
+
+    Every worker runs one, but only the elected leader starts scheduled
+    runs. A run starts when `interval` seconds have passed since the
+    last one or, sooner, when unheld food reaches `threshold`, and only
+    inside the configured windows. Runs never overlap: if one is still
+    going (here or on another node) the next is skipped, not queued.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        windows: List[Tuple[clock, clock]],
+        threshold: float,
+        min_gap: float,
+        route_max_matches: int,
+        horizon_days: int = 0,
+        trace: bool = False
+    ):
+        self.interval = interval
+        self.windows = windows
+        self.threshold = threshold
+        self.min_gap = min_gap
+        self.route_max_matches = route_max_matches
+        self.horizon_days = horizon_days
+        self.trace = trace
+        self._running = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def start(self):
+        if not self.enabled:
+            return
+        self._thread = threading.Thread(target=self._loop, name="automatch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _loop(self):
+        while not self._stop.wait(CHECK_SECONDS):
+            try:
+                trigger = self._due()
+                if trigger:
+                    self.run(trigger)
+            except Exception as e:
+                logger.warning("automatch.check_failed", extra={"error": e})
+
+    def _due(self) -> Optional[str]:
+        """Why a run should start now, or None."""
+        if not scheduler_election.is_leader or not in_windows(datetime.now(), self.windows):
+            return None
+        since_last = time.time() - store.get(LAST_RUN_KEY, 0)
+        if since_last >= self.interval:
+            return "interval"
+        if self.threshold and since_last >= self.min_gap and db.get_available_quantity() >= self.threshold:
+            return "threshold"
+        return None
+
+    def run(self, trigger: str, trace: Optional[bool] = None) -> Optional[str]:
+        """
+        Runs one matching job now. Returns its ID, or None if a run is
+        already in progress (backpressure: the caller just skips).
+        `trace` stores a match trace with the job (default: the setting).
+        """
+        trace = self.trace if trace is None else trace
+        if not self._running.acquire(blocking=False):
+            return None
+        try:
+            if not store.add(RUNNING_KEY, NODE_ID, RUN_LEASE_SECONDS):
+                return None
+            try:
+                store.set(LAST_RUN_KEY, time.time())
+                return self._run_job(trigger, trace)
+            finally:
+                store.delete(RUNNING_KEY, NODE_ID)
+        finally:
+            self._running.release()
+
+    def _run_job(self, trigger: str, trace: bool = False) -> str:
+        job_id = db.create_match_job(MatchJob(trigger=trigger, node=NODE_ID, traced=trace))
+        try:
+            recipients = self._remaining_needs()
+            food = planned = available_food()
+            if self.horizon_days:
+                planned = forecast.plan_todays_food(food, recipients, self.horizon_days)
+            if trace:
+                proposed, match_trace = explain.run_traced(recipients, food, planned)
+                db.save_match_trace(job_id, match_trace)
+            else:
+                proposed = match.run_matching_algorithm(recipients, planned)
+            matches = dispatch.reserve_matches(proposed)
+            pickup_ids = []
+            conflicts = 0
+            for route in match.batch_into_routes(matches, self.route_max_matches):
+                try:
+                    pickup_ids.append(dispatch.create_route(route))
+                except dispatch.ReservationConflict:
+                    # Give back the rest of this route's holds; the next run retries
+                    conflicts += 1
+                    for m in route:
+                        if m.lot_id and m.hold_id:
+                            db.release_hold(m.donor_id, m.lot_id, m.hold_id)
+            db.finish_match_job(
+                job_id, status="complete", matches=len(matches),
+                pickup_ids=pickup_ids, conflicts=conflicts
+            )
+            logger.info("automatch.completed", extra={
+                "job_id": job_id, "trigger": trigger, "matches": len(matches),
+                "routes": len(pickup_ids), "conflicts": conflicts
+            })
+        except Exception as e:
+            logger.exception("automatch.failed", extra={"job_id": job_id, "error": e})
+            db.finish_match_job(job_id, status="failed", error=str(e))
+        return job_id
+
+    def _remaining_needs(self):
+        """Recipients with today's need reduced by what is already routed to them today."""
+        today = datetime.combine(datetime.now().date(), clock.min)
+        routed = db.get_routed_quantities(today)
+        recipients = []
+        for r in db.get_all_recipients():
+            need = r.daily_need - routed.get(str(r.id), 0.0)
+            if need > 0:
+                recipients.append(r.model_copy(update={"daily_need": need}))
+        return recipients
+
+auto_matcher = AutoMatcher(
+    interval=float(os.environ.get("FOOD_RESCUE_AUTOMATCH_SECONDS", "0")),
+    windows=parse_windows(os.environ.get("FOOD_RESCUE_AUTOMATCH_WINDOWS", "")),
+    threshold=float(os.environ.get("FOOD_RESCUE_AUTOMATCH_THRESHOLD", "0")),
+    min_gap=float(os.environ.get("FOOD_RESCUE_AUTOMATCH_MIN_GAP", "60")),
+    route_max_matches=int(os.environ.get("FOOD_RESCUE_ROUTE_MAX_MATCHES", "10")),
+    horizon_days=int(os.environ.get("FOOD_RESCUE_PLAN_HORIZON_DAYS", "0")),
+    trace=os.environ.get("FOOD_RESCUE_MATCH_TRACE", "0") == "1",
+)
+
+class ExpirySweeper:
+    """
+    Removes expired lots from the donors' inventory every `interval`
+    seconds (on the leader only), so the matcher's working set only
+    holds food that can still be delivered.
+    """
+
+    def __init__(self, interval: float, archive: bool):
+        self.interval = interval
+        self.archive = archive
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._loop, name="expiry-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            if not scheduler_election.is_leader:
+                continue
+            try:
+                db.sweep_expired_lots(archive=self.archive)
+            except Exception as e:
+                logger.warning("sweeper.failed", extra={"error": e})
+
+expiry_sweeper = ExpirySweeper(
+    interval=float(os.environ.get("FOOD_RESCUE_SWEEP_SECONDS", "300")),
+    archive=os.environ.get("FOOD_RESCUE_ARCHIVE_EXPIRED", "1") != "0",
+)
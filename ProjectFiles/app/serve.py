@@ -0,0 +1,49 @@
+"""
+Runs the API as several worker processes (one per core by default).
+
+Workers share nothing in memory, so with more than one the shared
+store must be MongoDB (FOOD_RESCUE_STORE=mongo). It is selected
+automatically when unset. Run the same command on several machines
+against one MongoDB to scale across nodes; leader election makes sure
+scheduled jobs still run on one worker only.
+
+Usage (from ProjectFiles/):
+
+    python -m app.serve --workers 4 --port 8000
+    python -m app.serve --server gunicorn --workers 8
+"""
+import argparse
+import os
+import sys
+from app.store import STORE_ENV
+
+APP = "app.api:app"
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Food Rescue API with several workers.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--server", choices=("uvicorn", "gunicorn"), default="uvicorn",
+                        help="process manager (gunicorn restarts workers that die)")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        store = os.environ.setdefault(STORE_ENV, "mongo")
+        if store != "mongo":
+            sys.exit(f"{STORE_ENV}={store} is per-process; use 'mongo' with more than one worker")
+
+    if args.server == "gunicorn":
+        # Replaces this process; gunicorn reads the same environment
+        os.execvp("gunicorn", [
+            "gunicorn", APP,
+            "--worker-class", "uvicorn.workers.UvicornWorker",
+            "--workers", str(args.workers),
+            "--bind", f"{args.host}:{args.port}",
+        ])
+
+    import uvicorn
+    uvicorn.run(APP, host=args.host, port=args.port, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
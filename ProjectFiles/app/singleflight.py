@@ -0,0 +1,87 @@
+import inspect
+import threading
+from concurrent.futures import Future
+from functools import wraps
+from typing import Callable, Dict, Hashable, Tuple
+from app.metrics import SINGLEFLIGHT_CALLS
+
+# Single-flight: concurrent identical calls share one computation.
+#
+# When several clients start at once they all ask for the same donors,
+# recipients and pickups. With single-flight, the first call for a key
+# runs and the calls that arrive while it is running wait for it and
+# get the same result, so the database sees one query per distinct
+# request instead of one per client. Nothing is cached: a call made
+# after the computation finished runs again, so results are never
+# older than a call that was already in flight when this one arrived.
+#
+# The shared result is the same object for every caller; callers must
+# treat it as read-only (the API only serializes it).
+#
+# A flight that started before a write may not have seen it, so a read
+# made after that write must not join it (the desktop re-reads right
+# after saving). Each collection has a write generation in this
+# process, bumped by wrote() once a write to it has finished; it is
+# part of a flight's key, so reads on either side of a write never share.
+
+_generations: Dict[str, int] = {}
+_generations_lock = threading.Lock()
+
+def wrote(collection: str):
+    """Call after every write to `collection` (see app/data.py)."""
+    with _generations_lock:
+        _generations[collection] = _generations.get(collection, 0) + 1
+
+def generations(collections: Tuple[str, ...]) -> Tuple[int, ...]:
+    with _generations_lock:
+        return tuple(_generations.get(c, 0) for c in collections)
+
+class SingleFlight:
+    """One in-flight computation per key."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable):
+        """Runs fn() unless a call with `key` is in flight; then waits for its result (or error)."""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        SINGLEFLIGHT_CALLS.inc(self.name, "ran" if leader else "shared")
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+def single_flight(name: str, collections: Tuple[str, ...] = ()):
+    """
+    Decorator: concurrent calls with equal arguments share one call,
+    unless one of `collections` (the ones the call reads) was written
+    between them. Arguments must be hashable (IDs, dates, numbers, strings).
+    """
+    def decorator(fn):
+        group = SingleFlight(name)
+        signature = inspect.signature(fn)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            # Defaults filled in, so f() and f(skip=0) share a flight
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (tuple(bound.arguments.items()), generations(collections))
+            return group.do(key, lambda: fn(*args, **kwargs))
+        wrapper.flights = group
+        return wrapper
+    return decorator
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Optional
+import app.data as data
+
+# Which shared store the API uses:
+#   local  in-process only: one worker, development and tests (default)
+#   mongo  the "shared_state" collection: any number of workers and nodes
+STORE_ENV = "FOOD_RESCUE_STORE"
+
+class LocalStore:
+    """
+    Shared store for a single process: a dict with expiry times.
+    Same interface as MongoStore, so code written against it keeps
+    working when the API runs as several workers.
+    """
+
+    kind = "local"
+
+    def __init__(self):
+        self._items = {} # key -> (value, expires at monotonic seconds or None)
+        self._lock = threading.Lock()
+
+    def _live(self, key: str):
+        item = self._items.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.monotonic():
+            del self._items[key]
+            return None
+        return item
+
+    def _expiry(self, ttl: Optional[float]):
+        return time.monotonic() + ttl if ttl else None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._live(key)
+            return default if item is None else item[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._items[key] = (value, self._expiry(ttl))
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Sets `key` only if it is absent (or expired). True if this call set it."""
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._items[key] = (value, self._expiry(ttl))
+            return True
+
+    def extend(self, key: str, value: Any, ttl: float) -> bool:
+        """Renews the TTL of `key` if it still holds `value` (i.e. we still own it)."""
+        with self._lock:
+            item = self._live(key)
+            if item is None or item[0] != value:
+                return False
+            self._items[key] = (value, self._expiry(ttl))
+            return True
+
+    def delete(self, key: str, value: Any = None) -> bool:
+        """Deletes `key`; if `value` is given, only while it still holds that value."""
+        with self._lock:
+            item = self._live(key)
+            if item is None or (value is not None and item[0] != value):
+                return False
+            del self._items[key]
+            return True
+
+class MongoStore:
+    """
+    Shared store in MongoDB, one document per key:
+        {_id: key, value: ..., expires_at: datetime | None}
+    A TTL index (created by data.connect) removes expired documents in
+    the background; reads and add() also treat them as absent, since
+    that removal can lag by a minute. Values must be BSON-serialisable.
+    """
+
+    kind = "mongo"
+
+    def _collection(self):
+        return data.get_db().shared_state
+
+    def _expiry(self, ttl: Optional[float]):
+        return datetime.utcnow() + timedelta(seconds=ttl) if ttl else None
+
+    def _not_expired(self) -> dict:
+        return {"$or": [{"expires_at": None}, {"expires_at": {"$gt": datetime.utcnow()}}]}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        doc = self._collection().find_one({"_id": key, **self._not_expired()})
+        return default if doc is None else doc["value"]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._collection().replace_one(
+            {"_id": key}, {"value": value, "expires_at": self._expiry(ttl)}, upsert=True
+        )
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        from pymongo.errors import DuplicateKeyError
+        # Matches only a missing or expired key; if a live one exists the
+        # upsert tries to insert a second '_id' and fails.
+        try:
+            self._collection().update_one(
+                {"_id": key, "expires_at": {"$lte": datetime.utcnow()}},
+                {"$set": {"value": value, "expires_at": self._expiry(ttl)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def extend(self, key: str, value: Any, ttl: float) -> bool:
+        result = self._collection().update_one(
+            {"_id": key, "value": value, **self._not_expired()},
+            {"$set": {"expires_at": self._expiry(ttl)}}
+        )
+        return result.matched_count == 1
+
+    def delete(self, key: str, value: Any = None) -> bool:
+        query = {"_id": key}
+        if value is not None:
+            query["value"] = value
+        return self._collection().delete_one(query).deleted_count == 1
+
+def make_store():
+    kind = os.environ.get(STORE_ENV, "local").lower()
+    if kind == "mongo":
+        return MongoStore()
+    if kind != "local":
+        raise ValueError(f"{STORE_ENV} must be 'local' or 'mongo', not '{kind}'")
+    return LocalStore()
+
+# The store every module shares. Nothing connects until it is first used.
+store = make_store()
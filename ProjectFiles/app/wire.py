@@ -0,0 +1,147 @@
+import gzip
+import json
+from typing import Dict, List, Optional
+
+# Wire formats and compression for large responses.
+#
+# List endpoints answer in JSON by default. A client can ask (with the
+# Accept header) for a more compact encoding of the same records:
+#   application/msgpack                          the records, as MessagePack
+#   application/vnd.foodrescue.columns+json      a columnar table (below), as JSON
+#   application/vnd.foodrescue.columns+msgpack   the same table, as MessagePack
+# MessagePack needs the 'msgpack' package on the server; without it
+# only the JSON formats are offered.
+#
+# A columnar table stores each field once with all its values, and
+# string fields with few distinct values (donor names, units, statuses)
+# as a dictionary plus one small integer per row:
+#   {"count": 2, "columns": {
+#       "donor_name": {"dict": ["Bakery"], "codes": [0, 0]},
+#       "quantity":   {"values": [5.0, 2.5]},
+#       "matches":    {"lengths": [1, 3], "table": {...}}   # lists of records, nested
+#   }}
+# Clients decode it back into the same records the JSON would give
+# (see ui/wire.py).
+#
+# Responses are also compressed when the client accepts it: zstd or
+# brotli if their packages ('zstandard', 'brotli') are installed,
+# otherwise gzip.
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+COLUMNS_JSON = "application/vnd.foodrescue.columns+json"
+COLUMNS_MSGPACK = "application/vnd.foodrescue.columns+msgpack"
+
+# Smaller responses are sent as they are (compressing costs more than it saves)
+MIN_COMPRESS_BYTES = 1024
+
+# Only these are compressed by the middleware (exports and the change
+# feed are streams and stay untouched)
+COMPRESSIBLE_TYPES = (JSON, MSGPACK, "application/vnd.foodrescue.", "text/plain")
+
+# A string column is dictionary-encoded when it has at most this many
+# distinct values per row
+DICT_MAX_RATIO = 0.5
+
+def _optional(module: str):
+    try:
+        return __import__(module)
+    except ImportError:
+        return None
+
+msgpack = _optional("msgpack")
+brotli = _optional("brotli")
+zstandard = _optional("zstandard")
+
+# --- Content negotiation ---
+
+def _parse_accept(header: Optional[str]) -> Dict[str, float]:
+    """'a, b;q=0.5' -> {'a': 1.0, 'b': 0.5}"""
+    choices = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        choices[name.strip().lower()] = quality
+    return choices
+
+def formats() -> List[str]:
+    """Wire formats this server can produce, most compact first."""
+    compact = [COLUMNS_MSGPACK, MSGPACK] if msgpack else []
+    return compact + [COLUMNS_JSON, JSON]
+
+def choose_format(accept: Optional[str]) -> str:
+    """The format to answer in: the client's highest-rated one we support (JSON if none)."""
+    choices = _parse_accept(accept)
+    best, best_quality = JSON, 0.0
+    for media_type in formats():
+        quality = choices.get(media_type, 0.0)
+        if quality > best_quality:
+            best, best_quality = media_type, quality
+    return best
+
+def encodings() -> List[str]:
+    """Content codings this server can produce, best first."""
+    return (["zstd"] if zstandard else []) + (["br"] if brotli else []) + ["gzip"]
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The coding to compress with, or None if the client accepts none of ours."""
+    choices = _parse_accept(accept_encoding)
+    for encoding in encodings():
+        if choices.get(encoding, choices.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    # Fast levels: this runs on every large response
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    if encoding == "br":
+        return brotli.compress(body, quality=4)
+    return gzip.compress(body, compresslevel=5)
+
+def compressible(media_type: Optional[str]) -> bool:
+    return bool(media_type) and media_type.startswith(COMPRESSIBLE_TYPES)
+
+# --- Columnar tables ---
+
+def _encode_column(values: list) -> dict:
+    if any(values) and all(isinstance(v, list) and all(isinstance(x, dict) for x in v) for v in values):
+        return {
+            "lengths": [len(v) for v in values],
+            "table": encode_table([x for v in values for x in v])
+        }
+    if all(v is None or isinstance(v, str) for v in values):
+        distinct = {}
+        codes = [distinct.setdefault(v, len(distinct)) for v in values]
+        if len(distinct) <= len(values) * DICT_MAX_RATIO:
+            return {"dict": list(distinct), "codes": codes}
+    return {"values": values}
+
+def encode_table(rows: List[dict]) -> dict:
+    """Records (all with the same fields, as from model_dump) as a columnar table."""
+    names = {}
+    for row in rows:
+        for name in row:
+            names.setdefault(name, None)
+    return {
+        "count": len(rows),
+        "columns": {name: _encode_column([row.get(name) for row in rows]) for name in names}
+    }
+
+def render(items: list, media_type: str) -> bytes:
+    """Models in one of the compact formats (or JSON), as the API would serialize them."""
+    rows = [item.model_dump(mode="json", by_alias=True) for item in items]
+    if media_type in (COLUMNS_JSON, COLUMNS_MSGPACK):
+        rows = encode_table(rows)
+    if media_type in (MSGPACK, COLUMNS_MSGPACK):
+        return msgpack.packb(rows)
+    return json.dumps(rows, separators=(",", ":")).encode()
@@ -0,0 +1,201 @@
+"""
+Micro-benchmarks for the matcher (match.run_matching_algorithm) and
+the pickup stop builder (match.build_pickup_stops).
+
+The traced matcher (match.trace_matching_algorithm) is timed as well
+and checked to give the same matches, so the cost of tracing is
+reported without adding anything to the default matcher's time.
+
+Runs each dataset profile at several sizes, without a database, and
+reports time, peak memory and allocations (tracemalloc) together with
+quality metrics. An algorithm change should be judged on both speed
+and outcome. Each run is appended to
+benchmarks/results/bench_match.jsonl and compared with the previous
+run that used the same parameters.
+
+Usage (from ProjectFiles/):
+
+    python -m benchmarks.bench_match --sizes 1000,10000 --profiles skewed_need,tiny_lots
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+
+from bson import ObjectId
+
+from app import match
+from app.models import AvailableFood, Donor, Recipient
+from benchmarks import synthetic
+from benchmarks.results import load_previous, save_run, change
+
+# Matches per generated route when timing the stop builder
+ROUTE_SIZE = 10
+
+# Dataset profiles: how lots and needs are distributed.
+# "lots" is the number of lots at size 1; recipients scale with it.
+PROFILES = {
+    "realistic":    {"lot_size": "normal", "expiry": "normal", "need": "normal", "lots_per_donor": 5},
+    "skewed_need":  {"lot_size": "normal", "expiry": "normal", "need": "skewed", "lots_per_donor": 5},
+    "tiny_lots":    {"lot_size": "tiny",   "expiry": "normal", "need": "normal", "lots_per_donor": 20},
+    "huge_lots":    {"lot_size": "huge",   "expiry": "normal", "need": "normal", "lots_per_donor": 1},
+    "mixed_expiry": {"lot_size": "normal", "expiry": "mixed",  "need": "normal", "lots_per_donor": 5},
+}
+
+# --- Dataset ---
+
+def make_dataset(profile: str, lots: int, seed: int, now: datetime):
+    """Builds (donors, recipients, available food) as API models for one profile."""
+    spec = PROFILES[profile]
+    rng = random.Random(seed)
+    donor_count = max(1, lots // spec["lots_per_donor"])
+    donor_docs = synthetic.make_donors(
+        rng, donor_count, spec["lots_per_donor"], now=now,
+        size=spec["lot_size"], expiry=spec["expiry"]
+    )
+    # About one recipient per 25 lots
+    recipient_docs = synthetic.make_recipients(rng, max(1, lots // 25), need=spec["need"], now=now)
+
+    donors = []
+    food = []
+    for doc in donor_docs:
+        doc["_id"] = ObjectId()
+        donors.append(Donor(**doc))
+        for lot in doc["current_donations"]:
+            food.append(AvailableFood(donor_id=doc["_id"], donor_name=doc["name"], **lot))
+    recipients = []
+    for doc in recipient_docs:
+        doc["_id"] = ObjectId()
+        recipients.append(Recipient(**doc))
+    return donors, recipients, food
+
+# --- Measurements ---
+
+def measure(fn, repeats: int):
+    """
+    Runs `fn` `repeats` times for the best wall time, then once more
+    under tracemalloc. Returns (result, best seconds, peak bytes, allocations).
+    """
+    best = float("inf")
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocations = sum(stat.count for stat in snapshot.statistics("filename"))
+    return result, best, peak, allocations
+
+def quality(recipients, food, matches, now: datetime) -> dict:
+    """Outcome metrics for one matching run."""
+    total_need = sum(r.daily_need for r in recipients)
+    total_supply = sum(f.quantity for f in food)
+    matched = sum(m.quantity_matched for m in matches)
+
+    per_recipient = defaultdict(float)
+    recipients_per_lot = defaultdict(set)
+    expired = 0.0
+    for m in matches:
+        per_recipient[str(m.recipient_id)] += m.quantity_matched
+        recipients_per_lot[(str(m.donor_id), m.food_name, m.expiry_date)].add(str(m.recipient_id))
+        if m.expiry_date < now:
+            expired += m.quantity_matched
+
+    fully_served = sum(1 for r in recipients if per_recipient[str(r.id)] >= r.daily_need - 1e-9)
+    used_lots = len(recipients_per_lot)
+    fragmented = sum(1 for shares in recipients_per_lot.values() if len(shares) > 1)
+
+    return {
+        "fulfilled_pct": round(100 * matched / min(total_need, total_supply), 2) if total_need and total_supply else 0,
+        "recipients_fully_served_pct": round(100 * fully_served / len(recipients), 2) if recipients else 0,
+        "lots_fragmented_pct": round(100 * fragmented / used_lots, 2) if used_lots else 0,
+        "matches_per_recipient": round(len(matches) / len(recipients), 2) if recipients else 0,
+        "expired_quantity_matched": round(expired, 2),
+    }
+
+def bench_one(profile: str, lots: int, seed: int, repeats: int) -> dict:
+    now = datetime.now()
+    donors, recipients, food = make_dataset(profile, lots, seed, now)
+
+    matches, match_s, match_peak, match_allocs = measure(
+        lambda: match.run_matching_algorithm(recipients, food), repeats
+    )
+
+    (traced_matches, _), trace_s, _, _ = measure(
+        lambda: match.trace_matching_algorithm(recipients, food), repeats
+    )
+    assert [m.model_dump() for m in traced_matches] == [m.model_dump() for m in matches], \
+        "traced matcher gave different matches"
+
+    donors_by_id = {str(d.id): d for d in donors}
+    recipients_by_id = {str(r.id): r for r in recipients}
+    routes = [matches[i:i + ROUTE_SIZE] for i in range(0, len(matches), ROUTE_SIZE)]
+    _, stops_s, stops_peak, stops_allocs = measure(
+        lambda: [match.build_pickup_stops(route, donors_by_id, recipients_by_id) for route in routes],
+        repeats
+    )
+
+    return {
+        "lots": len(food),
+        "recipients": len(recipients),
+        "matches": len(matches),
+        "match_ms": round(match_s * 1000, 3),
+        "match_peak_kb": round(match_peak / 1024, 1),
+        "match_allocations": match_allocs,
+        "trace_ms": round(trace_s * 1000, 3),
+        "stops_ms": round(stops_s * 1000, 3),
+        "stops_peak_kb": round(stops_peak / 1024, 1),
+        "stops_allocations": stops_allocs,
+        "quality": quality(recipients, food, matches, now),
+    }
+
+# --- Report ---
+
+def print_report(results: dict, previous):
+    old = previous["results"] if previous else {}
+    print(f"{'profile/size':24} {'lots':>7} {'match ms':>10} {'peak KB':>9} {'trace ms':>9} {'stops ms':>9}"
+          f" {'fulfil%':>8} {'frag%':>6} {'expired':>8}  vs previous")
+    for key, r in results.items():
+        q = r["quality"]
+        delta = ""
+        if key in old:
+            delta = f"match {change(r['match_ms'], old[key]['match_ms'])}, " \
+                    f"stops {change(r['stops_ms'], old[key]['stops_ms'])}, " \
+                    f"fulfil {q['fulfilled_pct'] - old[key]['quality']['fulfilled_pct']:+.2f}pt"
+        print(f"{key:24} {r['lots']:>7} {r['match_ms']:>10} {r['match_peak_kb']:>9} {r['trace_ms']:>9} {r['stops_ms']:>9}"
+              f" {q['fulfilled_pct']:>8} {q['lots_fragmented_pct']:>6} {q['expired_quantity_matched']:>8}  {delta}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the matcher and stop builder.")
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="comma-separated profiles")
+    parser.add_argument("--sizes", default="1000,5000", help="comma-separated lot counts")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per case (best is kept)")
+    parser.add_argument("--seed", type=int, default=7, help="random seed")
+    parser.add_argument("--no-save", action="store_true", help="do not store this run")
+    args = parser.parse_args()
+
+    profiles = args.profiles.split(",")
+    sizes = [int(s) for s in args.sizes.split(",")]
+    for profile in profiles:
+        if profile not in PROFILES:
+            parser.error(f"unknown profile '{profile}' (choose from {', '.join(PROFILES)})")
+
+    results = {}
+    for profile in profiles:
+        for size in sizes:
+            results[f"{profile}/{size}"] = bench_one(profile, size, args.seed, args.repeats)
+
+    params = {"profiles": profiles, "sizes": sizes, "repeats": args.repeats, "seed": args.seed}
+    print_report(results, load_previous("bench_match", params))
+    if not args.no_save:
+        save_run("bench_match", params, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Memory benchmark for the matcher's working set: the API models
+(AvailableFood, Recipient) against the compact planning records
+(app/planning.py) built from them.
+
+For each profile and size it reports bytes per lot for both, and the
+time to convert at the boundary (Plan.from_models). Sizes are
+measured with tracemalloc around building each representation, so
+they include everything the objects own (IDs, strings, datetimes).
+Each run is appended to benchmarks/results/bench_planning.jsonl and
+compared with the previous run that used the same parameters.
+
+Usage (from ProjectFiles/):
+
+    python -m benchmarks.bench_planning --sizes 10000,50000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime
+
+from app.planning import Plan
+from benchmarks.bench_match import PROFILES, make_dataset
+from benchmarks.results import load_previous, save_run, change
+
+def allocated(build):
+    """Returns (result, bytes still allocated by `build` once it returns)."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+def bench_one(profile: str, lots: int, seed: int) -> dict:
+    _, recipients, food = make_dataset(profile, lots, seed, datetime.now())
+
+    # The API models as the matcher used to hold them: a deep copy per run
+    _, models_bytes = allocated(lambda: (
+        [f.model_copy(deep=True) for f in food],
+        [r.model_copy(deep=True) for r in recipients]
+    ))
+    plan, plan_bytes = allocated(lambda: Plan.from_models(recipients, food))
+
+    start = time.perf_counter()
+    Plan.from_models(recipients, food)
+    convert_s = time.perf_counter() - start
+
+    return {
+        "lots": len(food),
+        "donors": len(plan.donors),
+        "recipients": len(recipients),
+        "model_bytes_per_lot": round(models_bytes / len(food), 1),
+        "plan_bytes_per_lot": round(plan_bytes / len(food), 1),
+        "saving_pct": round(100 * (1 - plan_bytes / models_bytes), 1) if models_bytes else 0,
+        "convert_ms": round(convert_s * 1000, 3),
+    }
+
+def print_report(results: dict, previous):
+    old = previous["results"] if previous else {}
+    print(f"{'profile/size':24} {'lots':>7} {'model B/lot':>12} {'plan B/lot':>11} {'saving':>7} {'convert ms':>11}  vs previous")
+    for key, r in results.items():
+        delta = ""
+        if key in old:
+            delta = f"plan B/lot {change(r['plan_bytes_per_lot'], old[key]['plan_bytes_per_lot'])}"
+        print(f"{key:24} {r['lots']:>7} {r['model_bytes_per_lot']:>12} {r['plan_bytes_per_lot']:>11}"
+              f" {r['saving_pct']:>6}% {r['convert_ms']:>11}  {delta}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the matcher's per-lot memory footprint.")
+    parser.add_argument("--profiles", default="realistic,tiny_lots", help="comma-separated profiles")
+    parser.add_argument("--sizes", default="10000", help="comma-separated lot counts")
+    parser.add_argument("--seed", type=int, default=7, help="random seed")
+    parser.add_argument("--no-save", action="store_true", help="do not store this run")
+    args = parser.parse_args()
+
+    profiles = args.profiles.split(",")
+    sizes = [int(s) for s in args.sizes.split(",")]
+    for profile in profiles:
+        if profile not in PROFILES:
+            parser.error(f"unknown profile '{profile}' (choose from {', '.join(PROFILES)})")
+
+    results = {}
+    for profile in profiles:
+        for size in sizes:
+            results[f"{profile}/{size}"] = bench_one(profile, size, args.seed)
+
+    params = {"profiles": profiles, "sizes": sizes, "seed": args.seed}
+    print_report(results, load_previous("bench_planning", params))
+    if not args.no_save:
+        save_run("bench_planning", params, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Validation benchmarks for the API models.
+
+Measures, per document, how long Pydantic takes to validate:
+  - IDs alone, with the current PyObjectId schema and with the old one
+    (a Python validator calling ObjectId.is_valid, then ObjectId());
+  - Donor documents as read from MongoDB (list endpoints);
+  - Pickup documents with their matches (GET /pickups);
+  - MatchResult bodies as JSON-decoded dicts (POST /pickups).
+
+Each run is appended to benchmarks/results/bench_validation.jsonl and
+compared with the previous run that used the same parameters.
+
+Usage (from ProjectFiles/):
+
+    python -m benchmarks.bench_validation --docs 5000
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+from typing import List
+
+from bson import ObjectId
+from pydantic import TypeAdapter
+from pydantic_core import core_schema
+
+from app.models import Donor, MatchResult, Pickup, PyObjectId
+from benchmarks import synthetic
+from benchmarks.results import load_previous, save_run, change
+
+class LegacyObjectId(ObjectId):
+    """The schema PyObjectId used before: every string goes through Python."""
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        def validate(v: str) -> ObjectId:
+            if not ObjectId.is_valid(v):
+                raise ValueError("Invalid objectid")
+            return ObjectId(v)
+
+        return core_schema.json_or_python_schema(
+            json_schema=core_schema.str_schema(),
+            python_schema=core_schema.union_schema([
+                core_schema.is_instance_schema(ObjectId),
+                core_schema.chain_schema([
+                    core_schema.str_schema(),
+                    core_schema.no_info_plain_validator_function(validate),
+                ]),
+            ]),
+            serialization=core_schema.plain_serializer_function_ser_schema(lambda v: str(v)),
+        )
+
+# --- Documents ---
+
+def make_documents(count: int, seed: int):
+    """Donor docs (as stored), pickup docs (as stored) and match bodies (as JSON-decoded)."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    donors = synthetic.make_donors(rng, count, 5, now=now)
+    donor_ids = [ObjectId() for _ in range(max(1, count // 20))]
+    recipient_ids = [ObjectId() for _ in range(max(1, count // 50))]
+    for doc in donors:
+        doc["_id"] = ObjectId()
+    lots = [lot for doc in donors for lot in doc["current_donations"]]
+
+    def match_body():
+        lot = rng.choice(lots)
+        return {
+            "recipient_id": str(rng.choice(recipient_ids)), "recipient_name": "Shelter",
+            "donor_id": str(rng.choice(donor_ids)), "donor_name": "Bakery",
+            "food_name": lot["name"], "quantity_matched": lot["quantity"],
+            "unit": lot["unit"], "expiry_date": lot["expiry_date"],
+        }
+
+    matches = [match_body() for _ in range(count)]
+    pickups = [
+        {
+            "_id": ObjectId(), "created_at": now, "status": "pending",
+            "matches": [match_body() for _ in range(5)],
+            "stops": [{"stop_type": "pickup", "name": "Bakery", "address": "1 Main St"}],
+        }
+        for _ in range(count)
+    ]
+    return donors, pickups, matches
+
+def per_item_us(fn, items: int, repeats: int) -> float:
+    """Best time over `repeats` runs of fn(), in microseconds per item."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best / items * 1e6, 3)
+
+def run(docs: int, repeats: int, seed: int) -> dict:
+    donors, pickups, matches = make_documents(docs, seed)
+    hex_ids = [str(ObjectId()) for _ in range(docs)]
+    # Real ID lists repeat (the same donor on many matches)
+    repeated_ids = [random.Random(seed).choice(hex_ids[:max(1, docs // 20)]) for _ in range(docs)]
+
+    current = TypeAdapter(List[PyObjectId])
+    legacy = TypeAdapter(List[LegacyObjectId])
+
+    return {
+        "id_unique_us": per_item_us(lambda: current.validate_python(hex_ids), docs, repeats),
+        "id_unique_legacy_us": per_item_us(lambda: legacy.validate_python(hex_ids), docs, repeats),
+        "id_repeated_us": per_item_us(lambda: current.validate_python(repeated_ids), docs, repeats),
+        "id_repeated_legacy_us": per_item_us(lambda: legacy.validate_python(repeated_ids), docs, repeats),
+        "donor_us": per_item_us(lambda: [Donor(**d) for d in donors], docs, repeats),
+        "pickup_us": per_item_us(lambda: [Pickup(**p) for p in pickups], docs, repeats),
+        "match_us": per_item_us(lambda: [MatchResult(**m) for m in matches], docs, repeats),
+    }
+
+def print_report(results: dict, previous):
+    old = previous["results"] if previous else {}
+    print(f"{'case':24} {'us/doc':>9}  vs previous")
+    for key, value in results.items():
+        delta = change(value, old[key]) if key in old else ""
+        print(f"{key:24} {value:>9}  {delta}")
+    for kind in ("unique", "repeated"):
+        new, legacy = results[f"id_{kind}_us"], results[f"id_{kind}_legacy_us"]
+        print(f"ObjectId ({kind}): {change(new, legacy)} vs the old Python validator")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark model validation.")
+    parser.add_argument("--docs", type=int, default=5000, help="documents per case")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per case (best is kept)")
+    parser.add_argument("--seed", type=int, default=7, help="random seed")
+    parser.add_argument("--no-save", action="store_true", help="do not store this run")
+    args = parser.parse_args()
+
+    results = run(args.docs, args.repeats, args.seed)
+    params = {"docs": args.docs, "repeats": args.repeats, "seed": args.seed}
+    print_report(results, load_previous("bench_validation", params))
+    if not args.no_save:
+        save_run("bench_validation", params, results)
+
+if __name__ == "__main__":
+    main()
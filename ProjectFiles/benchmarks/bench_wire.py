@@ -0,0 +1,127 @@
+"""
+Wire-format benchmark for large list responses (app/wire.py).
+
+Builds a /matches/run response (MatchResult records as the API
+serializes them, with donor and recipient names repeated on every
+match) and reports, for each format and content coding the server can
+produce: bytes on the wire, server encode time and client decode time.
+Formats: JSON, columnar JSON, and the MessagePack variants if msgpack
+is installed; codings: none, gzip, and br/zstd if their packages are.
+
+Each run is appended to benchmarks/results/bench_wire.jsonl and
+compared with the previous run that used the same parameters.
+
+Usage (from ProjectFiles/):
+
+    python -m benchmarks.bench_wire --matches 20000
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+from datetime import datetime
+
+from bson import ObjectId
+
+from app import wire
+from benchmarks import synthetic
+from benchmarks.results import load_previous, save_run, change
+
+# The client's decoder lives with the desktop app
+from ui import wire as client_wire
+
+def make_matches(count: int, seed: int) -> list:
+    """MatchResult records in their JSON form (what model_dump(mode="json") gives)."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    donors = [(str(ObjectId()), f"Donor {i:05d}") for i in range(max(1, count // 20))]
+    recipients = [(str(ObjectId()), f"Shelter {i:04d}") for i in range(max(1, count // 50))]
+    rows = []
+    for _ in range(count):
+        lot = synthetic.make_lot(rng, now)
+        donor_id, donor_name = rng.choice(donors)
+        recipient_id, recipient_name = rng.choice(recipients)
+        rows.append({
+            "recipient_id": recipient_id, "recipient_name": recipient_name,
+            "donor_id": donor_id, "donor_name": donor_name,
+            "food_name": lot["name"], "quantity_matched": lot["quantity"], "unit": lot["unit"],
+            "expiry_date": lot["expiry_date"].isoformat(),
+            "lot_id": str(ObjectId()), "hold_id": str(ObjectId()),
+        })
+    return rows
+
+def encode(rows: list, media_type: str) -> bytes:
+    """Same steps as wire.render, after model_dump."""
+    body = wire.encode_table(rows) if media_type in (wire.COLUMNS_JSON, wire.COLUMNS_MSGPACK) else rows
+    if media_type in (wire.MSGPACK, wire.COLUMNS_MSGPACK):
+        return wire.msgpack.packb(body)
+    return json.dumps(body, separators=(",", ":")).encode()
+
+class _Response:
+    """Just enough of requests.Response for client_wire.decode()."""
+
+    def __init__(self, content: bytes, media_type: str):
+        self.content = content
+        self.headers = {"content-type": media_type}
+
+    def json(self):
+        return json.loads(self.content)
+
+def best_ms(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return wire.zstandard.ZstdDecompressor().decompress(data)
+    if encoding == "br":
+        return wire.brotli.decompress(data)
+    return gzip.decompress(data)
+
+def run(matches: int, repeats: int, seed: int) -> dict:
+    rows = make_matches(matches, seed)
+    results = {}
+    for media_type in wire.formats():
+        name = media_type.split("/")[-1].replace("vnd.foodrescue.", "")
+        body = encode(rows, media_type)
+        assert client_wire.decode(_Response(body, media_type)) == rows
+        results[f"{name}.encode_ms"] = best_ms(lambda: encode(rows, media_type), repeats)
+        results[f"{name}.decode_ms"] = best_ms(lambda: client_wire.decode(_Response(body, media_type)), repeats)
+        results[f"{name}.bytes"] = len(body)
+        for encoding in wire.encodings():
+            compressed = wire.compress(body, encoding)
+            results[f"{name}+{encoding}.bytes"] = len(compressed)
+            results[f"{name}+{encoding}.compress_ms"] = best_ms(lambda: wire.compress(body, encoding), repeats)
+            results[f"{name}+{encoding}.decompress_ms"] = best_ms(lambda: decompress(compressed, encoding), repeats)
+    return results
+
+def print_report(results: dict, previous):
+    old = previous["results"] if previous else {}
+    baseline = results["json.bytes"]
+    print(f"{'case':40} {'value':>12}  vs previous")
+    for key, value in results.items():
+        delta = change(value, old[key]) if key in old else ""
+        size = f"  ({value / baseline:.0%} of JSON)" if key.endswith(".bytes") else ""
+        print(f"{key:40} {value:>12}  {delta}{size}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response wire formats.")
+    parser.add_argument("--matches", type=int, default=20000, help="records in the response")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per case (best is kept)")
+    parser.add_argument("--seed", type=int, default=7, help="random seed")
+    parser.add_argument("--no-save", action="store_true", help="do not store this run")
+    args = parser.parse_args()
+
+    results = run(args.matches, args.repeats, args.seed)
+    params = {"matches": args.matches, "repeats": args.repeats, "seed": args.seed}
+    print_report(results, load_previous("bench_wire", params))
+    if not args.no_save:
+        save_run("bench_wire", params, results)
+
+if __name__ == "__main__":
+    main()
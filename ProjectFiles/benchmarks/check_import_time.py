@@ -0,0 +1,65 @@
+"""
+Import-time budget for the API.
+
+Imports app.api in a fresh interpreter under `python -X importtime`.
+The MongoDB URL points at a port nothing listens on, so a regression
+that reconnects at import time shows up as a slow import rather than
+being hidden by a fast local database. The script prints the slowest
+modules and exits non-zero when the total is over budget.
+
+Nothing runs this automatically (the project has no CI): run it by
+hand after changing imports in app/, and before merging such changes.
+
+Usage (from ProjectFiles/):
+
+    python -m benchmarks.check_import_time --budget 1.5
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Nothing listens here; a connection attempt would block until timeout
+UNREACHABLE_MONGO_URL = "mongodb://127.0.0.1:9/"
+
+def measure_import(module: str):
+    """Returns (wall seconds, [(cumulative microseconds, module name)]) for one cold import."""
+    env = dict(os.environ, FOOD_RESCUE_MONGO_URL=UNREACHABLE_MONGO_URL)
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        sys.exit(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    # Lines look like "import time:   self [us] | cumulative | imported package"
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((int(cumulative), name.strip()))
+    return elapsed, modules
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if importing the API takes too long.")
+    parser.add_argument("--module", default="app.api", help="module to import")
+    parser.add_argument("--budget", type=float, default=1.5, help="seconds allowed for the whole import")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to show")
+    args = parser.parse_args()
+
+    elapsed, modules = measure_import(args.module)
+    # Cumulative times include sub-imports, so parents rank above their children
+    print(f"{'cumulative ms':>14}  module")
+    for cumulative, name in sorted(modules, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:>14.1f}  {name}")
+    print(f"\nimport {args.module}: {elapsed:.3f}s (budget {args.budget:.3f}s)")
+
+    if elapsed > args.budget:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+"""
+Load test for the Food Rescue API.
+
+Seeds a dedicated MongoDB database with synthetic data, drives a
+running API server with a mix of requests from several threads, and
+reports per-endpoint p50/p99 latency, throughput and MongoDB
+operations per request. Each run is appended to
+benchmarks/results/loadtest.jsonl and compared with the previous run
+that used the same parameters.
+
+Usage (from ProjectFiles/):
+
+    python -m benchmarks.loadtest --start-server --scale 2 --mix dashboard --duration 30
+
+--start-server runs the API itself (uvicorn) with BENCH_SERVER_ENV,
+restarted for each mix after the database is re-seeded, so its
+resident inventory (app/inventory.py) starts from the new dataset.
+To test a server you started yourself, start it with the same
+settings, e.g.
+
+    FOOD_RESCUE_DB=food_rescue_bench FOOD_RESCUE_MATCH_RATE_PER_MINUTE=100000 \
+        FOOD_RESCUE_MATCH_BURST=1000 ... uvicorn app.api:app
+
+The server must use the same database as --db (default
+food_rescue_bench), which is emptied and re-seeded on every run.
+A server you started yourself keeps the previous mix's donors in its
+inventory until its next full reload; restart it between mixes (the
+run stops if it finds them).
+
+Every worker thread comes from the same address, so with the API's
+normal rate limits (app/admission.py) nearly every matching request
+would be refused. BENCH_SERVER_ENV raises them. Refusals (429) are
+counted per endpoint apart from errors and are not part of the
+latency figures; if any happen, the report says so.
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import requests
+from bson import ObjectId
+from pymongo import MongoClient
+
+from benchmarks import synthetic
+from benchmarks.results import percentile, load_previous, save_run, change
+
+DEFAULT_DB = "food_rescue_bench"
+
+# Server settings for a load test: one client address must not be
+# rate limited, and matching must not be capped below --concurrency
+BENCH_SERVER_ENV = {
+    "FOOD_RESCUE_MATCH_RATE_PER_MINUTE": "100000",
+    "FOOD_RESCUE_MATCH_BURST": "1000",
+    "FOOD_RESCUE_MATCH_CONCURRENCY": "64",
+    "FOOD_RESCUE_ROUTE_RATE_PER_MINUTE": "100000",
+    "FOOD_RESCUE_ROUTE_BURST": "1000",
+    "FOOD_RESCUE_ROUTE_CONCURRENCY": "64",
+}
+
+# --- Server ---
+
+def start_server(url: str, db_name: str) -> subprocess.Popen:
+    """Runs the API (uvicorn) on `url`'s port with BENCH_SERVER_ENV; waits until it answers."""
+    port = url.rsplit(":", 1)[-1].strip("/")
+    env = {**os.environ, **BENCH_SERVER_ENV, "FOOD_RESCUE_DB": db_name}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.api:app", "--port", port, "--log-level", "warning"],
+        env=env
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit("The API server exited during startup")
+        try:
+            requests.get(f"{url}/", timeout=1)
+            return server
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit(f"The API server did not answer at {url} within 30s")
+
+def stop_server(server: subprocess.Popen):
+    server.terminate()
+    try:
+        server.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+# --- Seeding ---
+
+def seed(db, scale: float, rng: random.Random) -> dict:
+    """Empties and refills the benchmark collections. Returns their sizes."""
+    now = datetime.now()
+    donors = synthetic.make_donors(rng, int(200 * scale), lots_per_donor=5, now=now)
+    recipients = synthetic.make_recipients(rng, int(40 * scale), now=now)
+
+    for doc in donors + recipients:
+        doc["_id"] = ObjectId()
+    # Pending pickups hold food on the donors' lots, so make them first
+    pickups = synthetic.make_pickups(rng, int(100 * scale), donors, recipients, now=now)
+
+    # Emptied rather than dropped, so the indexes connect() created survive
+    for name in ("donors", "recipients", "pickups"):
+        db[name].delete_many({})
+    if donors:
+        db.donors.insert_many(donors)
+    if recipients:
+        db.recipients.insert_many(recipients)
+    if pickups:
+        db.pickups.insert_many(pickups)
+
+    return {
+        "donors": len(donors),
+        "lots": sum(len(d["current_donations"]) for d in donors),
+        "recipients": len(recipients),
+        "pickups": len(pickups),
+    }
+
+def mongo_ops(db) -> int:
+    """Total operations the MongoDB server has executed so far."""
+    counters = db.command("serverStatus")["opcounters"]
+    return sum(counters.values())
+
+# --- Operations ---
+
+class Context:
+    """Ids the operations pick from, shared by all worker threads."""
+
+    def __init__(self, db, url: str):
+        self.donor_ids = [str(d["_id"]) for d in db.donors.find({}, {"_id": 1})]
+        self.recipient_ids = [str(r["_id"]) for r in db.recipients.find({}, {"_id": 1})]
+        self.pending_pickup_ids = [str(p["_id"]) for p in db.pickups.find({"status": "pending"}, {"_id": 1})]
+        # Held matches to build routes from, so creating a pickup is
+        # timed on its own rather than together with a matching run.
+        # Each hold can only be routed once (see take_matches).
+        response = requests.post(f"{url}/matches/run", timeout=60)
+        if response.status_code != 200:
+            raise SystemExit(f"POST /matches/run failed with {response.status_code}: {response.text}")
+        self.matches = response.json()
+        self.lock = threading.Lock()
+
+    def take_matches(self, rng, count: int) -> list:
+        """Removes up to `count` random held matches, so no two routes share a hold."""
+        with self.lock:
+            chosen = rng.sample(range(len(self.matches)), min(len(self.matches), count))
+            taken = [self.matches[i] for i in chosen]
+            for i in sorted(chosen, reverse=True):
+                del self.matches[i]
+            return taken
+
+    def take_pending_pickup(self):
+        with self.lock:
+            return self.pending_pickup_ids.pop() if self.pending_pickup_ids else None
+
+    def add_pending_pickup(self, pickup_id: str):
+        with self.lock:
+            self.pending_pickup_ids.append(pickup_id)
+
+# Each operation sends one request and returns (endpoint label, response)
+
+def op_root(s, url, ctx, rng):
+    return "GET /", s.get(f"{url}/")
+
+def op_list_donors(s, url, ctx, rng):
+    return "GET /donors", s.get(f"{url}/donors")
+
+def op_get_donor(s, url, ctx, rng):
+    return "GET /donors/{id}", s.get(f"{url}/donors/{rng.choice(ctx.donor_ids)}")
+
+def op_register_donor(s, url, ctx, rng):
+    donor = synthetic.make_donors(rng, 1, lots_per_donor=0)[0]
+    donor.pop("updated_at")
+    response = s.post(f"{url}/donors", json=donor)
+    if response.status_code == 200:
+        with ctx.lock:
+            ctx.donor_ids.append(response.json()["_id"])
+    return "POST /donors", response
+
+def op_add_food(s, url, ctx, rng):
+    lot = synthetic.make_lot(rng, datetime.now())
+    lot["expiry_date"] = lot["expiry_date"].isoformat()
+    return "POST /donors/{id}/food", s.post(f"{url}/donors/{rng.choice(ctx.donor_ids)}/food", json=lot)
+
+def op_list_recipients(s, url, ctx, rng):
+    return "GET /recipients", s.get(f"{url}/recipients")
+
+def op_get_recipient(s, url, ctx, rng):
+    return "GET /recipients/{id}", s.get(f"{url}/recipients/{rng.choice(ctx.recipient_ids)}")
+
+def op_register_recipient(s, url, ctx, rng):
+    recipient = synthetic.make_recipients(rng, 1)[0]
+    recipient.pop("updated_at")
+    response = s.post(f"{url}/recipients", json=recipient)
+    if response.status_code == 200:
+        with ctx.lock:
+            ctx.recipient_ids.append(response.json()["_id"])
+    return "POST /recipients", response
+
+def op_available_food(s, url, ctx, rng):
+    return "GET /food/available", s.get(f"{url}/food/available")
+
+def op_run_matching(s, url, ctx, rng):
+    # A preview: holding food would empty the pool for every later run
+    return "POST /matches/run", s.post(f"{url}/matches/run", params={"reserve": "false"})
+
+def op_list_pickups(s, url, ctx, rng):
+    return "GET /pickups", s.get(f"{url}/pickups", params={"status": "pending"})
+
+def op_create_pickup(s, url, ctx, rng):
+    # Routes are built from a handful of the matcher's own held proposals
+    chosen = ctx.take_matches(rng, rng.randint(1, 4))
+    if not chosen:
+        return "POST /pickups", s.post(f"{url}/pickups", json=[])
+    response = s.post(f"{url}/pickups", json=chosen)
+    if response.status_code == 200:
+        ctx.add_pending_pickup(response.json()["_id"])
+    return "POST /pickups", response
+
+def op_complete_pickup(s, url, ctx, rng):
+    pickup_id = ctx.take_pending_pickup()
+    if pickup_id is None:
+        return op_create_pickup(s, url, ctx, rng)
+    return "PUT /pickups/{id}/complete", s.put(f"{url}/pickups/{pickup_id}/complete")
+
+# Weighted operation mixes. "all" touches every endpoint.
+MIXES = {
+    # Desktop clients opening the dashboard and browsing lists
+    "dashboard": [
+        (op_list_donors, 30), (op_list_recipients, 30), (op_run_matching, 20),
+        (op_list_pickups, 10), (op_get_donor, 5), (op_get_recipient, 5),
+    ],
+    # Donors reporting food in bursts
+    "ingest": [
+        (op_add_food, 80), (op_register_donor, 10), (op_register_recipient, 5), (op_get_donor, 5),
+    ],
+    # Dispatchers planning routes
+    "matching": [
+        (op_run_matching, 60), (op_available_food, 30), (op_create_pickup, 10),
+    ],
+    # Drivers closing out routes
+    "pickups": [
+        (op_complete_pickup, 50), (op_list_pickups, 40), (op_create_pickup, 10),
+    ],
+    "all": [
+        (op_root, 2), (op_list_donors, 10), (op_get_donor, 8), (op_register_donor, 3),
+        (op_add_food, 15), (op_list_recipients, 10), (op_get_recipient, 8),
+        (op_register_recipient, 3), (op_available_food, 10), (op_run_matching, 10),
+        (op_list_pickups, 10), (op_create_pickup, 5), (op_complete_pickup, 6),
+    ],
+}
+
+# --- Runner ---
+
+def run_mix(url: str, mix: str, ctx: Context, concurrency: int, duration: float, seed_value: int) -> dict:
+    """Runs one mix for `duration` seconds. Returns raw samples per endpoint."""
+    operations, weights = zip(*MIXES[mix])
+    samples = defaultdict(list)  # endpoint -> [latency seconds]
+    errors = defaultdict(int)    # endpoint -> count
+    rejected = defaultdict(int)  # endpoint -> 429s (not in samples)
+    samples_lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_id: int):
+        rng = random.Random(seed_value * 1000 + worker_id)
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            start = time.perf_counter()
+            status = None
+            try:
+                endpoint, response = operation(session, url, ctx, rng)
+                status = response.status_code
+            except requests.exceptions.RequestException:
+                endpoint = operation.__name__
+            elapsed = time.perf_counter() - start
+            with samples_lock:
+                if status == 429:
+                    rejected[endpoint] += 1 # Refused before doing the work: not a latency sample
+                    continue
+                samples[endpoint].append(elapsed)
+                if status is None or status >= 500:
+                    errors[endpoint] += 1
+        session.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {"samples": samples, "errors": errors, "rejected": rejected, "elapsed": time.perf_counter() - started}
+
+def summarize(raw: dict, ops: int) -> dict:
+    """Turns raw samples into the stored p50/p99/throughput summary."""
+    endpoints = {}
+    total = 0
+    for endpoint in sorted(set(raw["samples"]) | set(raw["rejected"])):
+        latencies = sorted(raw["samples"].get(endpoint, []))
+        total += len(latencies)
+        endpoints[endpoint] = {
+            "requests": len(latencies),
+            "errors": raw["errors"].get(endpoint, 0),
+            "rejected": raw["rejected"].get(endpoint, 0),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        }
+    return {
+        "requests": total,
+        "rejected": sum(raw["rejected"].values()),
+        "throughput_rps": round(total / raw["elapsed"], 1) if raw["elapsed"] else 0,
+        "mongo_ops_per_request": round(ops / total, 2) if total else 0,
+        "endpoints": endpoints,
+    }
+
+def print_report(mix: str, summary: dict, previous):
+    old = previous["results"] if previous else None
+    print(f"\n=== mix: {mix} ===")
+    line = f"{summary['requests']} requests, {summary['throughput_rps']} req/s, " \
+           f"{summary['mongo_ops_per_request']} mongo ops/request"
+    if old:
+        line += f"  (throughput {change(summary['throughput_rps'], old['throughput_rps'])} vs {previous['commit'] or 'previous'})"
+    print(line)
+    print(f"{'endpoint':32} {'reqs':>7} {'errs':>5} {'429s':>5} {'p50 ms':>9} {'p99 ms':>9}  vs previous")
+    for endpoint, stats in summary["endpoints"].items():
+        delta = ""
+        before = old["endpoints"].get(endpoint) if old else None
+        if before and stats["p50_ms"] is not None and before.get("p50_ms") is not None:
+            delta = f"p50 {change(stats['p50_ms'], before['p50_ms'])}, p99 {change(stats['p99_ms'], before['p99_ms'])}"
+        print(f"{endpoint:32} {stats['requests']:>7} {stats['errors']:>5} {stats.get('rejected', 0):>5} "
+              f"{str(stats['p50_ms']):>9} {str(stats['p99_ms']):>9}  {delta}")
+    if summary["rejected"]:
+        print(f"Warning: {summary['rejected']} requests were refused with 429. Start the server "
+              f"with BENCH_SERVER_ENV (or use --start-server) so rate limits do not skew the run.")
+
+def run_one(args, db, mix: str):
+    """Seeds the database, runs one mix and reports (and stores) it."""
+    # Every mix starts from the same dataset so runs are comparable
+    sizes = seed(db, args.scale, random.Random(args.seed))
+    server = start_server(args.url, args.db) if args.start_server else None
+    try:
+        run_seeded(args, db, mix, sizes)
+    finally:
+        if server:
+            stop_server(server)
+
+def run_seeded(args, db, mix: str, sizes: dict):
+    known = {str(d["_id"]) for d in db.donors.find({}, {"_id": 1})}
+
+    # Make sure the server is really reading the database we seeded...
+    first = requests.get(f"{args.url}/donors", params={"limit": 1}, timeout=10).json()
+    if not first or first[0]["_id"] not in known:
+        raise SystemExit(f"The API at {args.url} is not using database '{args.db}'. "
+                         f"Start it with FOOD_RESCUE_DB={args.db}.")
+    # ...and that its inventory holds no donors from before the re-seed
+    food = requests.get(f"{args.url}/food/available", timeout=30).json()
+    if any(f["donor_id"] not in known for f in food):
+        raise SystemExit(f"The API at {args.url} still serves food from donors deleted by the "
+                         f"re-seed. Restart it between mixes, or use --start-server.")
+
+    ctx = Context(db, args.url)
+    print(f"Seeded {sizes}; running '{mix}' for {args.duration}s with {args.concurrency} threads...")
+    ops_before = mongo_ops(db)
+    raw = run_mix(args.url, mix, ctx, args.concurrency, args.duration, args.seed)
+    summary = summarize(raw, mongo_ops(db) - ops_before)
+
+    params = {"mix": mix, "scale": args.scale, "concurrency": args.concurrency,
+              "duration": args.duration, "seed": args.seed}
+    previous = load_previous("loadtest", params)
+    print_report(mix, summary, previous)
+    if not args.no_save:
+        save_run("loadtest", params, {"dataset": sizes, **summary})
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Food Rescue API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="API base URL")
+    parser.add_argument("--start-server", action="store_true",
+                        help="run the API on --url's port with BENCH_SERVER_ENV, one per mix (recommended)")
+    parser.add_argument("--mongo", default="mongodb://localhost:27017/", help="MongoDB URL the API uses")
+    parser.add_argument("--db", default=DEFAULT_DB, help="database to seed (emptied first!)")
+    parser.add_argument("--scale", type=float, default=1.0, help="dataset size multiplier (1 = 200 donors)")
+    parser.add_argument("--mix", choices=sorted(MIXES) + ["every"], default="every", help="request mix to run")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per mix")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument("--no-save", action="store_true", help="do not store this run")
+    args = parser.parse_args()
+
+    if args.db == "food_rescue_db":
+        parser.error("refusing to empty the main database; start the API with FOOD_RESCUE_DB set instead")
+
+    db = MongoClient(args.mongo)[args.db]
+    mixes = sorted(MIXES) if args.mix == "every" else [args.mix]
+    for mix in mixes:
+        run_one(args, db, mix)
+
+
+if __name__ == "__main__":
+    main()
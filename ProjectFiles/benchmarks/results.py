@@ -0,0 +1,59 @@
+"""
+Stores benchmark runs as JSON lines so each run can be compared
+with the previous run of the same benchmark and parameters.
+"""
+import json
+import os
+import subprocess
+from datetime import datetime
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+def git_commit() -> str:
+    """The current commit hash, or "" outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def load_previous(benchmark: str, params: dict):
+    """The most recent stored run of `benchmark` with the same params, or None."""
+    path = os.path.join(RESULTS_DIR, f"{benchmark}.jsonl")
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path) as f:
+        for line in f:
+            run = json.loads(line)
+            if run.get("params") == params:
+                previous = run
+    return previous
+
+def save_run(benchmark: str, params: dict, results: dict) -> dict:
+    """Appends a run to results/<benchmark>.jsonl and returns it."""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    run = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "params": params,
+        "results": results,
+    }
+    with open(os.path.join(RESULTS_DIR, f"{benchmark}.jsonl"), "a") as f:
+        f.write(json.dumps(run) + "\n")
+    return run
+
+def change(new: float, old: float) -> str:
+    """Formats the relative change from `old` to `new`, e.g. "+12.5%"."""
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
@@ -0,0 +1,155 @@
+"""
+Synthetic donors, lots, recipients and pickups for the benchmarks.
+
+Everything is generated from a seeded random.Random, so the same
+arguments always produce the same dataset.
+"""
+import math
+import random
+from datetime import datetime, timedelta
+
+FOODS = [
+    ("Rice", "kg"), ("Bread", "units"), ("Apples", "kg"), ("Milk", "liters"),
+    ("Canned Beans", "units"), ("Pasta", "kg"), ("Bananas", "kg"),
+    ("Eggs", "units"), ("Chicken", "kg"), ("Vegetable Soup", "liters"),
+]
+STREETS = ["Rizal Ave", "Taft Ave", "Roxas Blvd", "Espana Blvd", "Aurora Blvd", "Ayala Ave"]
+
+def _address(rng: random.Random) -> str:
+    return f"{rng.randint(1, 2500)} {rng.choice(STREETS)}"
+
+def _phone(rng: random.Random) -> str:
+    return f"09{rng.randint(100000000, 999999999)}"
+
+# --- Lots ---
+
+def make_lot(rng: random.Random, now: datetime, size: str = "normal", expiry: str = "normal") -> dict:
+    """
+    One donated food item.
+    size:   "normal", "tiny" (0.1-2) or "huge" (500-5000)
+    expiry: "normal" (1-7 days out) or "mixed" (some already expired,
+            some expiring today, some weeks out)
+    """
+    name, unit = rng.choice(FOODS)
+    if size == "tiny":
+        quantity = round(rng.uniform(0.1, 2), 2)
+    elif size == "huge":
+        quantity = round(rng.uniform(500, 5000), 1)
+    else:
+        quantity = round(rng.uniform(2, 80), 1)
+
+    if expiry == "mixed":
+        days = rng.choice([-3, -1, 0, 0, 1, 2, 5, 14, 30])
+    else:
+        days = rng.randint(1, 7)
+    # Whole milliseconds, so values round-trip through MongoDB unchanged
+    expiry_date = (now + timedelta(days=days, hours=rng.randint(0, 23))).replace(microsecond=0)
+
+    return {"name": name, "quantity": quantity, "unit": unit, "expiry_date": expiry_date}
+
+def _stored_lot(lot: dict, lot_id: str) -> dict:
+    """A lot as the DB layer stores it (see data.add_food_to_donor)."""
+    return {**lot, "lot_id": lot_id, "version": 0, "holds": []}
+
+# --- Donors & Recipients ---
+
+def make_donors(rng: random.Random, count: int, lots_per_donor: int, now: datetime = None,
+                size: str = "normal", expiry: str = "normal") -> list:
+    """
+    Donor documents (without '_id'), each with about `lots_per_donor`
+    lots in their stored shape (lot_id, version, holds).
+    """
+    now = now or datetime.now()
+    donors = []
+    for i in range(count):
+        lots = max(0, int(rng.gauss(lots_per_donor, lots_per_donor / 3)))
+        donors.append({
+            "name": f"Donor {i:05d}",
+            "address": _address(rng),
+            "phone": _phone(rng),
+            # lot_ids are 24 hex digits like the server's, unique within the dataset
+            "current_donations": [
+                _stored_lot(make_lot(rng, now, size, expiry), f"{i:012x}{j:012x}") for j in range(lots)
+            ],
+            "updated_at": now,
+        })
+    return donors
+
+def make_recipients(rng: random.Random, count: int, need: str = "normal", now: datetime = None) -> list:
+    """
+    Recipient documents (without '_id').
+    need: "normal" (10-100 each) or "skewed" (a few recipients need
+          most of the food, like a Pareto distribution)
+    """
+    now = now or datetime.now()
+    recipients = []
+    for i in range(count):
+        if need == "skewed":
+            daily_need = round(min(5 * rng.paretovariate(1.2), 5000), 1)
+        else:
+            daily_need = round(rng.uniform(10, 100), 1)
+        recipients.append({
+            "name": f"Shelter {i:05d}",
+            "address": _address(rng),
+            "phone": _phone(rng),
+            "daily_need": daily_need,
+            "updated_at": now,
+        })
+    return recipients
+
+# --- Pickups ---
+
+def make_pickups(rng: random.Random, count: int, donors: list, recipients: list,
+                 complete_ratio: float = 0.5, now: datetime = None) -> list:
+    """
+    Pickup documents (without '_id') built from random donor lots.
+    `donors` and `recipients` must already carry their '_id'.
+
+    Pending pickups hold their food the way dispatch.create_route does:
+    each match has a hold_id, and its lot gets a hold that never lapses
+    (so insert the donors after calling this).
+    """
+    now = now or datetime.now()
+    donors_with_food = [d for d in donors if d["current_donations"]]
+    pickups = []
+    for p in range(count):
+        if not donors_with_food or not recipients:
+            break
+        pending = rng.random() >= complete_ratio
+        matches, stops = [], []
+        for m in range(rng.randint(1, 4)):
+            donor = rng.choice(donors_with_food)
+            recipient = rng.choice(recipients)
+            lot = rng.choice(donor["current_donations"])
+            free = lot["quantity"] - sum(h["quantity"] for h in lot["holds"]) if pending else lot["quantity"]
+            quantity = math.floor(min(free, rng.uniform(1, 20)) * 10) / 10 # Never more than is free
+            if quantity <= 0:
+                continue
+            match = {
+                "recipient_id": recipient["_id"],
+                "recipient_name": recipient["name"],
+                "donor_id": donor["_id"],
+                "donor_name": donor["name"],
+                "food_name": lot["name"],
+                "quantity_matched": quantity,
+                "unit": lot["unit"],
+                "expiry_date": lot["expiry_date"],
+                "lot_id": lot["lot_id"],
+            }
+            if pending:
+                match["hold_id"] = f"seed-{p}-{m}"
+                lot["holds"].append({"hold_id": match["hold_id"], "quantity": quantity, "expires_at": None})
+            matches.append(match)
+            stops.append({"stop_type": "pickup", "name": donor["name"], "address": donor["address"]})
+            stops.append({"stop_type": "dropoff", "name": recipient["name"], "address": recipient["address"]})
+        if not matches:
+            continue
+        created_at = now - timedelta(days=rng.randint(0, 60), minutes=rng.randint(0, 1440))
+        pickups.append({
+            "created_at": created_at.replace(microsecond=0),
+            "status": "pending" if pending else "complete",
+            "matches": matches,
+            "stops": stops,
+            "updated_at": now,
+        })
+    return pickups
@@ -0,0 +1,121 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from wire import ACCEPT
+
+API_URL = "http://127.0.0.1:8000"
+
+# (connect timeout, read timeout) in seconds.
+# A slow or dead API should produce an error message, not a frozen app.
+DEFAULT_TIMEOUT = (3.05, 20)
+
+class ApiClient:
+    """
+    Runs API calls on background worker threads so the Flet UI
+    event thread never blocks on the network.
+
+    All calls share one requests.Session, so connections to the API
+    are pooled and kept alive between requests.
+
+    Every call belongs to a "channel" (e.g. "donors", "matches").
+    Starting a new call on a channel supersedes the previous one:
+    the old call may still finish in the background, but its
+    callbacks are dropped so a stale response never overwrites
+    a newer one in the UI.
+    """
+
+    def __init__(self, base_url: str = API_URL, max_workers: int = 4, timeout=DEFAULT_TIMEOUT):
+        self.base_url = base_url
+        self.timeout = timeout
+
+        # Enough pooled connections for every worker plus its fan-out calls
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers * 2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # List endpoints answer in a compact format (decode with wire.decode)
+        self.session.headers["Accept"] = ACCEPT
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="api")
+        # Separate pool for parallel() so a worker waiting on its own
+        # fan-out calls can never starve the pool it is running on.
+        self._fanout = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="api-fanout")
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    # --- Blocking helpers (only call these from inside a worker) ---
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Sends one request on the shared session, always with a timeout."""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, f"{self.base_url}{path}", **kwargs)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path: str, **kwargs) -> requests.Response:
+        return self.request("PUT", path, **kwargs)
+
+    def parallel(self, *works) -> list:
+        """
+        Runs several `work(client)` calls at the same time over the shared
+        session and returns their results in order. Raises the first error.
+        """
+        futures = [self._fanout.submit(work, self) for work in works]
+        return [future.result() for future in futures]
+
+    # --- Background execution ---
+
+    def submit(self, channel: str, work, on_success, on_error, on_done=None):
+        """
+        Runs `work(client)` on a worker thread.
+
+        When it finishes, `on_success(result)` or `on_error(exception)`
+        is called, followed by `on_done()`, but only if no newer call
+        was started on the same channel in the meantime.
+        """
+        generation = self._next_generation(channel)
+
+        def run():
+            try:
+                result = work(self)
+                error = None
+            except Exception as ex:
+                result = None
+                error = ex
+
+            if not self.is_current(channel, generation):
+                return # Superseded by a newer call, drop the result
+
+            if error is not None:
+                on_error(error)
+            else:
+                on_success(result)
+            if on_done:
+                on_done()
+
+        return self.executor.submit(run)
+
+    def cancel(self, channel: str):
+        """Drops the result of whatever call is in flight on this channel."""
+        self._next_generation(channel)
+
+    def is_current(self, channel: str, generation: int) -> bool:
+        with self._lock:
+            return self._generations.get(channel) == generation
+
+    def close(self):
+        """Stops the workers and closes pooled connections."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self._fanout.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+    def _next_generation(self, channel: str) -> int:
+        with self._lock:
+            generation = self._generations.get(channel, 0) + 1
+            self._generations[channel] = generation
+            return generation
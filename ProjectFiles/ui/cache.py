@@ -0,0 +1,196 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+import requests
+from wire import decode
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".food_rescue_cache.db")
+
+# Collections mirrored locally, and the API path each one syncs from
+SYNCED_COLLECTIONS = {
+    "donors": "/donors",
+    "recipients": "/recipients",
+    "pickups": "/pickups",
+}
+
+class LocalCache:
+    """
+    A local SQLite copy of the donors, recipients and pickups collections.
+
+    The desktop UI reads from here (instant, and still works while the
+    API is unreachable). Each collection remembers the newest
+    'updated_at' it has seen, so syncing only downloads what changed.
+
+    Writes that could not reach the API are kept in an outbox and
+    replayed in order once it is reachable again.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # Held while replaying the outbox so two workers never send the same write
+        self.replay_lock = threading.Lock()
+        # Used from the API client's worker threads; the lock serializes access
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS records (
+                collection TEXT NOT NULL,
+                id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                updated_at TEXT,
+                PRIMARY KEY (collection, id)
+            );
+            CREATE TABLE IF NOT EXISTS sync_state (
+                collection TEXT PRIMARY KEY,
+                watermark TEXT
+            );
+            CREATE TABLE IF NOT EXISTS outbox (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                method TEXT NOT NULL,
+                path TEXT NOT NULL,
+                body TEXT,
+                headers TEXT,
+                created_at TEXT NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    # --- Reads ---
+
+    def read(self, collection: str, skip: int = 0, limit: int = 0, status: str = None) -> list:
+        """Returns cached records, oldest first (same order as the API)."""
+        query = "SELECT data FROM records WHERE collection = ?"
+        args = [collection]
+        if status:
+            query += " AND json_extract(data, '$.status') = ?"
+            args.append(status)
+        # ObjectIds are hex strings that start with a timestamp,
+        # so sorting by id is sorting by creation time.
+        query += " ORDER BY id LIMIT ? OFFSET ?"
+        args += [limit if limit else -1, skip]
+        with self._lock:
+            rows = self._conn.execute(query, args).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def watermark(self, collection: str):
+        """The newest 'updated_at' seen for this collection, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT watermark FROM sync_state WHERE collection = ?", (collection,)
+            ).fetchone()
+        return row[0] if row else None
+
+    # --- Writes (from the API) ---
+
+    def upsert_many(self, collection: str, records: list, advance_watermark: bool = True):
+        """
+        Stores records from the API and advances the collection's watermark.
+
+        Records pushed by the change feed should not advance it
+        (advance_watermark=False): an event that was missed before
+        them would otherwise be skipped by the next delta sync.
+        """
+        if not records:
+            return
+        rows = [(collection, r["_id"], json.dumps(r), r.get("updated_at")) for r in records]
+        # Use the server's own timestamps for the watermark so the
+        # client's clock never matters.
+        newest = max((r.get("updated_at") or "" for r in records), default="")
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records (collection, id, data, updated_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            if newest and advance_watermark:
+                self._conn.execute(
+                    """INSERT INTO sync_state (collection, watermark) VALUES (?, ?)
+                       ON CONFLICT(collection) DO UPDATE SET watermark = MAX(watermark, excluded.watermark)""",
+                    (collection, newest)
+                )
+            self._conn.commit()
+
+    # --- Outbox (writes made while offline) ---
+
+    def enqueue(self, method: str, path: str, body=None, headers: dict = None):
+        """Queues a write to send to the API later."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outbox (method, path, body, headers, created_at) VALUES (?, ?, ?, ?, ?)",
+                (method, path, json.dumps(body), json.dumps(headers or {}), datetime.now().isoformat())
+            )
+            self._conn.commit()
+
+    def pending_writes(self) -> list:
+        """Returns queued writes, oldest first, as (seq, method, path, body, headers)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, method, path, body, headers FROM outbox ORDER BY seq"
+            ).fetchall()
+        return [(seq, method, path, json.loads(body), json.loads(headers)) for seq, method, path, body, headers in rows]
+
+    def drop_write(self, seq: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM outbox WHERE seq = ?", (seq,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# --- Sync helpers (run these inside an ApiClient worker) ---
+
+def is_offline_error(ex: Exception) -> bool:
+    """True for errors that mean "the API is unreachable", not "the request was bad"."""
+    return isinstance(ex, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+def was_not_sent(ex: Exception) -> bool:
+    """
+    True if a write certainly never reached the API, so it is safe to
+    queue it for replay. (A read timeout is not: the server may have
+    already applied the write.)
+    """
+    return isinstance(ex, requests.exceptions.ConnectionError)
+
+def replay_outbox(client, cache: LocalCache) -> int:
+    """
+    Sends queued writes in order. Stops at the first one that still
+    cannot reach the API. Returns how many were sent.
+    """
+    sent = 0
+    with cache.replay_lock:
+        for seq, method, path, body, headers in cache.pending_writes():
+            try:
+                response = client.request(method, path, json=body, headers=headers)
+            except Exception as ex:
+                if is_offline_error(ex):
+                    break # Still offline, try again next sync
+                raise
+            # A 4xx will never succeed on retry, so it is dropped too;
+            # except 429 (the server was busy), which is retried next sync
+            if response.status_code < 500 and response.status_code != 429:
+                cache.drop_write(seq)
+                sent += 1
+            else:
+                break
+    return sent
+
+def sync_collection(client, cache: LocalCache, collection: str) -> int:
+    """
+    Sends any queued writes, then downloads only the documents of
+    `collection` changed since the last sync and stores them.
+    Returns how many documents were downloaded.
+    """
+    replay_outbox(client, cache)
+
+    params = {}
+    watermark = cache.watermark(collection)
+    if watermark:
+        params["updated_since"] = watermark
+
+    response = client.get(SYNCED_COLLECTIONS[collection], params=params)
+    response.raise_for_status()
+    records = decode(response)
+    cache.upsert_many(collection, records)
+    return len(records)
@@ -2,12 +2,17 @@ import matplotlib
 matplotlib.use("svg") # Use the SVG backend for Flet
 import matplotlib.pyplot as plt
 from flet.matplotlib_chart import MatplotlibChart
-from collections import defaultdict
 import flet as ft
 import requests
-from datetime import datetime, timedelta
-
-API_URL = "http://127.0.0.1:8000"
+import json
+import uuid
+from datetime import date, datetime, timedelta
+from api_client import ApiClient, API_URL
+from lists import KeyedList, PagedList
+from cache import LocalCache, sync_collection, is_offline_error, was_not_sent
+from feed import ChangeFeed
+from wire import decode
+import threading
 
 def main(page: ft.Page):
     page.title = "Food Rescue Platform"
@@ -18,13 +23,16 @@ def main(page: ft.Page):
     donor_address = ft.TextField(label="Address", width=300)
     donor_phone = ft.TextField(label="Phone", width=300)
     donor_register_status = ft.Text(value="", color=ft.Colors.GREEN)
+    donor_busy = ft.ProgressRing(width=16, height=16, stroke_width=2, visible=False)
     donor_list = ft.ListView(expand=1, spacing=10)
+    donor_more = ft.TextButton("Load more donors", visible=False)
     
     selected_donor_id = ft.Text("No donor selected")
     food_name = ft.TextField(label="Food Item Name", width=250)
     food_qty = ft.TextField(label="Quantity", width=100)
     food_unit = ft.TextField(label="Unit (e.g., kg)", width=100)
     add_food_status = ft.Text(value="", color=ft.Colors.GREEN)
+    add_food_busy = ft.ProgressRing(width=16, height=16, stroke_width=2, visible=False)
     
     # --- Recipient Tab Controls ---
     recipient_name = ft.TextField(label="Recipient Name", width=300)
@@ -32,84 +40,225 @@ def main(page: ft.Page):
     recipient_phone = ft.TextField(label="Phone", width=300)
     recipient_need = ft.TextField(label="Daily Need (e.g., kg)", width=300)
     recipient_register_status = ft.Text(value="", color=ft.Colors.GREEN)
+    recipient_busy = ft.ProgressRing(width=16, height=16, stroke_width=2, visible=False)
     recipient_list = ft.ListView(expand=1, spacing=10)
+    recipient_more = ft.TextButton("Load more recipients", visible=False)
 
     # --- Matching Tab Controls ---
     match_run_status = ft.Text(value="", color=ft.Colors.BLUE)
+    match_busy = ft.ProgressBar(visible=False)
     match_list = ft.ListView(expand=1, spacing=10)
 
     # --- Logistics Tab Controls (NEW) ---
     logistics_matches_list = ft.ListView(expand=1, spacing=10)
     logistics_pending_list = ft.ListView(expand=1, spacing=10)
+    pending_more = ft.TextButton("Load more pickups", visible=False)
+    pending_status = ft.Text(value="", color=ft.Colors.BLUE)
     logistics_status = ft.Text(value="", color=ft.Colors.BLUE)
+    logistics_busy = ft.ProgressRing(width=16, height=16, stroke_width=2, visible=False)
+    pending_busy = ft.ProgressRing(width=16, height=16, stroke_width=2, visible=False)
 
     # --- Dashboard Tab Controls ---
     donor_chart = MatplotlibChart(expand=True)
     recipient_chart = MatplotlibChart(expand=True)
     match_chart = MatplotlibChart(expand=True)
     dashboard_status = ft.Text(value="Click 'Refresh' to load dashboard.", color=ft.Colors.BLUE)
+    dashboard_busy = ft.ProgressBar(visible=False)
     
     # This will hold the raw JSON data of the matches
     page.client_storage.set("current_matches", []) 
 
+    # The dashboard is only loaded the first time its tab is opened.
+    DASHBOARD_TAB_INDEX = 4
+    DASHBOARD_DEBOUNCE_SECONDS = 5
+    DASHBOARD_DAYS = 30 # Days of completed deliveries on the charts
+    dashboard_state = {"loaded": False, "tab": 0, "timer": None}
+
+    # --- Background API Calls ---
+
+    # Every handler below hands its HTTP work to the client's worker
+    # threads, so a slow backend never freezes the window.
+    client = ApiClient(API_URL)
+
+    def run_in_background(channel, work, on_success, on_error, busy=None, updates=None):
+        """
+        Runs `work(client)` off the UI thread and shows `busy`
+        (a progress indicator) until the newest call on `channel` finishes.
+
+        If `updates` lists the controls the callbacks touch, only those
+        are re-sent to the client instead of diffing the whole page.
+        """
+        if busy:
+            busy.visible = True
+            if updates:
+                busy.update()
+            else:
+                page.update()
+
+        def on_done():
+            if busy:
+                busy.visible = False
+            if updates:
+                page.update(*([busy] if busy else []), *updates)
+            else:
+                page.update()
+
+        client.submit(channel, work, on_success, on_error, on_done)
+
+    # --- Local Cache ---
+
+    # Lists are read from a local SQLite copy (instant, works offline)
+    # and kept current by downloading only what changed on the server.
+    cache = LocalCache()
+
+    def queue_if_not_sent(ex, method, path, body, status_text, headers=None) -> bool:
+        """
+        If a write never reached the API, queues it to be sent on the
+        next sync and tells the user. Returns True if it was queued.
+        """
+        if not was_not_sent(ex):
+            return False
+        cache.enqueue(method, path, body, headers)
+        status_text.value = "API unreachable: saved offline, it will be sent on the next sync."
+        status_text.color = ft.Colors.ORANGE
+        return True
+
+    # --- Idempotency Keys ---
+
+    # Writes carry an Idempotency-Key header. Sending the same form
+    # again (a double click) reuses its key, so the API runs the write
+    # once and answers the repeat with the first result. Queued
+    # offline writes keep their key when they are replayed.
+    write_keys = {} # action -> (body as JSON, key)
+
+    def write_headers(action, body) -> dict:
+        body_json = json.dumps(body, sort_keys=True)
+        last = write_keys.get(action)
+        if last is None or last[0] != body_json:
+            last = write_keys[action] = (body_json, str(uuid.uuid4()))
+        return {"Idempotency-Key": last[1]}
+
+    def cached_list(collection, view, list_control, more_button, status_text, busy, label, status=None):
+        """
+        Wires a PagedList to the local cache and returns its
+        (refresh, reload) handlers.
+
+        Refreshing shows the cached rows straight away, then syncs the
+        collection's changes in the background and patches the rows.
+        Reloading only re-reads the cache (used after a change-feed event).
+        'Load more' only reads the next page from the cache.
+        """
+        updates = [list_control, more_button, status_text]
+
+        def read(params):
+            return cache.read(collection, status=status, **params)
+
+        def show_count(offline=False):
+            more_button.visible = view.has_more
+            if offline:
+                status_text.value = f"Offline: showing {len(view)} saved {label}."
+                status_text.color = ft.Colors.ORANGE
+            else:
+                status_text.value = f"Showing {len(view)} {label}."
+                status_text.color = ft.Colors.BLUE
+
+        def refresh(e):
+            params = view.refresh_params()
+            view.apply_refresh(read(params), params)
+            show_count()
+            page.update(*updates)
+
+            def work(c):
+                sync_collection(c, cache, collection)
+                return read(params)
+
+            def on_success(records):
+                view.apply_refresh(records, params)
+                show_count()
+
+            def on_error(ex):
+                if is_offline_error(ex):
+                    show_count(offline=True)
+                else:
+                    status_text.value = f"Error syncing {label}: {ex}"
+                    status_text.color = ft.Colors.RED
+
+            run_in_background(collection, work, on_success, on_error, busy=busy, updates=updates)
+
+        def reload():
+            params = view.refresh_params()
+            if view.apply_refresh(read(params), params):
+                show_count()
+                page.update(*updates)
+
+        def load_more(e):
+            view.apply_next_page(read(view.next_page_params()))
+            show_count()
+            page.update(*updates)
+
+        more_button.on_click = load_more
+        return refresh, reload
+
     # --- Event Handlers (Donors) ---
-    
+
     def register_donor_click(e):
-        try:
-            donor_data = {
-                "name": donor_name.value,
-                "address": donor_address.value,
-                "phone": donor_phone.value,
-                "current_donations": []
-            }
-            response = requests.post(f"{API_URL}/donors", json=donor_data)
-            
+        donor_data = {
+            "name": donor_name.value,
+            "address": donor_address.value,
+            "phone": donor_phone.value,
+            "current_donations": []
+        }
+        headers = write_headers("register_donor", donor_data)
+
+        def on_success(response):
             if response.status_code == 200:
-                donor_register_status.value = f"Success! Donor '{donor_name.value}' created."
+                donor_register_status.value = f"Success! Donor '{donor_data['name']}' created."
                 donor_register_status.color = ft.Colors.GREEN
                 donor_name.value, donor_address.value, donor_phone.value = "", "", ""
                 refresh_donor_list(e)
             else:
                 donor_register_status.value = f"Error: {response.json().get('detail')}"
                 donor_register_status.color = ft.Colors.RED
-        except Exception as ex:
-            donor_register_status.value = f"API connection error: {ex}"
-            donor_register_status.color = ft.Colors.RED
-        page.update()
 
-    def refresh_donor_list(e):
-        try:
-            response = requests.get(f"{API_URL}/donors")
-            if response.status_code == 200:
-                donors = response.json()
-                donor_list.controls.clear()
-                for donor in donors:
-                    donor_list.controls.append(
-                        ft.ListTile(
-                            title=ft.Text(donor['name']),
-                            subtitle=ft.Text(donor['address']),
-                            data=donor['_id'],
-                            on_click=select_donor_click
-                        )
-                    )
-                donor_register_status.value = f"Loaded {len(donors)} donors."
-                donor_register_status.color = ft.Colors.BLUE
-            else:
-                donor_register_status.value = "Error fetching donors."
-                donor_register_status.color = ft.Colors.RED
-        except Exception as ex:
+        def on_error(ex):
+            if queue_if_not_sent(ex, "POST", "/donors", donor_data, donor_register_status, headers):
+                donor_name.value, donor_address.value, donor_phone.value = "", "", ""
+                return
             donor_register_status.value = f"API connection error: {ex}"
             donor_register_status.color = ft.Colors.RED
-        
-        if e:
-            page.update()
-        
+
+        run_in_background(
+            "register_donor",
+            lambda c: c.post("/donors", json=donor_data, headers=headers),
+            on_success, on_error, busy=donor_busy
+        )
+
+    def build_donor_row(donor):
+        return ft.ListTile(
+            title=ft.Text(donor['name']),
+            subtitle=ft.Text(donor['address']),
+            data=donor['_id'],
+            on_click=select_donor_click
+        )
+
+    donors_view = PagedList(donor_list, build_donor_row, empty_text="No donors yet.")
+
+    # Re-reads the pages already shown and only patches the rows that changed
+    refresh_donor_list, reload_donor_list = cached_list(
+        "donors", donors_view, donor_list, donor_more,
+        donor_register_status, donor_busy, "donors"
+    )
+
     def select_donor_click(e):
         selected_donor_id.value = e.control.data
         add_food_status.value = f"Selected {e.control.title.value}"
         add_food_status.color = ft.Colors.BLUE
         page.update()
 
+    # The expiry given to the lot being added, kept while the form is
+    # unchanged so a double click sends the same body (and idempotency key)
+    pending_food = {} # (donor_id, name, quantity, unit) -> expiry
+
     def add_food_click(e):
         donor_id = selected_donor_id.value
         if donor_id == "No donor selected":
@@ -119,186 +268,210 @@ def main(page: ft.Page):
             return
         try:
             # TODO: Add a DatePicker for expiry
-            expiry = (datetime.now() + timedelta(days=5)).isoformat()
-            
+            form = (donor_id, food_name.value, food_qty.value, food_unit.value)
+            expiry = pending_food.get(form) or (datetime.now() + timedelta(days=5)).isoformat()
+            pending_food.clear()
+            pending_food[form] = expiry
+
             food_data = {
                 "name": food_name.value,
                 "quantity": float(food_qty.value),
                 "unit": food_unit.value,
                 "expiry_date": expiry
             }
-            
-            response = requests.post(f"{API_URL}/donors/{donor_id}/food", json=food_data)
-            
+        except Exception as ex:
+            add_food_status.value = f"Error: {ex}"
+            add_food_status.color = ft.Colors.RED
+            page.update()
+            return
+        headers = write_headers("add_food", [donor_id, food_data])
+
+        def on_success(response):
             if response.status_code == 200:
-                add_food_status.value = f"Added '{food_name.value}'!"
+                add_food_status.value = f"Added '{food_data['name']}'!"
                 add_food_status.color = ft.Colors.GREEN
+                pending_food.clear()
                 food_name.value, food_qty.value, food_unit.value = "", "", ""
             else:
                 add_food_status.value = f"Error: {response.json().get('detail')}"
                 add_food_status.color = ft.Colors.RED
-                
-        except Exception as ex:
+
+        def on_error(ex):
+            if queue_if_not_sent(ex, "POST", f"/donors/{donor_id}/food", food_data, add_food_status, headers):
+                food_name.value, food_qty.value, food_unit.value = "", "", ""
+                return
             add_food_status.value = f"Error: {ex}"
             add_food_status.color = ft.Colors.RED
-            
-        page.update()
+
+        run_in_background(
+            "add_food",
+            lambda c: c.post(f"/donors/{donor_id}/food", json=food_data, headers=headers),
+            on_success, on_error, busy=add_food_busy
+        )
 
     # --- Event Handlers (Recipients) ---
 
     def register_recipient_click(e):
         try:
-            try:
-                daily_need_float = float(recipient_need.value)
-            except ValueError:
-                recipient_register_status.value = "Error: 'Daily Need' must be a number (e.g., 50)."
-                recipient_register_status.color = ft.Colors.RED
-                page.update()
-                return 
+            daily_need_float = float(recipient_need.value)
+        except ValueError:
+            recipient_register_status.value = "Error: 'Daily Need' must be a number (e.g., 50)."
+            recipient_register_status.color = ft.Colors.RED
+            page.update()
+            return
 
-            recipient_data = {
-                "name": recipient_name.value,
-                "address": recipient_address.value,
-                "phone": recipient_phone.value,
-                "daily_need": daily_need_float
-            }
-            
-            response = requests.post(f"{API_URL}/recipients", json=recipient_data)
-            
+        recipient_data = {
+            "name": recipient_name.value,
+            "address": recipient_address.value,
+            "phone": recipient_phone.value,
+            "daily_need": daily_need_float
+        }
+        headers = write_headers("register_recipient", recipient_data)
+
+        def on_success(response):
             if response.status_code == 200:
-                recipient_register_status.value = f"Success! Recipient '{recipient_name.value}' created."
+                recipient_register_status.value = f"Success! Recipient '{recipient_data['name']}' created."
                 recipient_register_status.color = ft.Colors.GREEN
                 recipient_name.value, recipient_address.value, recipient_phone.value, recipient_need.value = "", "", "", ""
                 refresh_recipient_list(e)
             else:
                 recipient_register_status.value = f"Error: {response.json().get('detail')}"
                 recipient_register_status.color = ft.Colors.RED
-        
-        except requests.exceptions.RequestException as ex:
-            recipient_register_status.value = f"API connection error: {ex}"
-            recipient_register_status.color = ft.Colors.RED
-        except Exception as ex:
-            recipient_register_status.value = f"An unexpected error occurred: {ex}"
-            recipient_register_status.color = ft.Colors.RED
-        page.update()
 
-    def refresh_recipient_list(e):
-        try:
-            response = requests.get(f"{API_URL}/recipients")
-            if response.status_code == 200:
-                recipients = response.json()
-                recipient_list.controls.clear()
-                for recipient in recipients:
-                    recipient_list.controls.append(
-                        ft.ListTile(
-                            title=ft.Text(recipient['name']),
-                            subtitle=ft.Text(f"Need: {recipient['daily_need']} kg/day"),
-                            data=recipient['_id'],
-                        )
-                    )
-                recipient_register_status.value = f"Loaded {len(recipients)} recipients."
-                recipient_register_status.color = ft.Colors.BLUE
+        def on_error(ex):
+            if queue_if_not_sent(ex, "POST", "/recipients", recipient_data, recipient_register_status, headers):
+                recipient_name.value, recipient_address.value, recipient_phone.value, recipient_need.value = "", "", "", ""
+                return
+            if isinstance(ex, requests.exceptions.RequestException):
+                recipient_register_status.value = f"API connection error: {ex}"
             else:
-                recipient_register_status.value = "Error fetching recipients."
-                recipient_register_status.color = ft.Colors.RED
-        except Exception as ex:
-            recipient_register_status.value = f"API connection error: {ex}"
+                recipient_register_status.value = f"An unexpected error occurred: {ex}"
             recipient_register_status.color = ft.Colors.RED
-            
-        if e:
-            page.update()
+
+        run_in_background(
+            "register_recipient",
+            lambda c: c.post("/recipients", json=recipient_data, headers=headers),
+            on_success, on_error, busy=recipient_busy
+        )
+
+    def build_recipient_row(recipient):
+        return ft.ListTile(
+            title=ft.Text(recipient['name']),
+            subtitle=ft.Text(f"Need: {recipient['daily_need']} kg/day"),
+            data=recipient['_id'],
+        )
+
+    recipients_view = PagedList(recipient_list, build_recipient_row, empty_text="No recipients yet.")
+
+    refresh_recipient_list, reload_recipient_list = cached_list(
+        "recipients", recipients_view, recipient_list, recipient_more,
+        recipient_register_status, recipient_busy, "recipients"
+    )
 
     # --- Event Handlers (Matching) (UPDATED) ---
-    
+
+    def match_key(match):
+        """
+        Matches have no _id; a lot going to one recipient is unique.
+        A donor can list two lots with the same name and expiry, so the
+        lot_id is used when there is one.
+        """
+        if match.get('lot_id'):
+            return (match['lot_id'], match['recipient_id'])
+        return (match['donor_id'], match['recipient_id'], match['food_name'], match['expiry_date'])
+
+    def build_match_row(match):
+        title = f"{match['food_name']} ({match['quantity_matched']} {match['unit']})"
+        subtitle = f"From: {match['donor_name']}  ->  To: {match['recipient_name']}"
+        return ft.ListTile(
+            title=ft.Text(title),
+            subtitle=ft.Text(subtitle),
+            leading=ft.Icon(ft.Icons.ARROW_RIGHT_ALT)
+        )
+
+    matches_view = KeyedList(match_list, build_match_row, key=match_key, empty_text="No matches found.")
+
     def run_match_click(e):
         match_run_status.value = "Running algorithm..."
         match_run_status.color = ft.Colors.BLUE
-        match_list.controls.clear()
+        # The old matches still hold their food; give it back before matching again
+        previous = page.client_storage.get("current_matches") or []
         page.client_storage.set("current_matches", []) # Clear old matches
-        page.update()
-        
-        try:
-            response = requests.post(f"{API_URL}/matches/run")
-            
+
+        def run_matching(c):
+            if previous:
+                c.post("/matches/release", json=previous)
+            return c.post("/matches/run")
+
+        def on_success(response):
             if response.status_code == 200:
-                matches = response.json()
-                
-                # --- NEW ---
+                matches = decode(response)
+
                 # Save matches for the logistics tab to use
-                page.client_storage.set("current_matches", matches) 
-                # --- END NEW ---
+                page.client_storage.set("current_matches", matches)
 
                 match_run_status.value = f"Algorithm complete! Found {len(matches)} matches."
                 match_run_status.color = ft.Colors.GREEN
-                
-                if not matches:
-                    match_list.controls.append(ft.Text("No matches found."))
-                
-                for match in matches:
-                    title = f"{match['food_name']} ({match['quantity_matched']} {match['unit']})"
-                    subtitle = f"From: {match['donor_name']}  ->  To: {match['recipient_name']}"
-                    match_list.controls.append(
-                        ft.ListTile(
-                            title=ft.Text(title),
-                            subtitle=ft.Text(subtitle),
-                            leading=ft.Icon(ft.Icons.ARROW_RIGHT_ALT)
-                        )
-                    )
+                matches_view.sync(matches)
+            elif response.status_code == 429:
+                # Over the server's matching capacity: nothing ran, try again later
+                match_run_status.value = f"Server busy: {response.json().get('detail')}"
+                match_run_status.color = ft.Colors.ORANGE
             else:
                 match_run_status.value = f"Error: {response.json().get('detail')}"
                 match_run_status.color = ft.Colors.RED
-                
-        except Exception as ex:
+
+        def on_error(ex):
             match_run_status.value = f"API connection error: {ex}"
             match_run_status.color = ft.Colors.RED
-            
-        page.update()
+
+        # Clicking again while a run is in flight supersedes the old run
+        run_in_background(
+            "matches", run_matching,
+            on_success, on_error, busy=match_busy,
+            updates=[match_list, match_run_status]
+        )
 
     # --- Event Handlers (Logistics) (NEW) ---
-    
+
+    def build_logistics_row(match):
+        title = f"{match['food_name']} ({match['quantity_matched']} {match['unit']})"
+        subtitle = f"From: {match['donor_name']}  ->  To: {match['recipient_name']}"
+
+        # We add a checkbox and store the raw match data
+        return ft.Checkbox(
+            label=f"{title}\n{subtitle}",
+            data=match # Store the full match dictionary
+        )
+
+    logistics_view = KeyedList(
+        logistics_matches_list, build_logistics_row, key=match_key,
+        empty_text="No matches found. Run the algorithm on the 'Matching' tab first."
+    )
+
     def refresh_logistics_matches(e):
         """
         Loads the matches that were generated in the 'Matching' tab.
+        Rows that did not change keep their checkbox state.
         """
-        logistics_matches_list.controls.clear()
-        logistics_status.value = "Loading proposed matches..."
-        logistics_status.color = ft.Colors.BLUE
-        
-        matches = page.client_storage.get("current_matches")
-        
+        matches = page.client_storage.get("current_matches") or []
+        logistics_view.sync(matches)
+
         if not matches:
-            logistics_matches_list.controls.append(ft.Text("No matches found. Run the algorithm on the 'Matching' tab first."))
             logistics_status.value = "No matches to show."
-            page.update()
-            return
-
-        logistics_status.value = f"Loaded {len(matches)} proposed matches."
-        
-        for match in matches:
-            title = f"{match['food_name']} ({match['quantity_matched']} {match['unit']})"
-            subtitle = f"From: {match['donor_name']}  ->  To: {match['recipient_name']}"
-            
-            # We add a checkbox and store the raw match data
-            logistics_matches_list.controls.append(
-                ft.Checkbox(
-                    label=f"{title}\n{subtitle}",
-                    data=match # Store the full match dictionary
-                )
-            )
-        page.update()
+        else:
+            logistics_status.value = f"Loaded {len(matches)} proposed matches."
+        logistics_status.color = ft.Colors.BLUE
+        page.update(logistics_matches_list, logistics_status)
 
     def create_pickup_click(e):
         """
         Gathers all selected matches and sends them
         to the new /pickups endpoint.
         """
-        logistics_status.value = "Creating pickup route..."
-        logistics_status.color = ft.Colors.BLUE
-        page.update()
-
         selected_matches = []
-        for control in logistics_matches_list.controls:
-            if isinstance(control, ft.Checkbox) and control.value:
+        for control in logistics_view.rows():
+            if control.value:
                 selected_matches.append(control.data) # Get the stored match dict
 
         if not selected_matches:
@@ -307,221 +480,210 @@ def main(page: ft.Page):
             page.update()
             return
 
-        try:
-            # We send the list of match objects as the JSON body
-            response = requests.post(f"{API_URL}/pickups", json=selected_matches)
-            
+        logistics_status.value = "Creating pickup route..."
+        logistics_status.color = ft.Colors.BLUE
+        headers = write_headers("create_pickup", selected_matches)
+
+        def on_success(response):
             if response.status_code == 200:
                 new_pickup = response.json()
                 logistics_status.value = f"Success! Created pickup {new_pickup['_id']}"
                 logistics_status.color = ft.Colors.GREEN
-                
-                # Clear the selected matches
-                refresh_logistics_matches(None) 
+
+                # Remove the matches that are now part of a route
+                routed = {match_key(m) for m in selected_matches}
+                remaining = [m for m in logistics_view.records() if match_key(m) not in routed]
+                page.client_storage.set("current_matches", remaining)
+                refresh_logistics_matches(None)
                 # Refresh the pending list
                 refresh_pending_pickups(None)
             else:
                 logistics_status.value = f"Error: {response.json().get('detail')}"
                 logistics_status.color = ft.Colors.RED
 
-        except Exception as ex:
+        def on_error(ex):
+            if queue_if_not_sent(ex, "POST", "/pickups", selected_matches, logistics_status, headers):
+                return
             logistics_status.value = f"API connection error: {ex}"
             logistics_status.color = ft.Colors.RED
-        
-        page.update()
 
-    def refresh_pending_pickups(e):
-        """
-        Gets all pickups from the /pickups endpoint.
-        """
-        logistics_pending_list.controls.clear()
-        
-        try:
-            response = requests.get(f"{API_URL}/pickups")
-            if response.status_code != 200:
-                logistics_pending_list.controls.append(ft.Text("Error fetching pickups."))
-                page.update()
-                return
-            
-            pickups = response.json()
-            if not pickups:
-                logistics_pending_list.controls.append(ft.Text("No pending pickups."))
-
-            for pickup in pickups:
-                if pickup['status'] != 'pending':
-                    continue # Skip this item if it's not pending
-                
-                # Create the tile for pickup info
-                pickup_tile = ft.ListTile(
-                    title=ft.Text(f"Pickup ID: {pickup['_id']}"),
-                    subtitle=ft.Text(f"Status: {pickup['status']} | Stops: {len(pickup['stops'])}"),
-                    leading=ft.Icon(ft.Icons.ROUTE),
-                    expand=True # Make the tile take up available space
-                )
-                
-                # Create the complete button
-                complete_button = ft.ElevatedButton(
-                    text="Complete",
-                    icon=ft.Icons.CHECK,
-                    data=pickup['_id'], # Store the pickup ID here
-                    on_click=complete_pickup_click,
-                    # Disable the button if it's already complete
-                    disabled=(pickup['status'] == "complete")
-                )
-                
-                # Add them both in a Row
-                logistics_pending_list.controls.append(
-                    ft.Row(
-                        controls=[
-                            pickup_tile,
-                            complete_button
-                        ],
-                        alignment=ft.MainAxisAlignment.SPACE_BETWEEN
-                    )
-                )
-        except Exception as ex:
-            logistics_pending_list.controls.append(ft.Text(f"API Error: {ex}"))
-        
-        if e: # Only update the page if a user clicked
-            page.update()
-            
+        # We send the list of match objects as the JSON body
+        run_in_background(
+            "create_pickup",
+            lambda c: c.post("/pickups", json=selected_matches, headers=headers),
+            on_success, on_error, busy=logistics_busy
+        )
+
+    def build_pickup_row(pickup):
+        # Create the tile for pickup info
+        pickup_tile = ft.ListTile(
+            title=ft.Text(f"Pickup ID: {pickup['_id']}"),
+            subtitle=ft.Text(f"Status: {pickup['status']} | Stops: {len(pickup['stops'])}"),
+            leading=ft.Icon(ft.Icons.ROUTE),
+            expand=True # Make the tile take up available space
+        )
+
+        # Create the complete button
+        complete_button = ft.ElevatedButton(
+            text="Complete",
+            icon=ft.Icons.CHECK,
+            data=pickup['_id'], # Store the pickup ID here
+            on_click=complete_pickup_click,
+            # Disable the button if it's already complete
+            disabled=(pickup['status'] == "complete")
+        )
+
+        # Add them both in a Row
+        return ft.Row(
+            controls=[
+                pickup_tile,
+                complete_button
+            ],
+            alignment=ft.MainAxisAlignment.SPACE_BETWEEN
+        )
+
+    pending_view = PagedList(logistics_pending_list, build_pickup_row, empty_text="No pending pickups.")
+
+    # Only pending routes are shown, one page at a time
+    refresh_pending_pickups, reload_pending_pickups = cached_list(
+        "pickups", pending_view, logistics_pending_list, pending_more,
+        pending_status, pending_busy, "pending pickups", status="pending"
+    )
+
     def complete_pickup_click(e):
         """
         Called when the user clicks 'Complete' on a pending pickup.
         """
         pickup_id = e.control.data  # Get the ID we stored on the button
+        e.control.disabled = True   # Avoid sending the same completion twice
         logistics_status.value = f"Completing pickup {pickup_id}..."
         logistics_status.color = ft.Colors.BLUE
-        page.update()
 
-        try:
-            response = requests.put(f"{API_URL}/pickups/{pickup_id}/complete")
-            
+        def on_success(response):
             if response.status_code == 200:
                 logistics_status.value = f"Pickup {pickup_id} completed!"
                 logistics_status.color = ft.Colors.GREEN
-                
+
                 # Refresh the list to show the status change
                 refresh_pending_pickups(None)
             else:
+                e.control.disabled = False
                 logistics_status.value = f"Error: {response.json().get('detail')}"
                 logistics_status.color = ft.Colors.RED
 
-        except Exception as ex:
+        def on_error(ex):
+            if queue_if_not_sent(ex, "PUT", f"/pickups/{pickup_id}/complete", None, logistics_status):
+                return
+            e.control.disabled = False
             logistics_status.value = f"API connection error: {ex}"
             logistics_status.color = ft.Colors.RED
-        
-        page.update()
-        
-    # --- Charting Functions (Copied from charts.py) ---
 
-    def plot_donor_participation(donors, ax):
-        """Creates a bar chart of food items donated by each donor."""
-        if not donors:
-            ax.set_title("Donor Participation")
-            ax.text(0.5, 0.5, "No donor data", ha='center')
-            return
-
-        names = [donor['name'] for donor in donors]
-        # Count the number of *distinct* food items each donor has
-        food_counts = [len(donor['current_donations']) for donor in donors]
-        
-        colors = plt.cm.viridis([0.2, 0.5, 0.8])
-        
-        ax.bar(names, food_counts, color=colors)
-        ax.set_title("Donor Participation")
-        ax.set_ylabel("Number of Active Food Donations")
-        ax.set_xlabel("Donor")
-        # plt.tight_layout() <-- REMOVED
-
-    def plot_recipient_needs(recipients, ax):
-        """Creates a pie chart of the daily needs of all recipients."""
-        if not recipients:
-            ax.set_title("Recipient Needs")
-            ax.text(0.5, 0.5, "No recipient data", ha='center')
-            return
+        run_in_background(
+            f"complete:{pickup_id}",
+            lambda c: c.put(f"/pickups/{pickup_id}/complete"),
+            on_success, on_error, busy=logistics_busy
+        )
 
-        names = [r['name'] for r in recipients]
-        needs = [r['daily_need'] for r in recipients]
-        
-        ax.pie(needs, labels=names, autopct='%1.1f%%', startangle=90)
-        ax.set_title("Share of Total Daily Need")
-        ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
-        # plt.tight_layout() <-- REMOVED
+    # --- Charting Functions (Copied from charts.py) ---
 
-    def plot_match_summary(matches, ax):
-        """Creates a bar chart of the total quantity matched to each recipient."""
-        if not matches:
-            ax.set_title("Match Summary")
-            ax.text(0.5, 0.5, "No match data", ha='center')
+    def plot_food_saved(daily, ax):
+        """Creates a bar chart of food delivered per day, with quantity per stop (delivery efficiency)."""
+        if not daily:
+            ax.set_title("Food Saved")
+            ax.text(0.5, 0.5, "No completed pickups yet", ha='center')
             return
 
-        # Aggregate total quantity matched per recipient
-        recipient_totals = defaultdict(float)
-        for match in matches:
-            recipient_totals[match['recipient_name']] += match['quantity_matched']
+        days = [row['day'][5:] for row in daily] # MM-DD
+        quantities = [row['quantity'] for row in daily]
+        per_stop = [row['quantity_per_stop'] for row in daily]
+
+        ax.bar(days, quantities, color=plt.cm.viridis(0.6))
+        ax.set_title("Food Saved per Day")
+        ax.set_ylabel("Quantity Delivered (e.g., kg)")
+        ax.set_xlabel("Day")
+        ax.tick_params(axis='x', labelrotation=45)
+
+        # Delivery efficiency on a second axis
+        ax_eff = ax.twinx()
+        ax_eff.plot(days, per_stop, color=plt.cm.plasma(0.3), marker='o')
+        ax_eff.set_ylabel("Quantity per Stop")
+
+    def plot_partner_totals(partners, ax, title, xlabel, top=10):
+        """Creates a bar chart of the quantity delivered per donor or recipient (largest first)."""
+        if not partners:
+            ax.set_title(title)
+            ax.text(0.5, 0.5, "No completed pickups yet", ha='center')
+            return
 
-        names = list(recipient_totals.keys())
-        quantities = list(recipient_totals.values())
+        partners = partners[:top]
+        names = [p['name'] for p in partners]
+        quantities = [p['quantity'] for p in partners]
         
-        colors = plt.cm.plasma([0.3, 0.6, 0.9])
+        colors = plt.cm.viridis([i / max(1, len(names)) for i in range(len(names))])
         
         ax.bar(names, quantities, color=colors)
-        ax.set_title("Total Food Matched (by Recipient)")
-        ax.set_ylabel("Total Quantity Matched (e.g., kg)")
-        ax.set_xlabel("Recipient")
-        # plt.tight_layout() <-- REMOVED
+        ax.set_title(title)
+        ax.set_ylabel("Quantity Delivered (e.g., kg)")
+        ax.set_xlabel(xlabel)
+        ax.tick_params(axis='x', labelrotation=45)
 
     # --- Event Handler (Dashboard) ---
     
     def refresh_dashboard_click(e):
         dashboard_status.value = "Loading dashboard data..."
         dashboard_status.color = ft.Colors.BLUE
-        page.update()
 
-        try:
-            # 1. Fetch all data
-            donors_res = requests.get(f"{API_URL}/donors")
-            recipients_res = requests.get(f"{API_URL}/recipients")
-            matches_res = requests.post(f"{API_URL}/matches/run")
+        def fetch_dashboard(c):
+            # 1. Fetch the delivery rollups (in parallel, on worker threads).
+            # Each is one small document per day or partner, however
+            # many pickups have been completed.
+            params = {"since": (date.today() - timedelta(days=DASHBOARD_DAYS - 1)).isoformat()}
+            responses = c.parallel(
+                lambda c: c.get("/analytics/daily", params=params),
+                lambda c: c.get("/analytics/donors", params=params),
+                lambda c: c.get("/analytics/recipients", params=params),
+            )
 
-            if donors_res.status_code != 200 or recipients_res.status_code != 200 or matches_res.status_code != 200:
+            if any(res.status_code != 200 for res in responses):
+                return None
+            return [decode(res) for res in responses]
+
+        def on_success(data):
+            if data is None:
                 dashboard_status.value = "Error fetching data from API."
                 dashboard_status.color = ft.Colors.RED
-                page.update()
                 return
 
-            donors = donors_res.json()
-            recipients = recipients_res.json()
-            matches = matches_res.json()
-            
+            daily, donor_totals, recipient_totals = data
+
             # 2. Create Donor Chart
             fig1, ax1 = plt.subplots(figsize=(6, 4)) # <-- SETTING SIZE
-            plot_donor_participation(donors, ax1)
+            plot_partner_totals(donor_totals, ax1, "Donor Participation", "Donor")
             fig1.tight_layout() # <-- APPLYING LAYOUT
             donor_chart.figure = fig1
-            
+
             # 3. Create Recipient Chart
             fig2, ax2 = plt.subplots(figsize=(6, 4)) # <-- SETTING SIZE
-            plot_recipient_needs(recipients, ax2)
+            plot_partner_totals(recipient_totals, ax2, "Food Received (by Recipient)", "Recipient")
             fig2.tight_layout() # <-- APPLYING LAYOUT
             recipient_chart.figure = fig2
-            
-            # 4. Create Match Chart
+
+            # 4. Create Food Saved Chart
             fig3, ax3 = plt.subplots(figsize=(9, 4)) # <-- SETTING SIZE
-            plot_match_summary(matches, ax3)
+            plot_food_saved(daily, ax3)
             fig3.tight_layout() # <-- APPLYING LAYOUT
             match_chart.figure = fig3
-            
+
             dashboard_status.value = "Dashboard loaded successfully."
             dashboard_status.color = ft.Colors.GREEN
+            dashboard_state["loaded"] = True
 
-        except Exception as ex:
+        def on_error(ex):
             dashboard_status.value = f"API connection error: {ex}"
             dashboard_status.color = ft.Colors.RED
-        
-        page.update()
-        
+
+        run_in_background("dashboard", fetch_dashboard, on_success, on_error, busy=dashboard_busy)
+
     # --- Page Layout (with Tabs) ---
 
     # --- Donor Tab Content ---
@@ -534,11 +696,11 @@ def main(page: ft.Page):
                     donor_address,
                     donor_phone,
                     ft.ElevatedButton("Register Donor", on_click=register_donor_click),
-                    donor_register_status,
+                    ft.Row([donor_busy, donor_register_status]),
                     ft.Divider(),
                     ft.Text("All Donors", size=24),
-                    ft.ElevatedButton("Refresh List", on_click=refresh_donor_list),
                     donor_list,
+                    donor_more,
                 ],
                 expand=1,
                 scroll=ft.ScrollMode.AUTO
@@ -553,7 +715,7 @@ def main(page: ft.Page):
                     food_name,
                     ft.Row([food_qty, food_unit]),
                     ft.ElevatedButton("Add Food Item", on_click=add_food_click),
-                    add_food_status
+                    ft.Row([add_food_busy, add_food_status])
                 ],
                 expand=1,
                 scroll=ft.ScrollMode.AUTO
@@ -573,7 +735,7 @@ def main(page: ft.Page):
                     recipient_phone,
                     recipient_need,
                     ft.ElevatedButton("Register Recipient", on_click=register_recipient_click),
-                    recipient_register_status,
+                    ft.Row([recipient_busy, recipient_register_status]),
                 ],
                 expand=1,
                 scroll=ft.ScrollMode.AUTO
@@ -582,8 +744,8 @@ def main(page: ft.Page):
             ft.Column(
                 [
                     ft.Text("All Recipients", size=24),
-                    ft.ElevatedButton("Refresh List", on_click=refresh_recipient_list),
                     recipient_list,
+                    recipient_more,
                 ],
                 expand=1,
                 scroll=ft.ScrollMode.AUTO
@@ -599,6 +761,7 @@ def main(page: ft.Page):
             ft.Text("Click the button to run the algorithm based on all current donors, food, and recipients in the database."),
             ft.ElevatedButton("Run Matching Algorithm", on_click=run_match_click, icon=ft.Icons.PLAY_ARROW),
             match_run_status,
+            match_busy,
             ft.Divider(),
             ft.Text("Proposed Matches:", size=20),
             match_list,
@@ -625,11 +788,13 @@ def main(page: ft.Page):
                 [
                     ft.Text("2. Create Route", size=24),
                     ft.ElevatedButton("Create Pickup Route from Selection", on_click=create_pickup_click, icon=ft.Icons.ADD_ROAD),
-                    logistics_status,
+                    ft.Row([logistics_busy, logistics_status]),
                     ft.Divider(),
                     ft.Text("3. Pending Pickups", size=24),
-                    ft.ElevatedButton("Refresh Pending List", on_click=refresh_pending_pickups),
+                    pending_busy,
+                    pending_status,
                     logistics_pending_list,
+                    pending_more,
                 ],
                 expand=1,
                 scroll=ft.ScrollMode.AUTO
@@ -644,6 +809,7 @@ def main(page: ft.Page):
             ft.Text("Food Rescue Analytics", size=24),
             ft.ElevatedButton("Refresh Dashboard", on_click=refresh_dashboard_click, icon=ft.Icons.REFRESH),
             dashboard_status,
+            dashboard_busy,
             ft.Row(
                 [
                     donor_chart,
@@ -662,6 +828,52 @@ def main(page: ft.Page):
         scroll=ft.ScrollMode.AUTO
     )
 
+    def on_tab_change(e):
+        dashboard_state["tab"] = e.control.selected_index
+        if e.control.selected_index == DASHBOARD_TAB_INDEX and not dashboard_state["loaded"]:
+            refresh_dashboard_click(e)
+
+    # --- Live Updates (Change Feed) ---
+
+    # The API pushes every changed document, so lists update by
+    # themselves instead of through "Refresh" buttons.
+    reloaders = {
+        "donors": reload_donor_list,
+        "recipients": reload_recipient_list,
+        "pickups": reload_pending_pickups,
+    }
+
+    def schedule_dashboard_refresh():
+        """
+        Marks the dashboard stale. If it is on screen, reloads it once
+        the burst of changes settles.
+        """
+        dashboard_state["loaded"] = False
+        if dashboard_state["tab"] != DASHBOARD_TAB_INDEX:
+            return # Reloads when its tab is opened
+        if dashboard_state["timer"]:
+            dashboard_state["timer"].cancel()
+        timer = threading.Timer(DASHBOARD_DEBOUNCE_SECONDS, refresh_dashboard_click, args=(None,))
+        timer.daemon = True
+        dashboard_state["timer"] = timer
+        timer.start()
+
+    def on_feed_change(collection, document):
+        cache.upsert_many(collection, [document], advance_watermark=False)
+        reload = reloaders.get(collection)
+        if reload:
+            reload()
+        if collection == "pickups" and document.get("status") == "complete":
+            schedule_dashboard_refresh() # The charts only count completed pickups
+
+    def on_feed_connect():
+        # Catch up on anything that changed while we were not listening
+        refresh_donor_list(None)
+        refresh_recipient_list(None)
+        refresh_pending_pickups(None)
+
+    feed = ChangeFeed(client, on_feed_change, on_connect=on_feed_connect)
+
     # --- Main Page Setup (Tabs) ---
     page.add(
         ft.Tabs(
@@ -693,19 +905,46 @@ def main(page: ft.Page):
                 ),
             ],
             expand=1,
-            selected_index=0
+            selected_index=0,
+            on_change=on_tab_change
         )
     )
     
     # Load initial data when app starts (UPDATED)
     def on_page_ready(e):
+        # These run concurrently on the client's workers and each list
+        # renders as soon as its own response arrives.
+        # The dashboard waits until its tab is opened (see on_tab_change).
         refresh_donor_list(None)
         refresh_recipient_list(None)
         refresh_pending_pickups(None)
-        refresh_dashboard_click(None) # <-- Add this line
+        feed.start()
         page.update()
 
     page.on_ready = on_page_ready
+
+    # --- Shutdown ---
+
+    # The feed thread, the client's worker pools and the SQLite handle
+    # are closed when the window is (or the web session ends).
+    closed = threading.Event()
+
+    def shutdown(e=None):
+        if closed.is_set():
+            return
+        closed.set()
+        feed.stop()
+        client.close()
+        cache.close()
+
+    def on_window_event(e):
+        if e.data == "close":
+            shutdown()
+            page.window.destroy()
+
+    page.window.prevent_close = True
+    page.window.on_event = on_window_event
+    page.on_disconnect = shutdown
     page.update()
 
 # --- Run the App ---
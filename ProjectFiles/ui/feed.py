@@ -0,0 +1,84 @@
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# The server sends a keep-alive every 15 seconds, so a read that
+# waits much longer than that means the connection is dead.
+FEED_READ_TIMEOUT = 45
+RETRY_SECONDS = 3
+
+class ChangeFeed:
+    """
+    Listens to the API's /events stream on a background thread and
+    hands every changed document to `on_change(collection, document)`.
+
+    `on_connect()` runs each time the stream (re)connects. Events sent
+    while disconnected are lost, so it should catch up with a delta sync.
+    """
+
+    def __init__(self, client, on_change, on_connect=None, collections=None):
+        self.client = client
+        self.on_change = on_change
+        self.on_connect = on_connect
+        self.collections = collections
+        self._stop = threading.Event()
+        self._thread = None
+        self._response = None # The open stream, so stop() can close it
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops listening: closes the stream, so the thread ends without waiting for the next event."""
+        self._stop.set()
+        response = self._response
+        if response is not None:
+            response.close()
+        if self._thread:
+            self._thread.join(timeout=RETRY_SECONDS)
+
+    def _run(self):
+        params = {"collections": ",".join(self.collections)} if self.collections else {}
+        while not self._stop.is_set():
+            try:
+                response = self.client.get(
+                    "/events", params=params, stream=True,
+                    timeout=(self.client.timeout[0], FEED_READ_TIMEOUT)
+                )
+                self._response = response
+                with response:
+                    response.raise_for_status()
+                    if self.on_connect:
+                        self.on_connect()
+                    for event_type, data in parse_sse(response.iter_lines(decode_unicode=True)):
+                        if self._stop.is_set():
+                            return
+                        if event_type == "change":
+                            event = json.loads(data)
+                            self.on_change(event["collection"], event["document"])
+            except Exception as ex:
+                if self._stop.is_set():
+                    return # Closed by stop()
+                logger.warning("Change feed disconnected: %s", ex)
+            finally:
+                self._response = None
+            self._stop.wait(RETRY_SECONDS)
+
+def parse_sse(lines):
+    """Yields (event type, data) pairs from the lines of a Server-Sent Events stream."""
+    event_type, data = "message", []
+    for line in lines:
+        if not line:
+            # A blank line ends the event
+            if data:
+                yield event_type, "\n".join(data)
+            event_type, data = "message", []
+        elif line.startswith(":"):
+            continue # Comment / keep-alive
+        elif line.startswith("event:"):
+            event_type = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].lstrip())
@@ -0,0 +1,122 @@
+import flet as ft
+
+DEFAULT_PAGE_SIZE = 50
+
+def record_id(record: dict) -> str:
+    """Default row key: the MongoDB '_id' every API document carries."""
+    return record["_id"]
+
+class KeyedList:
+    """
+    Keeps a ft.ListView in sync with a list of records without
+    rebuilding it on every refresh.
+
+    Rows are matched by key. Only rows that were added, removed
+    or changed get a new control; unchanged rows keep theirs, so
+    Flet only sends those differences to the client (and any state
+    on the row, like a ticked checkbox, survives a refresh).
+    """
+
+    def __init__(self, view: ft.ListView, build_row, key=record_id, empty_text: str = ""):
+        self.view = view
+        self.build_row = build_row # record -> ft.Control
+        self.key = key
+        self.empty_text = empty_text
+        self._records = {}  # key -> record
+        self._controls = {} # key -> control
+        self._order = []    # keys in display order
+
+    def __len__(self):
+        return len(self._order)
+
+    def rows(self) -> list:
+        """Returns the row controls in display order."""
+        return [self._controls[k] for k in self._order]
+
+    def records(self) -> list:
+        """Returns the records in display order."""
+        return [self._records[k] for k in self._order]
+
+    def sync(self, records: list) -> bool:
+        """
+        Makes the list show exactly `records`, in that order.
+        Returns True if anything changed.
+        """
+        new_order = [self.key(r) for r in records]
+        keep = set(new_order)
+        changed = new_order != self._order
+
+        # Remove rows that are gone
+        for k in list(self._controls):
+            if k not in keep:
+                del self._controls[k]
+                del self._records[k]
+
+        # Add new rows and patch changed ones
+        for k, record in zip(new_order, records):
+            if self._records.get(k) != record:
+                self._records[k] = record
+                self._controls[k] = self.build_row(record)
+                changed = True
+
+        self._order = new_order
+        if changed or not self.view.controls:
+            self._render()
+        return changed
+
+    def extend(self, records: list) -> bool:
+        """Appends new records after the ones shown (patching any already shown)."""
+        changed = False
+        for record in records:
+            changed = self._put(record) or changed
+        if changed:
+            self._render()
+        return changed
+
+    def _put(self, record: dict) -> bool:
+        k = self.key(record)
+        if self._records.get(k) == record:
+            return False
+        if k not in self._records:
+            self._order.append(k)
+        self._records[k] = record
+        self._controls[k] = self.build_row(record)
+        return True
+
+    def _render(self):
+        if self._order:
+            self.view.controls = self.rows()
+        elif self.empty_text:
+            self.view.controls = [ft.Text(self.empty_text)]
+        else:
+            self.view.controls = []
+
+class PagedList(KeyedList):
+    """
+    A KeyedList that loads its records from a paginated endpoint
+    (?skip=&limit=) one page at a time instead of all at once.
+    """
+
+    def __init__(self, view: ft.ListView, build_row, key=record_id,
+                 empty_text: str = "", page_size: int = DEFAULT_PAGE_SIZE):
+        super().__init__(view, build_row, key=key, empty_text=empty_text)
+        self.page_size = page_size
+        self.has_more = False
+
+    def refresh_params(self) -> dict:
+        """Query params to re-fetch every page currently shown."""
+        return {"skip": 0, "limit": max(len(self), self.page_size)}
+
+    def next_page_params(self) -> dict:
+        """Query params to fetch the page after the ones shown."""
+        return {"skip": len(self), "limit": self.page_size}
+
+    def apply_refresh(self, records: list, params: dict) -> bool:
+        """Shows the result of a request made with refresh_params()."""
+        self.has_more = len(records) >= params["limit"]
+        return self.sync(records)
+
+    def apply_next_page(self, records: list) -> bool:
+        """Shows the result of a request made with next_page_params()."""
+        self.has_more = len(records) >= self.page_size
+        return self.extend(records)
@@ -0,0 +1,52 @@
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Decoding for the API's compact list formats (see app/wire.py).
+#
+# Send ACCEPT as the Accept header; the API answers list endpoints in
+# the most compact format both sides support, and decode() turns any
+# of them back into the same list of dicts that response.json() gives
+# for plain JSON. Compression needs nothing here: requests already
+# advertises and undoes every coding it can (gzip, plus brotli/zstd
+# when their packages are installed).
+
+COLUMNS_JSON = "application/vnd.foodrescue.columns+json"
+COLUMNS_MSGPACK = "application/vnd.foodrescue.columns+msgpack"
+MSGPACK = "application/msgpack"
+
+ACCEPT = ", ".join(
+    ([COLUMNS_MSGPACK] if msgpack else [])
+    + [f"{COLUMNS_JSON};q=0.9", "application/json;q=0.5"]
+)
+
+def decode_table(table: dict) -> list:
+    """A columnar table back into records."""
+    rows = [{} for _ in range(table["count"])]
+    for name, column in table["columns"].items():
+        if "dict" in column:
+            words = column["dict"]
+            values = [words[code] for code in column["codes"]]
+        elif "table" in column:
+            children = decode_table(column["table"])
+            values, start = [], 0
+            for length in column["lengths"]:
+                values.append(children[start:start + length])
+                start += length
+        else:
+            values = column["values"]
+        for row, value in zip(rows, values):
+            row[name] = value
+    return rows
+
+def decode(response):
+    """The body of an API response, whichever format it came in."""
+    media_type = response.headers.get("content-type", "").split(";")[0].strip()
+    if media_type == COLUMNS_MSGPACK:
+        return decode_table(msgpack.unpackb(response.content))
+    if media_type == COLUMNS_JSON:
+        return decode_table(response.json())
+    if media_type == MSGPACK:
+        return msgpack.unpackb(response.content)
+    return response.json()